@@ -0,0 +1 @@
+"""Benchmarks of the conversion pipeline over synthetic notebooks and repositories"""
@@ -0,0 +1,195 @@
+import argparse
+import ast
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import nbconvert  # type: ignore
+import nbformat  # type: ignore
+
+from ipython2cwl.cwltoolextractor import AnnotatedIPython2CWLToolConverter, AnnotatedVariablesExtractor
+from ipython2cwl.repo2cwl import _get_notebook_paths_from_dir
+from .synthetic import synthetic_notebook, synthetic_repo
+
+NOTEBOOK_BENCHMARKS = [
+    'nbformat_read', 'from_jupyter_notebook_node', 'annotated_variables_extractor', 'wrap_script_to_method',
+    'cwl_command_line_tool', 'compile',
+]
+
+REPO_BENCHMARKS = ['notebook_discovery']
+
+
+def measure(function: Callable[[], object], repeat: int) -> Dict:
+    """
+    Executes the function repeat times to measure its duration and once more to measure its peak memory, which
+    is traced separately because tracing slows down the execution.
+    :param function: The function to measure
+    :param repeat: The number of the timed executions
+    :return: The minimum and the median duration in seconds and the peak of the allocated memory in bytes
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'min_seconds': min(durations),
+        'median_seconds': statistics.median(durations),
+        'peak_memory_bytes': peak,
+    }
+
+
+def notebook_benchmarks(workdir: str, cells: int, annotations: int, output_bytes: int) -> Dict[str, Callable]:
+    """Returns the functions which benchmark each phase of the conversion of a synthetic notebook."""
+    notebook = synthetic_notebook(cells, annotations, output_bytes)
+    notebook_path = os.path.join(workdir, 'notebook.ipynb')
+    with open(notebook_path, 'w') as f:
+        nbformat.write(notebook, f)
+    code = nbconvert.PythonExporter().from_notebook_node(notebook)[0]
+    converter = AnnotatedIPython2CWLToolConverter(code)
+    tar_path = Path(workdir, 'notebookAsCWLTool.tar')
+
+    def read():
+        with open(notebook_path) as fd:
+            return nbformat.read(fd, as_version=4)
+
+    return {
+        'nbformat_read': read,
+        'from_jupyter_notebook_node': lambda: AnnotatedIPython2CWLToolConverter.from_jupyter_notebook_node(notebook),
+        'annotated_variables_extractor': lambda: AnnotatedVariablesExtractor().visit(ast.parse(code)),
+        'wrap_script_to_method': lambda: converter._wrap_script_to_method(converter._tree, converter._variables),
+        'cwl_command_line_tool': converter.cwl_command_line_tool,
+        'compile': lambda: converter.compile(tar_path),
+    }
+
+
+def repo_benchmarks(workdir: str, notebooks: int) -> Dict[str, Callable]:
+    """Returns the functions which benchmark the phases of the conversion of a synthetic repository."""
+    repo_path = os.path.join(workdir, 'repo')
+    os.makedirs(repo_path)
+    synthetic_repo(repo_path, notebooks)
+    return {
+        'notebook_discovery': lambda: _get_notebook_paths_from_dir(repo_path),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> Dict:
+    results = []
+    selected = set(args.benchmark) if args.benchmark else set(NOTEBOOK_BENCHMARKS + REPO_BENCHMARKS)
+    for cells in args.cells:
+        for annotations in [a for a in args.annotations if a <= cells]:
+            for output_bytes in args.output_bytes:
+                parameters = {'cells': cells, 'annotations': annotations, 'output_bytes': output_bytes}
+                workdir = tempfile.mkdtemp(prefix='ipython2cwl_benchmark_')
+                try:
+                    benchmarks = notebook_benchmarks(workdir, cells, annotations, output_bytes)
+                    for name in [name for name in NOTEBOOK_BENCHMARKS if name in selected]:
+                        results.append(report(name, parameters, measure(benchmarks[name], args.repeat)))
+                finally:
+                    shutil.rmtree(workdir)
+    for notebooks in args.repo_notebooks:
+        parameters = {'notebooks': notebooks}
+        workdir = tempfile.mkdtemp(prefix='ipython2cwl_benchmark_')
+        try:
+            benchmarks = repo_benchmarks(workdir, notebooks)
+            for name in [name for name in REPO_BENCHMARKS if name in selected]:
+                results.append(report(name, parameters, measure(benchmarks[name], args.repeat)))
+        finally:
+            shutil.rmtree(workdir)
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'repeat': args.repeat,
+        'results': results,
+    }
+
+
+def report(name: str, parameters: Dict, measurement: Dict) -> Dict:
+    result = {'benchmark': name, 'parameters': parameters, **measurement}
+    print(f"{name} {json.dumps(parameters, sort_keys=True)}: {measurement['median_seconds']:.6f}s, "
+          f"{measurement['peak_memory_bytes'] / 1024 / 1024:.2f}MiB", file=sys.stderr)
+    return result
+
+
+def compare(baseline: Dict, current: Dict) -> List[str]:
+    """
+    Compares the results of two executions of the suite, for example of two commits.
+    :param baseline: The results of the baseline execution
+    :param current: The results of the current execution
+    :return: A line for each benchmark of both executions with the ratio of the median durations and of the peaks
+    """
+    def key(result):
+        return result['benchmark'], json.dumps(result['parameters'], sort_keys=True)
+
+    baseline_results = {key(result): result for result in baseline['results']}
+    lines = []
+    for result in current['results']:
+        if key(result) not in baseline_results:
+            continue
+        old = baseline_results[key(result)]
+        time_ratio = result['median_seconds'] / old['median_seconds'] if old['median_seconds'] > 0 else float('inf')
+        memory_ratio = result['peak_memory_bytes'] / old['peak_memory_bytes'] \
+            if old['peak_memory_bytes'] > 0 else float('inf')
+        lines.append(f'{key(result)[0]} {key(result)[1]}: time x{time_ratio:.2f}, memory x{memory_ratio:.2f}')
+    return lines
+
+
+def parser_arguments(argv: List[str]):
+    parser = argparse.ArgumentParser(description='Benchmark the conversion pipeline over synthetic notebooks')
+    parser.add_argument('-o', '--output', type=Path, default=None, help='JSON file to store the results')
+    parser.add_argument('--compare', type=Path, default=None, metavar='BASELINE',
+                        help='JSON file of a previous execution to compare the results with')
+    parser.add_argument('--cells', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--annotations', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--output-bytes', type=int, nargs='+', default=[0, 10000],
+                        help='Size of the png output embedded at each cell')
+    parser.add_argument('--repo-notebooks', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--benchmark', action='append', default=[], choices=NOTEBOOK_BENCHMARKS + REPO_BENCHMARKS,
+                        help='Execute only that benchmark. Can be used multiple times')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parser_arguments(sys.argv[1:] if argv is None else argv)
+    results = run(args)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            for line in compare(json.load(f), results):
+                print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import base64
+import os
+import random
+
+import nbformat  # type: ignore
+from nbformat.notebooknode import NotebookNode  # type: ignore
+
+_INPUT_ANNOTATIONS = [
+    ('CWLIntInput', '{i}'),
+    ('CWLStringInput', "'value {i}'"),
+    ('CWLFilePathInput', "'data_{i}.csv'"),
+    ('CWLBooleanInput', 'True'),
+]
+
+_OUTPUT_ANNOTATIONS = [
+    ('CWLDumpableFile', 'str(value_{i})'),
+    ('CWLFilePathOutput', "'result_{i}.csv'"),
+]
+
+
+def synthetic_notebook(cells: int, annotations: int, output_bytes: int = 0) -> NotebookNode:
+    """
+    Creates a notebook with plain computation cells and evenly spread annotated cells.
+    :param cells: The number of code cells
+    :param annotations: The number of annotated variables, alternating between inputs and outputs
+    :param output_bytes: The size of the png output embedded at each cell
+    :return: The notebook
+    """
+    if annotations > cells:
+        raise ValueError('The annotations can not be more than the cells')
+    annotated_cells = {i * cells // annotations for i in range(annotations)} if annotations > 0 else set()
+    png = base64.b64encode(os.urandom(output_bytes)).decode() if output_bytes > 0 else None
+    notebook = nbformat.v4.new_notebook()
+    imports = '\n'.join([
+        'import math',
+        'from ipython2cwl.iotypes import ' + ', '.join(
+            annotation for annotation, _ in _INPUT_ANNOTATIONS + _OUTPUT_ANNOTATIONS
+        ),
+        '%matplotlib inline',
+    ])
+    annotated = 0
+    for i in range(cells):
+        if i in annotated_cells and annotated % 2 == 0:
+            annotation, value = _INPUT_ANNOTATIONS[annotated // 2 % len(_INPUT_ANNOTATIONS)]
+            source = f'value_{i}: {annotation} = {value.format(i=i)}'
+        elif i in annotated_cells:
+            annotation, value = _OUTPUT_ANNOTATIONS[annotated // 2 % len(_OUTPUT_ANNOTATIONS)]
+            source = f'value_{i} = {i}\nresult_{i}: {annotation} = {value.format(i=i)}'
+        else:
+            source = f'value_{i} = math.sqrt({i}) * {i}\nprint(value_{i})'
+        if i in annotated_cells:
+            annotated += 1
+        if i == 0:
+            source = f'{imports}\n{source}'
+        cell = nbformat.v4.new_code_cell(source=source)
+        if png is not None:
+            cell.outputs.append(nbformat.v4.new_output('display_data', data={'image/png': png}))
+        notebook.cells.append(cell)
+    return notebook
+
+
+def synthetic_repo(directory: str, notebooks: int, cells: int = 10, annotations: int = 2,
+                   annotated_ratio: float = 0.5, depth: int = 3, seed: int = 0) -> None:
+    """
+    Writes a directory tree with notebooks and other files, like a data science repository.
+    :param directory: The root of the tree, which must exist
+    :param notebooks: The number of notebooks
+    :param cells: The number of cells of each notebook
+    :param annotations: The number of annotated variables of the annotated notebooks
+    :param annotated_ratio: The ratio of the notebooks which have annotations
+    :param depth: The maximum depth of the directories
+    :param seed: The seed of the random directory layout
+    """
+    rng = random.Random(seed)
+    annotated = nbformat.writes(synthetic_notebook(cells, annotations))
+    plain = nbformat.writes(synthetic_notebook(cells, 0))
+    for i in range(notebooks):
+        parent = os.path.join(directory, *[f'dir_{rng.randrange(10)}' for _ in range(rng.randrange(depth + 1))])
+        os.makedirs(parent, exist_ok=True)
+        with open(os.path.join(parent, f'notebook_{i}.ipynb'), 'w') as f:
+            f.write(annotated if rng.random() < annotated_ratio else plain)
+        with open(os.path.join(parent, f'data_{i}.csv'), 'w') as f:
+            f.write('a,b\n1,2\n')
@@ -1,2 +1,14 @@
 """Compile IPython Jupyter Notebooks as CWL CommandLineTools"""
+import os
+from pathlib import Path
+
 __version__ = "0.0.4"
+
+
+def default_cache_directory(name: str) -> Path:
+    """Returns the subdirectory of the cache of ipython2cwl for the files of a feature. The cache is
+    $IPYTHON2CWL_CACHE_DIR, or ipython2cwl in $XDG_CACHE_HOME, which is ~/.cache by default."""
+    if os.environ.get('IPYTHON2CWL_CACHE_DIR'):
+        return Path(os.environ['IPYTHON2CWL_CACHE_DIR'], name)
+    return Path(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'ipython2cwl',
+                name)
@@ -0,0 +1,196 @@
+import ast
+import os
+import re
+import sys
+from typing import Iterable, List, Optional, Set, Tuple
+
+import nbformat  # type: ignore
+from docker.utils.build import exclude_paths  # type: ignore
+
+DEFAULT_RULES = [
+    '.git',
+    '**/.ipynb_checkpoints',
+    '**/__pycache__',
+    '**/*.py[cod]',
+    '**/.DS_Store',
+]
+
+DEPENDENCY_FILES = {
+    'requirements.txt', 'environment.yml', 'environment.yaml', 'setup.py', 'setup.cfg', 'pyproject.toml', 'Pipfile',
+    'Pipfile.lock', 'apt.txt', 'postBuild', 'start', 'runtime.txt', 'install.R', 'DESCRIPTION', 'REQUIRE',
+    'Project.toml', 'Manifest.toml', 'JuliaProject.toml', 'default.nix', 'Dockerfile', 'MANIFEST.in',
+}
+
+_KEPT_SUFFIXES = ('.py', '.ipynb')
+
+
+def binder_directory(repo_path: str) -> str:
+    """Returns the directory where repo2docker looks for the configuration files, like the .dockerignore."""
+    for name in ['.binder', 'binder']:
+        if os.path.isdir(os.path.join(repo_path, name)):
+            return os.path.join(repo_path, name)
+    return repo_path
+
+
+def strip_notebook_outputs(notebook_path: str) -> bool:
+    """
+    Removes the outputs and the execution counts of the code cells of a notebook.
+    :param notebook_path: The path of the notebook, which is overwritten
+    :return: True if the notebook had any outputs
+    """
+    with open(notebook_path) as fd:
+        notebook = nbformat.read(fd, as_version=4)
+    changed = False
+    for cell in notebook.cells:
+        if cell.cell_type != 'code':
+            continue
+        if len(cell.outputs) > 0 or cell.execution_count is not None:
+            changed = True
+        cell.outputs = []
+        cell.execution_count = None
+    if changed:
+        with open(notebook_path, 'w') as fd:
+            nbformat.write(notebook, fd)
+    return changed
+
+
+def _string_literal(node) -> Optional[str]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    # the versions before python 3.8 parse the string literals to ast.Str
+    if sys.version_info < (3, 8) and isinstance(node, ast.Str):
+        return node.s
+    return None
+
+
+def _module_paths(repo_path: str) -> List[str]:
+    """Returns the python modules of the repository."""
+    modules: List[str] = []
+    for path, directories, files in os.walk(repo_path):
+        if '.git' in directories:
+            directories.remove('.git')
+        modules.extend(os.path.join(path, name) for name in files if name.endswith('.py'))
+    return modules
+
+
+def _referenced_paths(repo_path: str, target_repo_dir: str, script_paths: Iterable[str]) -> Set[str]:
+    """Returns the files and directories of the repository which the string literals of the scripts refer to. A
+    relative path is resolved against the repository and against the directory of the script, like a path that a
+    module joins with its __file__."""
+    referenced = set()
+    for script_path in script_paths:
+        with open(script_path, errors='replace') as fd:
+            try:
+                tree = ast.parse(fd.read())
+            except (SyntaxError, ValueError):
+                continue
+        script_directory = os.path.relpath(os.path.dirname(script_path), repo_path)
+        for node in ast.walk(tree):
+            path = _string_literal(node)
+            if path is None or len(path) == 0 or '\n' in path:
+                continue
+            if os.path.isabs(path):
+                if os.path.commonpath([target_repo_dir, path]) != target_repo_dir:
+                    continue
+                candidates = [os.path.relpath(path, target_repo_dir)]
+            else:
+                candidates = [path, os.path.join(script_directory, path)]
+            for candidate in candidates:
+                candidate = os.path.normpath(candidate)
+                if not candidate.startswith('..') and os.path.exists(os.path.join(repo_path, candidate)):
+                    referenced.add(candidate)
+    return referenced
+
+
+def _escape(path: str) -> str:
+    return re.sub(r'([*?\[\\])', r'\\\1', path.replace(os.sep, '/'))
+
+
+def _unused_paths(repo_path: str, relative_path: str, kept_files: Set[str],
+                  kept_directories: Set[str]) -> Tuple[bool, List[str]]:
+    needed = False
+    unused = []
+    for entry in sorted(os.scandir(os.path.join(repo_path, relative_path)), key=lambda e: e.name):
+        child = os.path.normpath(os.path.join(relative_path, entry.name))
+        if child == '.git':
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            if child in kept_directories:
+                needed = True
+                continue
+            child_needed, child_unused = _unused_paths(repo_path, child, kept_files, kept_directories)
+            if child_needed:
+                needed = True
+                unused.extend(child_unused)
+            else:
+                unused.append(child)
+        elif child in kept_files or entry.name in DEPENDENCY_FILES or entry.name.endswith(_KEPT_SUFFIXES):
+            needed = True
+        else:
+            unused.append(child)
+    return needed, unused
+
+
+def unused_paths(repo_path: str, script_paths: Iterable[str], target_repo_dir: str = '/app') -> List[str]:
+    """
+    Finds the files which neither the generated scripts nor the dependency files need. The generated scripts, the
+    dependency files of repo2docker, the python modules, the notebooks, the binder directory and the files or
+    directories which the scripts or the python modules of the repository refer to with a string literal are needed.
+    A directory without any needed file is returned instead of its content. The files which the code finds with a
+    glob or with a computed name are not detected, so the pruning is optional.
+    :param repo_path: The local repository
+    :param script_paths: The generated scripts
+    :param target_repo_dir: The directory of the repository inside the image
+    :return: The relative paths of the unused files and directories
+    """
+    script_paths = list(script_paths)
+    referenced = _referenced_paths(repo_path, target_repo_dir, script_paths + _module_paths(repo_path))
+    kept_files = {os.path.relpath(path, repo_path) for path in script_paths}
+    kept_files |= {path for path in referenced if not os.path.isdir(os.path.join(repo_path, path))}
+    kept_directories = {path for path in referenced if os.path.isdir(os.path.join(repo_path, path))}
+    kept_directories.add(os.path.relpath(binder_directory(repo_path), repo_path))
+    if '.' in kept_directories:
+        kept_directories.remove('.')
+    return _unused_paths(repo_path, '.', kept_files, kept_directories)[1]
+
+
+def dockerignore_rules(repo_path: str, script_paths: Iterable[str], prune: bool = True,
+                       extra_rules: Iterable[str] = ()) -> List[str]:
+    """
+    Creates the rules of the .dockerignore file of the build context. The rules are the default rules, the unused
+    paths, the rules of the existing .dockerignore of the repository and the extra rules, in that order, so that the
+    later rules, like the exceptions which start with !, override the previous ones.
+    :param repo_path: The local repository
+    :param script_paths: The generated scripts
+    :param prune: Exclude the unused files
+    :param extra_rules: The rules given by the user
+    :return: The rules
+    """
+    rules = list(DEFAULT_RULES)
+    if prune:
+        rules.extend(_escape(path) for path in unused_paths(repo_path, script_paths))
+    existing = os.path.join(binder_directory(repo_path), '.dockerignore')
+    if os.path.isfile(existing):
+        with open(existing) as f:
+            rules.extend(line.strip() for line in f if line.strip() != '' and not line.strip().startswith('#'))
+    rules.extend(extra_rules)
+    return rules
+
+
+def context_size(repo_path: str, rules: List[str]) -> int:
+    """Returns the size in bytes of the files of the build context which the rules do not exclude."""
+    size = 0
+    for relative_path in exclude_paths(repo_path, rules):
+        path = os.path.join(repo_path, relative_path)
+        if os.path.isfile(path) and not os.path.islink(path):
+            size += os.path.getsize(path)
+    return size
+
+
+def write_dockerignore(repo_path: str, rules: List[str]) -> str:
+    """Writes the rules to the .dockerignore of the repository, where repo2docker reads it from."""
+    path = os.path.join(binder_directory(repo_path), '.dockerignore')
+    with open(path, 'w') as f:
+        f.write('# Generated by ipython2cwl\n')
+        f.write('\n'.join(rules) + '\n')
+    return path
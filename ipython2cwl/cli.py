@@ -0,0 +1,104 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Dict, List, Optional, Union
+
+import yaml
+
+from . import default_cache_directory
+from .fastrun import run_notebook
+from .jobs import sweep_jobs, write_job_files, write_jobs_jsonl
+from .serialization import FORMATS
+from .server import serve
+
+logger = logging.getLogger('ipython2cwl')
+
+
+def parser_arguments(argv: List[str]):
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    serve_parser = subparsers.add_parser('serve', help='Convert the notebooks which are posted to a local HTTP '
+                                                       'service')
+    serve_parser.add_argument('--host', help='Address to listen to', default='127.0.0.1')
+    serve_parser.add_argument('--port', help='Port to listen to', type=int, default=8080)
+    serve_parser.add_argument('--socket', help='Unix socket to listen to instead of the host and the port',
+                              default=None)
+    serve_parser.add_argument('--cache-size', help='Maximum number of cached conversions', type=int, default=256)
+    serve_parser.add_argument('--image', help='Default docker image id of the tools', default='jn2cwl:latest')
+    run_parser = subparsers.add_parser('run', help='Run the tool of a notebook locally, without docker and a CWL '
+                                                   'runner')
+    run_parser.add_argument('notebook', help='The notebook')
+    run_parser.add_argument('-i', '--input', help='The value of an input as NAME=VALUE. Repeat it for each item of a '
+                                                  'list input', action='append', default=[], dest='inputs')
+    run_parser.add_argument('-o', '--output', help='Directory to run the tool and write the outputs to', default='.')
+    run_parser.add_argument('--cache-dir', help='Directory of the compiled notebooks',
+                            default=str(default_cache_directory('notebooks')))
+    run_parser.add_argument('--no-cache', help='Neither read nor write the cache', action='store_true')
+    jobs_parser = subparsers.add_parser('jobs', help='Generate the job files of a parameter sweep over a tool')
+    jobs_parser.add_argument('tool', help='The CWL tool')
+    jobs_parser.add_argument('sweep', help='The sweep specification, a YAML or JSON file with any of the fields '
+                                           'fixed, product, zip and csv')
+    output = jobs_parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('-o', '--output', help='Directory to write a job file for each job to', default=None)
+    output.add_argument('--jsonl', help='JSON-lines file to write all the jobs to, or - for the standard output',
+                        default=None)
+    jobs_parser.add_argument('--format', help='Format of the job files', choices=FORMATS, default='yaml')
+    jobs_parser.add_argument('--prefix', help='Prefix of the names of the job files', default='job_')
+    return parser.parse_args(argv)
+
+
+def setup_logger():
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def _run(args) -> int:
+    inputs: Dict[str, Union[str, List[str]]] = {}
+    for argument in args.inputs:
+        name, separator, value = argument.partition('=')
+        if separator == '':
+            raise ValueError(f'Invalid input {argument}, expected NAME=VALUE')
+        if name in inputs:
+            previous = inputs[name]
+            inputs[name] = [*(previous if isinstance(previous, list) else [previous]), value]
+        else:
+            inputs[name] = value
+    outputs = run_notebook(args.notebook, inputs, args.output, None if args.no_cache else args.cache_dir)
+    print(json.dumps(outputs, indent=2))
+    return 0
+
+
+def _jobs(args) -> int:
+    with open(args.tool) as f:
+        tool = yaml.safe_load(f)
+    if not isinstance(tool, dict) or 'inputs' not in tool:
+        raise ValueError(f'{args.tool} is not a CWL process with inputs')
+    with open(args.sweep) as f:
+        sweep = yaml.safe_load(f)
+    jobs = sweep_jobs(tool, sweep or {}, os.path.dirname(os.path.abspath(args.sweep)))
+    if args.output is not None:
+        count = write_job_files(jobs, args.output, args.format, args.prefix)
+    elif args.jsonl == '-':
+        count = write_jobs_jsonl(jobs, sys.stdout)
+    else:
+        with open(args.jsonl, 'w') as f:
+            count = write_jobs_jsonl(jobs, f)
+    logger.info(f'Generated {count} jobs')
+    return 0
+
+
+def ipython2cwl(argv: Optional[List[str]] = None) -> int:
+    setup_logger()
+    args = parser_arguments(sys.argv[1:] if argv is None else argv)
+    if args.command == 'serve':
+        return serve(args.host, args.port, args.socket, args.cache_size, args.image)
+    if args.command == 'run':
+        return _run(args)
+    return _jobs(args)
@@ -1,33 +1,55 @@
 import ast
+import hashlib
+import logging
 import os
 import platform
 import shutil
 import tarfile
 import tempfile
 from collections import namedtuple
-from copy import deepcopy
+from copy import copy, deepcopy
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Optional, Set
 
 import astor  # type: ignore
 import nbconvert  # type: ignore
-import yaml
 from nbformat.notebooknode import NotebookNode  # type: ignore
 
 from .iotypes import CWLFilePathInput, CWLBooleanInput, CWLIntInput, CWLStringInput, CWLFilePathOutput, \
-    CWLDumpableFile, CWLDumpableBinaryFile, CWLDumpable, CWLPNGPlot, CWLPNGFigure
+    CWLDumpableFile, CWLDumpableBinaryFile, CWLDumpable, CWLPNGPlot, CWLPNGFigure, CWLMmapFileInput, CWLStage, \
+    CWLCheckpoint, CWLDirectoryInput, CWLOutputDirectory, CWLGlobOutput, CWLParallelMap
+from .program_slicer import ProgramSlicer
 from .requirements_manager import RequirementsManager
+from .serialization import dump_cwl
+from .validation import CWLValidator
 
 with open(os.sep.join([os.path.abspath(os.path.dirname(__file__)), 'templates', 'template.dockerfile'])) as f:
     DOCKERFILE_TEMPLATE = f.read()
+with open(os.sep.join([os.path.abspath(os.path.dirname(__file__)), 'templates',
+                       'template.dockerfile.wheelhouse'])) as f:
+    WHEELHOUSE_DOCKERFILE_TEMPLATE = f.read()
 with open(os.sep.join([os.path.abspath(os.path.dirname(__file__)), 'templates', 'template.setup'])) as f:
     SETUP_TEMPLATE = f.read()
+with open(os.sep.join([os.path.abspath(os.path.dirname(__file__)), 'templates', 'template.warmstart'])) as f:
+    WARM_START_TEMPLATE = f.read()
+with open(os.sep.join([os.path.abspath(os.path.dirname(__file__)), 'templates', 'template.checkpoint'])) as f:
+    CHECKPOINT_TEMPLATE = f.read()
+with open(os.sep.join([os.path.abspath(os.path.dirname(__file__)), 'templates', 'template.argfile'])) as f:
+    ARGFILE_TEMPLATE = f.read()
+with open(os.sep.join([os.path.abspath(os.path.dirname(__file__)), 'templates', 'template.directory'])) as f:
+    DIRECTORY_TEMPLATE = f.read()
+with open(os.sep.join([os.path.abspath(os.path.dirname(__file__)), 'templates', 'template.parallel'])) as f:
+    PARALLEL_TEMPLATE = f.read()
+
+logger = logging.getLogger('ipython2cwl.cwltoolextractor')
 
 _VariableNameTypePair = namedtuple(
     'VariableNameTypePair',
-    ['name', 'cwl_typeof', 'argparse_typeof', 'required', 'is_input', 'is_output', 'value']
+    ['name', 'cwl_typeof', 'argparse_typeof', 'required', 'is_input', 'is_output', 'value', 'secondary_files']
 )
 
+_Stage = namedtuple('Stage', ['name', 'converter', 'sources'])
+
 
 class AnnotatedVariablesExtractor(ast.NodeTransformer):
     """AnnotatedVariablesExtractor removes the typing annotations
@@ -38,6 +60,15 @@ class AnnotatedVariablesExtractor(ast.NodeTransformer):
             'File',
             'pathlib.Path',
         ),
+        (CWLMmapFileInput.__name__,): (
+            'File',
+            'lambda path: (lambda f: mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))(open(path, "rb")) '
+            'if pathlib.Path(path).stat().st_size > 0 else memoryview(b"")',
+        ),
+        (CWLDirectoryInput.__name__,): (
+            'Directory',
+            'lambda path: LazyDirectory(path)',
+        ),
         (CWLBooleanInput.__name__,): (
             'boolean',
             'lambda flag: flag.upper() == "TRUE"',
@@ -60,7 +91,9 @@ class AnnotatedVariablesExtractor(ast.NodeTransformer):
     }}
 
     output_type_mapper = {
-        (CWLFilePathOutput.__name__,)
+        (CWLFilePathOutput.__name__,): 'File',
+        (CWLOutputDirectory.__name__,): 'Directory',
+        (CWLGlobOutput.__name__,): 'File[]',
     }
 
     dumpable_mapper = {
@@ -81,11 +114,22 @@ class AnnotatedVariablesExtractor(ast.NodeTransformer):
             lambda node: str(node.target.id) + '.png'),
     }
 
+    stage_mapper = {
+        (CWLStage.__name__,)
+    }
+
+    checkpoint_mapper = {
+        (CWLCheckpoint.__name__,)
+    }
+
     def __init__(self, *args, **kwargs):
         """Create an AnnotatedVariablesExtractor"""
         super().__init__(*args, **kwargs)
         self.extracted_variables: List = []
         self.to_dump: List = []
+        self.stage_markers: Dict[int, str] = {}
+        self.checkpoint_markers: Dict[int, str] = {}
+        self.parallel_functions: Set[str] = set()
 
     def __get_annotation__(self, type_annotation):
         """Parses the annotation and returns it in a canonical format.
@@ -97,7 +141,7 @@ class AnnotatedVariablesExtractor(ast.NodeTransformer):
         elif isinstance(type_annotation, ast.Str):
             annotation = (type_annotation.s,)
             ann_expr = ast.parse(type_annotation.s.strip()).body[0]
-            if hasattr(ann_expr, 'value') and isinstance(ann_expr.value, ast.Subscript):
+            if hasattr(ann_expr, 'value') and isinstance(ann_expr.value, (ast.Subscript, ast.Call)):
                 annotation = self.__get_annotation__(ann_expr.value)
         elif isinstance(type_annotation, ast.Subscript):
             annotation = (type_annotation.value.id, *self.__get_annotation__(type_annotation.slice.value))
@@ -114,13 +158,28 @@ class AnnotatedVariablesExtractor(ast.NodeTransformer):
             value=node.value
         )
 
-    def _visit_input_ann_assign(self, node, annotation):
+    def _visit_input_ann_assign(self, node, annotation, secondary_files=None):
         mapper = self.input_type_mapper[annotation]
+        if secondary_files is not None and not mapper[0].startswith('File'):
+            raise ValueError(f'Only the file inputs can have secondary files: {node.target.id}')
         self.extracted_variables.append(_VariableNameTypePair(
-            node.target.id, mapper[0], mapper[1], not mapper[0].endswith('?'), True, False, None)
+            node.target.id, mapper[0], mapper[1], not mapper[0].endswith('?'), True, False, None, secondary_files)
         )
         return None
 
+    @classmethod
+    def __get_secondary_files__(cls, type_annotation) -> List[str]:
+        """Returns the patterns of the secondary files of an annotation like CWLFilePathInput.secondary('.bai')."""
+        if isinstance(type_annotation, ast.Str):
+            type_annotation = ast.parse(type_annotation.s.strip())
+        call = [
+            node for node in ast.walk(type_annotation)
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'secondary'
+        ][0]
+        if len(call.args) == 0 or not all(isinstance(arg, ast.Str) for arg in call.args):
+            raise ValueError('The patterns of the secondary files must be string literals')
+        return [arg.s for arg in call.args]  # type: ignore
+
     def _visit_default_dumper(self, node, dumper):
         if dumper[0][0] is None:
             pre_code_body = []
@@ -131,7 +190,7 @@ class AnnotatedVariablesExtractor(ast.NodeTransformer):
         else:
             post_code_body = ast.parse(dumper[0][1].format(var_name=node.target.id)).body
         self.extracted_variables.append(_VariableNameTypePair(
-            node.target.id, None, None, None, False, True, dumper[1](node))
+            node.target.id, None, None, None, False, True, dumper[1](node), None)
         )
         return [*pre_code_body, self.conv_AnnAssign_to_Assign(node), *post_code_body]
 
@@ -155,14 +214,14 @@ class AnnotatedVariablesExtractor(ast.NodeTransformer):
         ast.fix_missing_locations(new_dump_node)
         self.to_dump.append([new_dump_node])
         self.extracted_variables.append(_VariableNameTypePair(
-            node.target.id, None, None, None, False, True, node.annotation.args[1].s)
+            node.target.id, None, None, None, False, True, node.annotation.args[1].s, None)
         )
         # removing type annotation
         return self.conv_AnnAssign_to_Assign(node)
 
-    def _visit_output_type(self, node):
+    def _visit_output_type(self, node, annotation):
         self.extracted_variables.append(_VariableNameTypePair(
-            node.target.id, None, None, None, False, True, node.value.s)
+            node.target.id, self.output_type_mapper[annotation], None, None, False, True, node.value.s, None)
         )
         # removing type annotation
         return ast.Assign(
@@ -172,10 +231,24 @@ class AnnotatedVariablesExtractor(ast.NodeTransformer):
             value=node.value
         )
 
+    @classmethod
+    def _visit_marker(cls, node, markers: Dict[int, str]):
+        marker = ast.Pass(col_offset=node.col_offset, lineno=node.lineno)
+        markers[id(marker)] = node.target.id
+        return marker
+
     def visit_AnnAssign(self, node):
         try:
             annotation = self.__get_annotation__(node.annotation)
-            if annotation in self.input_type_mapper:
+            if annotation[-1] == 'secondary':
+                return self._visit_input_ann_assign(
+                    node, annotation[:-1], self.__get_secondary_files__(node.annotation)
+                )
+            if annotation in self.stage_mapper:
+                return self._visit_marker(node, self.stage_markers)
+            elif annotation in self.checkpoint_mapper:
+                return self._visit_marker(node, self.checkpoint_markers)
+            elif annotation in self.input_type_mapper:
                 return self._visit_input_ann_assign(node, annotation)
             elif annotation in self.dumpable_mapper:
                 dumper = self.dumpable_mapper[annotation]
@@ -184,11 +257,55 @@ class AnnotatedVariablesExtractor(ast.NodeTransformer):
                 else:
                     return self._visit_user_defined_dumper(node)
             elif annotation in self.output_type_mapper:
-                return self._visit_output_type(node)
+                return self._visit_output_type(node, annotation)
+        except ValueError:
+            # an ipython2cwl annotation which is used wrongly
+            raise
         except Exception:
             pass
         return node
 
+    @classmethod
+    def __is_parallel_map_decorator__(cls, decorator) -> bool:
+        return (isinstance(decorator, ast.Name) and decorator.id == CWLParallelMap.__name__) or \
+            (isinstance(decorator, ast.Attribute) and decorator.attr == CWLParallelMap.__name__)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> Any:
+        """Removes the CWLParallelMap decorator and records the decorated function"""
+        decorators = [d for d in node.decorator_list if not self.__is_parallel_map_decorator__(d)]
+        if len(decorators) < len(node.decorator_list):
+            node.decorator_list = decorators
+            self.parallel_functions.add(node.name)
+        return self.generic_visit(node)
+
+    @classmethod
+    def _parallel_map_call(cls, node, function: ast.Name, iterables: List[ast.expr]) -> ast.Call:
+        call = ast.Call(func=ast.Name(id='parallel_map', ctx=ast.Load()), args=[function, *iterables], keywords=[])
+        return ast.copy_location(call, node)
+
+    def visit_Call(self, node: ast.Call) -> Any:
+        """Replaces map(function, items) of a CWLParallelMap function with a parallel map"""
+        node = self.generic_visit(node)  # type: ignore
+        if isinstance(node.func, ast.Name) and node.func.id == 'map' and len(node.args) >= 2 and \
+                len(node.keywords) == 0 and isinstance(node.args[0], ast.Name) and \
+                node.args[0].id in self.parallel_functions:
+            return self._parallel_map_call(node, node.args[0], node.args[1:])
+        return node
+
+    def visit_ListComp(self, node: ast.ListComp) -> Any:
+        """Replaces [function(item) for item in items] of a CWLParallelMap function with a parallel map"""
+        node = self.generic_visit(node)  # type: ignore
+        if len(node.generators) != 1:
+            return node
+        generator, element = node.generators[0], node.elt
+        if len(generator.ifs) == 0 and not getattr(generator, 'is_async', False) and \
+                isinstance(generator.target, ast.Name) and isinstance(element, ast.Call) and \
+                isinstance(element.func, ast.Name) and element.func.id in self.parallel_functions and \
+                len(element.keywords) == 0 and len(element.args) == 1 and isinstance(element.args[0], ast.Name) and \
+                element.args[0].id == generator.target.id:
+            return self._parallel_map_call(node, element.func, [generator.iter])
+        return node
+
     def visit_Import(self, node: ast.Import) -> Any:
         """Remove ipython2cwl imports """
         names = []
@@ -224,6 +341,32 @@ class AnnotatedIPython2CWLToolConverter:
         self._code = annotated_ipython_code
         extractor = AnnotatedVariablesExtractor()
         self._tree = extractor.visit(ast.parse(self._code))
+        # the stages start at the top level markers, which are removed from the tree
+        self._stages: List[Tuple[str, int]] = []
+        # the checkpoint blocks contain the rest of the cell of the top level markers
+        code_lines = self._code.splitlines()
+        cell_lines = [i + 1 for i, line in enumerate(code_lines) if line.startswith('# In[')]
+        body: List = []
+        block, block_end = None, 0
+        for node in [*self._tree.body, None]:
+            if block is not None and (node is None or id(node) in extractor.stage_markers or
+                                      id(node) in extractor.checkpoint_markers or node.lineno >= block_end):
+                if len(block.body) == 0:
+                    body.pop()
+                block = None
+            if node is None:
+                break
+            if id(node) in extractor.stage_markers:
+                self._stages.append((extractor.stage_markers[id(node)], len(body)))
+            elif id(node) in extractor.checkpoint_markers:
+                block = self.__checkpoint_block__(extractor.checkpoint_markers[id(node)], node)
+                block_end = next((line for line in cell_lines if line > node.lineno), len(code_lines) + 1)
+                body.append(block)
+            elif block is not None:
+                block.body.append(node)
+            else:
+                body.append(node)
+        self._tree.body = body
         for d in extractor.to_dump:
             self._tree.body.extend(d)
         self._tree = ast.fix_missing_locations(self._tree)
@@ -234,6 +377,277 @@ class AnnotatedIPython2CWLToolConverter:
             if variable.is_output:
                 self._variables.append(variable)
 
+    _CHECKPOINT_PREFIX = '_checkpoint_block_'
+
+    @classmethod
+    def __checkpoint_block__(cls, name: str, marker: ast.stmt) -> ast.If:
+        """Returns the placeholder of a checkpoint block. The placeholder keeps the block as a single statement of
+        the tree, until the script generation replaces it with the checkpoint code."""
+        block = ast.If(test=ast.Name(id=f'{cls._CHECKPOINT_PREFIX}{name}', ctx=ast.Load()), body=[], orelse=[])
+        return ast.copy_location(block, marker)
+
+    @classmethod
+    def __get_checkpoint_name__(cls, node) -> Optional[str]:
+        if isinstance(node, ast.If) and isinstance(node.test, ast.Name) and \
+                node.test.id.startswith(cls._CHECKPOINT_PREFIX):
+            return node.test.id[len(cls._CHECKPOINT_PREFIX):]
+        return None
+
+    @classmethod
+    def __get_checkpoint_body__(cls, tree, variables, body: List[ast.stmt]) -> List[ast.stmt]:
+        """Replaces the placeholders of the checkpoint blocks with code which restores the variables of the block
+        from a valid checkpoint, or executes the block and checkpoints its variables. The key of a checkpoint is the
+        hash of the code up to the block and of the inputs that code depends on. The checkpoint contains every
+        variable which the block uses or changes and the later code uses. A block whose side effects can not be
+        analysed, like a call of an unknown function that may change its arguments, is never restored."""
+        inputs = [v.name for v in variables if v.is_input]
+        repeated = (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+        # the imports and the definitions of the blocks are executed before the blocks, even when they are restored,
+        # so they are analysed as top level statements
+        hoisted: Dict[str, List[ast.stmt]] = {}
+        hoisted_body: List[ast.stmt] = []
+        for stmt in tree.body:
+            name = cls.__get_checkpoint_name__(stmt)
+            if name is None:
+                hoisted_body.append(stmt)
+                continue
+            hoisted[name] = [s for s in stmt.body if isinstance(s, repeated)]
+            block = copy(stmt)
+            block.body = [s for s in stmt.body if not isinstance(s, repeated)] or [ast.Pass()]
+            hoisted_body.extend([*hoisted[name], block])
+        tree = ast.Module(body=hoisted_body, type_ignores=[])
+        slicer = ProgramSlicer(tree, [v.name for v in variables if v.is_output], inputs)
+        dataflow = slicer.statement_dataflow()
+        unknown_effects = slicer.statement_unknown_effects()
+        definitions = set().union(*[killed for stmt, (_, _, killed) in zip(tree.body, dataflow)
+                                    if isinstance(stmt, repeated)])
+        # the names which are bound by the notebook, unlike the builtins
+        notebook_names = set().union(*[defs for _, defs, _ in dataflow])
+        replacements: Dict[str, List[ast.stmt]] = {}
+        for i, stmt in enumerate(tree.body):
+            name = cls.__get_checkpoint_name__(stmt)
+            if name is None:
+                continue
+            if unknown_effects[i]:
+                message = f'Checkpoint {name} is disabled, because the side effects of its block can not be analysed'
+                logger.warning(message)
+                warning = ast.parse(f"if _checkpoint_dir is not None:\n\tprint({message!r}, file=sys.stderr)").body
+                replacements[name] = hoisted[name] + warning + stmt.body
+                continue
+            prefix = tree.body[:i + 1]
+            code_digest = hashlib.sha256(
+                astor.to_source(ast.Module(body=prefix, type_ignores=[])).encode()
+            ).hexdigest()
+            prefix_live = cls.__live_variables__(dataflow[:i + 1])
+            key_inputs = [input_name for input_name in inputs if input_name in prefix_live]
+            live_after = cls.__live_variables__(dataflow[i + 1:])
+            snapshot = sorted(((dataflow[i][0] | dataflow[i][1]) & live_after & notebook_names) - definitions)
+            code = os.linesep.join([
+                f"_checkpoint_key = checkpoint_key(_checkpoint_dir, '{code_digest}', [{', '.join(key_inputs)}])",
+                "_snapshot = checkpoint_load(_checkpoint_dir, _checkpoint_key)",
+                "if _snapshot is None:",
+                "\tpass",
+                "\tcheckpoint_save(_checkpoint_dir, _checkpoint_max_mb, _checkpoint_key, "
+                f"{{{', '.join(f'{var!r}: {var}' for var in snapshot)}}})",
+                "else:",
+                *([f"\t{var} = _snapshot[{var!r}]" for var in snapshot] or ["\tpass"]),
+            ])
+            checkpoint = ast.parse(code).body
+            checkpoint[-1].body[:1] = stmt.body  # type: ignore
+            replacements[name] = hoisted[name] + checkpoint
+
+        class CheckpointTransformer(ast.NodeTransformer):
+            def visit_If(self, node):
+                name = cls.__get_checkpoint_name__(node)
+                if name is not None:
+                    return replacements[name]
+                return self.generic_visit(node)
+
+        return CheckpointTransformer().visit(ast.Module(body=body, type_ignores=[])).body
+
+    def slice(self) -> List[str]:
+        """
+        Removes the statements that none of the outputs depends on, like exploratory cells. Statements with side
+        effects that cannot be analysed are kept.
+        :return: A report with the line number and the code of each removed statement
+        """
+        outputs = [v.name for v in self._variables if v.is_output]
+        removed = ProgramSlicer(self._tree, outputs, [v.name for v in self._variables if v.is_input]).slice()
+        return [f'line {stmt.lineno}: {astor.to_source(stmt).splitlines()[0]}' for stmt in removed]
+
+    @classmethod
+    def _from_tree(cls, tree: ast.Module, variables: List) -> 'AnnotatedIPython2CWLToolConverter':
+        """Creates a converter of an already transformed tree and its extracted variables"""
+        converter = cls.__new__(cls)
+        converter._tree = ast.fix_missing_locations(tree)
+        converter._code = astor.to_source(converter._tree)
+        converter._stages = []
+        converter._variables = variables
+        return converter
+
+    @classmethod
+    def __live_variables__(cls, dataflow: List[Tuple[Set[str], Set[str], Set[str]]]) -> Set[str]:
+        """Returns the names which are used by the statements before they are rebound."""
+        live: Set[str] = set()
+        for uses, _, killed in reversed(dataflow):
+            live = (live - killed) | uses
+        return live
+
+    def _split_stages(self) -> List[_Stage]:
+        """
+        Splits the notebook at the stage markers. Each stage loads the variables it uses from the pickle files of
+        the stages which last defined them and dumps the variables that the later stages use. The imports,
+        functions and classes are repeated instead.
+        :return: The stages in the order of the notebook
+        """
+        if len(self._stages) == 0:
+            raise ValueError('The notebook does not contain any stage annotation')
+        boundaries = list(self._stages)
+        has_prelude = boundaries[0][1] > 0
+        if has_prelude:
+            boundaries.insert(0, ('main', 0))
+        names = [name for name, _ in boundaries]
+        if len(set(names)) != len(names):
+            raise ValueError(f'The stage names must be unique: {names}')
+        ranges = [
+            (start, boundaries[i + 1][1] if i + 1 < len(boundaries) else len(self._tree.body))
+            for i, (_, start) in enumerate(boundaries)
+        ]
+        body = self._tree.body
+        inputs = [v for v in self._variables if v.is_input]
+        outputs = [v for v in self._variables if v.is_output]
+        dataflow = ProgramSlicer(self._tree, [v.name for v in outputs], [v.name for v in inputs]).statement_dataflow()
+        stage_of = {i: s for s, (start, end) in enumerate(ranges) for i in range(start, end)}
+        repeated = (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+        copies: List[Set[int]] = []
+        loads: List[Dict[str, int]] = []
+        stage_inputs: List[List] = []
+        for start, end in ranges:
+            stage_copies: Set[int] = set()
+            stage_loads: Dict[str, int] = {}
+            while True:
+                statements = sorted(stage_copies) + list(range(start, end))
+                live = self.__live_variables__([dataflow[i] for i in statements])
+                new_copies = set(stage_copies)
+                for name in live:
+                    producer = next((j for j in reversed(range(start)) if name in dataflow[j][1]), None)
+                    if producer is None:
+                        continue
+                    imports = [
+                        j for j in range(start)
+                        if isinstance(body[j], (ast.Import, ast.ImportFrom)) and name in dataflow[j][2]
+                    ]
+                    if isinstance(body[producer], repeated):
+                        new_copies.add(producer)
+                    elif len(imports) > 0:
+                        new_copies.add(imports[-1])
+                    else:
+                        stage_loads[name] = stage_of[producer]
+                if new_copies == stage_copies:
+                    break
+                stage_copies = new_copies
+            copies.append(stage_copies)
+            loads.append({name: stage_loads[name] for name in sorted(stage_loads) if name in live})
+            stage_inputs.append([v for v in inputs if v.name in live and v.name not in stage_loads])
+
+        dumps: List[Set[str]] = [set() for _ in ranges]
+        for stage_loads in loads:
+            for name, producer_stage in stage_loads.items():
+                dumps[producer_stage].add(name)
+        stage_outputs: List[List] = [[] for _ in ranges]
+        for output in outputs:
+            users = [stage_of[i] for i in range(len(body)) if output.name in dataflow[i][0] | dataflow[i][1]]
+            stage_outputs[users[-1] if len(users) > 0 else len(ranges) - 1].append(output)
+
+        stages = []
+        for s, (start, end) in enumerate(ranges):
+            if s == 0 and has_prelude and len(dumps[s]) == 0 and len(stage_outputs[s]) == 0:
+                # the statements before the first annotation are usually only imports and definitions
+                continue
+            load_code = [
+                f"with open({name}_pickle, 'rb') as _stage_file:\n\t{name} = pickle.load(_stage_file)"
+                for name in loads[s]
+            ]
+            dump_code = [
+                f"{name}_pickle = '{name}.pickle'\n"
+                f"with open({name}_pickle, 'wb') as _stage_file:\n\tpickle.dump({name}, _stage_file)"
+                for name in sorted(dumps[s])
+            ]
+            tree = ast.Module(body=[
+                *ast.parse('import pickle').body,
+                *[deepcopy(body[i]) for i in sorted(copies[s])],
+                *[stmt for code in load_code for stmt in ast.parse(code).body],
+                *[deepcopy(stmt) for stmt in body[start:end]],
+                *[stmt for code in dump_code for stmt in ast.parse(code).body],
+            ], type_ignores=[])
+            variables = [
+                *stage_inputs[s],
+                *[_VariableNameTypePair(f'{name}_pickle', 'File', 'pathlib.Path', True, True, False, None, None)
+                  for name in loads[s]],
+                *stage_outputs[s],
+                *[_VariableNameTypePair(f'{name}_pickle', None, None, None, False, True, f'{name}.pickle', None)
+                  for name in sorted(dumps[s])],
+            ]
+            sources = {
+                **{v.name: v.name for v in stage_inputs[s]},
+                **{f'{name}_pickle': f'{names[producer_stage]}/{name}_pickle'
+                   for name, producer_stage in loads[s].items()},
+            }
+            stages.append(_Stage(names[s], self._from_tree(tree, variables), sources))
+        return stages
+
+    def stage_scripts(self) -> Dict[str, str]:
+        """
+        Generates the scripts of the stages of the notebook.
+        :return: The script of each stage by the stage name
+        """
+        return {
+            stage.name: stage.converter._wrap_script_to_method(stage.converter._tree, stage.converter._variables)
+            for stage in self._split_stages()
+        }
+
+    def cwl_stages_workflow(self, docker_image_id: str = 'jn2cwl:latest',
+                            base_commands: Optional[Dict[str, str]] = None) -> Dict:
+        """
+        Creates the description of a CWL Workflow with a step for each stage of the notebook. The steps which do
+        not depend on each other can be executed in parallel by the runner.
+        :param docker_image_id: The docker image id of the tools
+        :param base_commands: The base command of each stage by the stage name. By default the base command of a
+                              stage is notebookTool_{stage name}
+        :return: The cwl description of the corresponding workflow
+        """
+        base_commands = {} if base_commands is None else base_commands
+        steps = {}
+        for stage in self._split_stages():
+            tool = stage.converter.cwl_command_line_tool(docker_image_id)
+            tool['baseCommand'] = base_commands.get(stage.name, f'notebookTool_{stage.name}')
+            steps[stage.name] = {
+                'run': tool,
+                'in': stage.sources,
+                'out': list(tool['outputs']),
+            }
+        return {
+            'cwlVersion': 'v1.1',
+            'class': 'Workflow',
+            'inputs': {
+                v.name: {
+                    'type': v.cwl_typeof,
+                    **({'secondaryFiles': list(v.secondary_files)} if v.secondary_files else {}),
+                }
+                for v in self._variables if v.is_input
+            },
+            'outputs': {
+                output_name: {
+                    'type': step['run']['outputs'][output_name]['type'],
+                    'outputSource': f'{step_name}/{output_name}'
+                }
+                for v in self._variables if v.is_output
+                for step_name, step in steps.items() for output_name in step['out'] if output_name == v.name
+            },
+            'steps': steps,
+        }
+
     @classmethod
     def from_jupyter_notebook_node(cls, node: NotebookNode) -> 'AnnotatedIPython2CWLToolConverter':
         python_exporter = nbconvert.PythonExporter()
@@ -241,35 +655,183 @@ class AnnotatedIPython2CWLToolConverter:
         return cls(code)
 
     @classmethod
-    def _wrap_script_to_method(cls, tree, variables) -> str:
+    def _wrap_script_to_method(cls, tree, variables, warm_start: bool = False) -> str:
+        """
+        Wraps the transformed notebook to the main function of the script of the tool.
+        :param tree: The transformed notebook
+        :param variables: The annotated variables of the notebook
+        :param warm_start: Embed the warm-start server and client, which execute the tool at a fork of a server
+                           that has already imported the top level imports
+        :return: The source code of the script
+        """
         add_args = cls.__get_add_arguments__([v for v in variables if v.is_input])
+        main_args = [v.name for v in variables if v.is_input]
+        main_call_args = [f'{v.name}=args.{v.name} ' for v in variables if v.is_input]
+        outputs = [v.name for v in variables if v.is_output]
+        if len(outputs) > 0:
+            add_args.append(
+                f"parser.add_argument('--only-outputs', dest='_only_outputs', nargs='+', choices={sorted(outputs)}, "
+                f"default=None)"
+            )
+            main_args.append('_only_outputs=None')
+            main_call_args.append('_only_outputs=args._only_outputs ')
+        has_checkpoints = any(cls.__get_checkpoint_name__(stmt) is not None for stmt in tree.body)
+        if has_checkpoints:
+            add_args.extend([
+                "parser.add_argument('--checkpoint-dir', dest='_checkpoint_dir', type=pathlib.Path, "
+                "default=os.environ.get('IPYTHON2CWL_CHECKPOINT_DIR'))",
+                "parser.add_argument('--checkpoint-max-mb', dest='_checkpoint_max_mb', type=int, default=1024)",
+            ])
+            main_args.extend(['_checkpoint_dir=None', '_checkpoint_max_mb=1024'])
+            main_call_args.extend([
+                '_checkpoint_dir=args._checkpoint_dir ', '_checkpoint_max_mb=args._checkpoint_max_mb ',
+            ])
+        main_call = f"main({','.join(main_call_args)})"
+        file_inputs = [v.name for v in variables if v.is_input and v.cwl_typeof.startswith(('File', 'Directory'))]
         main_template_code = os.linesep.join([
-            f"def main({','.join([v.name for v in variables if v.is_input])}):",
+            f"def main({','.join(main_args)}):",
             "\tpass",
             "if __name__ == '__main__':",
             *['\t' + line for line in [
                 "import argparse",
+                'import json',
+                'import mmap',
+                'import os',
                 'import pathlib',
                 "parser = argparse.ArgumentParser()",
                 *add_args,
-                "args = parser.parse_args()",
-                f"main({','.join([f'{v.name}=args.{v.name} ' for v in variables if v.is_input])})"
+                "batch_parser = argparse.ArgumentParser(add_help=False)",
+                "batch_parser.add_argument('--batch-manifest', type=pathlib.Path, default=None)",
+                "def run(argv):",
+                "\tbatch_args, argv = batch_parser.parse_known_args(argv)",
+                "\tif batch_args.batch_manifest is None:",
+                "\t\targs = parser.parse_args(argv)",
+                f"\t\t{main_call}",
+                "\telse:",
+                *['\t\t' + batch_line for batch_line in cls.__get_batch_lines__(main_call, file_inputs)],
             ]],
         ])
         main_function = ast.parse(main_template_code)
+        main_body = cls.__get_guarded_body__(tree, outputs, [v.name for v in variables if v.is_input])
+        if has_checkpoints:
+            main_body = cls.__get_checkpoint_body__(tree, variables, main_body)
         [node for node in main_function.body if isinstance(node, ast.FunctionDef) and node.name == 'main'][0] \
-            .body = tree.body
+            .body = main_body
+        has_lists = any(v.is_input and v.cwl_typeof.endswith('[]') for v in variables)
+        has_directories = any(v.is_input and v.cwl_typeof.startswith('Directory') for v in variables)
+        has_parallel_maps = any(
+            isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'parallel_map'
+            for node in ast.walk(tree)
+        )
+        [node for node in main_function.body if isinstance(node, ast.If)][0] \
+            .body.extend([
+                *(ast.parse(DIRECTORY_TEMPLATE).body if has_directories else []),
+                *(ast.parse(ARGFILE_TEMPLATE).body if has_lists else []),
+                *(ast.parse(CHECKPOINT_TEMPLATE).body if has_checkpoints else []),
+                *(ast.parse(PARALLEL_TEMPLATE).body if has_parallel_maps else []),
+            ])
+        if warm_start:
+            # the server only runs the clients of the same script
+            script_hash = hashlib.sha256(astor.to_source(main_function).encode()).hexdigest()
+            run_lines = os.linesep.join([
+                f"warm_imports = {cls.__get_top_level_imports__(tree)}",
+                f"warm_script_hash = '{script_hash}'",
+                WARM_START_TEMPLATE,
+            ])
+        else:
+            run_lines = os.linesep.join(['import sys', 'run(sys.argv[1:])'])
+        [node for node in main_function.body if isinstance(node, ast.If)][0].body.extend(ast.parse(run_lines).body)
         return astor.to_source(main_function)
 
+    @classmethod
+    def __get_guarded_body__(cls, tree, outputs: List[str], inputs: List[str]) -> List[ast.stmt]:
+        """Wraps each statement which is not required by all the outputs in an if statement, which checks if any
+        of the outputs that depend on it was requested with the --only-outputs argument."""
+        if len(outputs) == 0:
+            return tree.body
+        body: List[ast.stmt] = []
+        previous_outputs = None
+        for stmt, statement_outputs in zip(tree.body, ProgramSlicer(tree, outputs, inputs).statement_outputs()):
+            if statement_outputs is None or statement_outputs == frozenset(outputs):
+                body.append(stmt)
+                previous_outputs = None
+                continue
+            if statement_outputs == previous_outputs:
+                body[-1].body.append(stmt)  # type: ignore
+                continue
+            test = '_only_outputs is None'
+            if len(statement_outputs) > 0:
+                test += f' or set(_only_outputs) & {{{", ".join(repr(o) for o in sorted(statement_outputs))}}}'
+            guard = ast.parse(f'if {test}:\n\tpass').body[0]
+            guard.body = [stmt]  # type: ignore
+            body.append(ast.copy_location(guard, stmt))
+            previous_outputs = statement_outputs
+        return body
+
+    @classmethod
+    def __get_top_level_imports__(cls, tree) -> List[str]:
+        """Returns the names of the modules imported at the top level of the notebook. These are imported by the
+        warm-start server before forking the children which execute the tool."""
+        modules: List[str] = []
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module is not None:
+                names = [node.module]
+            else:
+                continue
+            modules.extend(name for name in names if name not in modules)
+        return modules
+
+    @classmethod
+    def __get_batch_lines__(cls, main_call: str, file_inputs: List[str]) -> List[str]:
+        """Returns the lines which execute the main function once for each line of a JSON-lines manifest. Each line
+        of the manifest is an object which maps the input names to their values. Relative file paths are resolved
+        against the directory of the manifest and each execution writes its outputs in the directory
+        batch_{line index}."""
+        return [
+            "cwd = pathlib.Path.cwd()",
+            "manifest_dir = batch_args.batch_manifest.absolute().parent",
+            "with open(batch_args.batch_manifest) as manifest:",
+            "\tfor i, line in enumerate(line for line in manifest if line.strip()):",
+            "\t\tbatch_argv = []",
+            "\t\tfor name, value in json.loads(line).items():",
+            "\t\t\tif value is None:",
+            "\t\t\t\tcontinue",
+            "\t\t\tvalues = value if isinstance(value, list) else [value]",
+            f"\t\t\tif name in {tuple(sorted(file_inputs))}:",
+            "\t\t\t\tvalues = [manifest_dir.joinpath(v) for v in values]",
+            "\t\t\tbatch_argv.append(f'--{name}')",
+            "\t\t\tbatch_argv.extend(str(v).lower() if isinstance(v, bool) else str(v) for v in values)",
+            "\t\targs = parser.parse_args(batch_argv)",
+            "\t\toutput_dir = cwd.joinpath(f'batch_{i:06d}')",
+            "\t\toutput_dir.mkdir(exist_ok=True)",
+            "\t\tos.chdir(output_dir)",
+            "\t\ttry:",
+            f"\t\t\t{main_call}",
+            "\t\tfinally:",
+            "\t\t\tos.chdir(cwd)",
+        ]
+
     @classmethod
     def __get_add_arguments__(cls, variables):
+        """Returns the lines which add the arguments of the inputs to the parser. The values of each list input
+        can be given either on the command line or with an argument file."""
         args = []
         for variable in variables:
             is_array = variable.cwl_typeof.endswith('[]')
             is_optional = variable.cwl_typeof.endswith('?')
             arg: str = f'parser.add_argument("--{variable.name}", '
             arg += f'type={variable.argparse_typeof}, '
-            arg += f'required={variable.required}, '
+            if is_array:
+                args.extend([
+                    f'group = parser.add_mutually_exclusive_group(required={variable.required})',
+                    f'group.add_argument("--{variable.name}-argfile", dest="{variable.name}", '
+                    f'type=lambda path: read_argfile(path, {variable.argparse_typeof}))',
+                ])
+                arg = arg.replace('parser.', 'group.', 1)
+            else:
+                arg += f'required={variable.required}, '
             if is_array:
                 arg += f'nargs="+", '
             if is_optional:
@@ -300,63 +862,306 @@ class AnnotatedIPython2CWLToolConverter:
                     'type': input_var.cwl_typeof,
                     'inputBinding': {
                         'prefix': f'--{input_var.name}'
-                    }
+                    },
+                    **({'secondaryFiles': list(input_var.secondary_files)} if input_var.secondary_files else {}),
                 }
                 for input_var in inputs},
             'outputs': {
                 out.name: {
-                    'type': 'File',
+                    'type': 'File' if out.cwl_typeof is None else out.cwl_typeof,
                     'outputBinding': {
-                        'glob': out.value
+                        'glob': out.value,
+                        **({'loadListing': 'no_listing'} if out.cwl_typeof == 'Directory' else {}),
                     }
                 }
                 for out in outputs
             },
         }
+        if any(input_var.cwl_typeof.startswith('Directory') for input_var in inputs):
+            cwl_tool['requirements'] = {'LoadListingRequirement': {'loadListing': 'no_listing'}}
         return cwl_tool
 
-    def compile(self, filename: Path = Path('notebookAsCWLTool.tar')) -> str:
+    def cwl_batch_command_line_tool(self, docker_image_id: str = 'jn2cwl:latest') -> Dict:
+        """
+        Creates the description of a CWL Command Line Tool which executes the notebook once for each parameter set
+        of a JSON-lines manifest, in a single job.
+        :param docker_image_id: The docker image id of the tool
+        :return: The cwl description of the corresponding tool
+        """
+        return self.batch_command_line_tool(self.cwl_command_line_tool(docker_image_id))
+
+    @classmethod
+    def batch_command_line_tool(cls, tool: Dict) -> Dict:
+        """
+        Converts a CWL Command Line Tool description to its batch-invocation companion. The companion tool takes a
+        manifest File, where each line is a JSON object mapping the input names of the tool to their values, and
+        gathers the outputs of every line into arrays. The files and directories which the manifest references are
+        given with the batch_files input and they are staged next to the manifest in the working directory, so the
+        relative paths of the manifest resolve to them inside the container.
+        :param tool: The cwl description of the tool, as generated by cwl_command_line_tool
+        :return: The cwl description of the batch tool
+        """
+        batch_tool = deepcopy(tool)
+        batch_tool['inputs'] = {
+            'batch_manifest': {
+                'type': 'File',
+                'inputBinding': {
+                    'prefix': '--batch-manifest',
+                    'valueFrom': '$(self.basename)'
+                }
+            },
+            'batch_files': {
+                'type': {'type': 'array', 'items': ['File', 'Directory']},
+                'default': []
+            }
+        }
+        batch_tool['requirements'] = {
+            **batch_tool.get('requirements', {}),
+            'InitialWorkDirRequirement': {
+                'listing': ['$(inputs.batch_manifest)', '$(inputs.batch_files)']
+            }
+        }
+        batch_tool['outputs'] = {
+            output_name: {
+                'type': output_description['type'] if output_description['type'].endswith('[]')
+                else f'{output_description["type"]}[]',
+                'outputBinding': {
+                    **output_description['outputBinding'],
+                    'glob': f'batch_*/{output_description["outputBinding"]["glob"]}'
+                }
+            }
+            for output_name, output_description in tool['outputs'].items()
+        }
+        return batch_tool
+
+    def cwl_argfile_command_line_tool(self, docker_image_id: str = 'jn2cwl:latest') -> Dict:
+        """
+        Creates the description of a CWL Command Line Tool which passes the list inputs with argument files.
+        :param docker_image_id: The docker image id of the tool
+        :return: The cwl description of the corresponding tool
+        """
+        return self.argfile_command_line_tool(self.cwl_command_line_tool(docker_image_id))
+
+    @classmethod
+    def argfile_command_line_tool(cls, tool: Dict) -> Dict:
+        """
+        Converts a CWL Command Line Tool description to a tool which passes each list input with an argument file
+        instead of the command line, so that lists of any size do not exceed the maximum length of the command line.
+        The runner writes the items of each list input as a JSON array to the file {input name}.argfile.json, which
+        the tool reads when it uses the list for the first time.
+        :param tool: The cwl description of the tool, as generated by cwl_command_line_tool
+        :return: The cwl description of the argfile tool
+        """
+        argfile_tool = deepcopy(tool)
+        listing = []
+        arguments = list(argfile_tool.get('arguments', []))
+        for input_name, input_description in argfile_tool['inputs'].items():
+            if not input_description['type'].endswith('[]') or 'inputBinding' not in input_description:
+                continue
+            input_description.pop('inputBinding')
+            values = f'inputs.{input_name}'
+            if input_description['type'] in ('File[]', 'Directory[]'):
+                values += '.map(function(f) { return f.path; })'
+            listing.append({'entryname': f'{input_name}.argfile.json', 'entry': f'$(JSON.stringify({values}))'})
+            arguments.append({
+                'position': 1, 'prefix': f'--{input_name}-argfile', 'valueFrom': f'{input_name}.argfile.json'
+            })
+        if len(listing) > 0:
+            argfile_tool['arguments'] = arguments
+            argfile_tool['requirements'] = {
+                **argfile_tool.get('requirements', {}),
+                'InlineJavascriptRequirement': {},
+                'InitialWorkDirRequirement': {'listing': listing},
+            }
+        return argfile_tool
+
+    def cwl_scatter_workflow(self, scatter: List[str], docker_image_id: str = 'jn2cwl:latest') -> Dict:
+        """
+        Creates the description of a CWL Workflow which scatters the Command Line Tool over the given list inputs.
+        :param scatter: The names of the list inputs to scatter over
+        :param docker_image_id: The docker image id of the tool
+        :return: The cwl description of the corresponding workflow
+        """
+        return self.scatter_workflow(self.cwl_command_line_tool(docker_image_id), scatter)
+
+    @classmethod
+    def __get_array_type__(cls, cwl_type: str):
+        """Returns the type of an array of cwl_type. The arrays of arrays are not supported by the [] notation."""
+        if not cwl_type.endswith('[]'):
+            return f'{cwl_type}[]'
+        return {'type': 'array', 'items': {'type': 'array', 'items': cwl_type[:-2]}}
+
+    @classmethod
+    def scatter_workflow(cls, tool: Dict, scatter: List[str]) -> Dict:
+        """
+        Wraps a CWL Command Line Tool description to a Workflow with a single step which is scattered over the
+        given list inputs. Each scattered input is passed to the tool one item at a time and each tool output
+        is gathered to an array.
+        :param tool: The cwl description of the tool, as generated by cwl_command_line_tool
+        :param scatter: The names of the list inputs to scatter over
+        :return: The cwl description of the corresponding workflow
+        """
+        if len(scatter) == 0:
+            raise ValueError('At least one input is required to scatter over')
+        for input_name in scatter:
+            if input_name not in tool['inputs'] or not tool['inputs'][input_name]['type'].endswith('[]'):
+                raise ValueError(f'Input {input_name} is not a list input of the tool')
+        step_tool = deepcopy(tool)
+        for input_name in scatter:
+            step_tool['inputs'][input_name]['type'] = step_tool['inputs'][input_name]['type'][:-2]
+        step = {
+            'run': step_tool,
+            'in': {input_name: input_name for input_name in tool['inputs']},
+            'out': list(tool['outputs']),
+            'scatter': list(scatter),
+        }
+        if len(scatter) > 1:
+            step['scatterMethod'] = 'dotproduct'
+        return {
+            'cwlVersion': tool['cwlVersion'],
+            'class': 'Workflow',
+            'requirements': {
+                'ScatterFeatureRequirement': {}
+            },
+            'inputs': {
+                input_name: {
+                    key: value for key, value in input_description.items() if key in ('type', 'secondaryFiles')
+                }
+                for input_name, input_description in tool['inputs'].items()
+            },
+            'outputs': {
+                output_name: {
+                    'type': cls.__get_array_type__(output_description['type']),
+                    'outputSource': f'notebookTool/{output_name}'
+                }
+                for output_name, output_description in tool['outputs'].items()
+            },
+            'steps': {
+                'notebookTool': step
+            },
+        }
+
+    def compile(self, filename: Path = Path('notebookAsCWLTool.tar'), cwl_format: str = 'yaml',
+                validate: bool = False, wheelhouse: bool = False, offline: bool = False) -> str:
         """
         That method generates a tar file which includes the following files:
         notebookTool - the python script
         tool.cwl - the cwl description file
         Dockerfile - the dockerfile to create the docker image
+        wheels - the wheels of the requirements, if wheelhouse is set
         :param: filename
+        :param cwl_format: The format of tool.cwl, yaml or json
+        :param validate: Validate tool.cwl against the CWL schema before writing the tar file
+        :param wheelhouse: Include the wheels of the requirements, so the image is built without network access.
+                           The wheels are collected for the current python version and platform, so only the
+                           pure python wheels and the linux wheels are accepted
+        :param offline: Collect the wheels without accessing the package index, only from the find-links
+                        directories of the pip configuration, like PIP_FIND_LINKS
         :return: The absolute path of the tar file
         """
-        workdir = tempfile.mkdtemp()
-        script_path = os.path.join(workdir, 'notebookTool')
-        cwl_path: str = os.path.join(workdir, 'tool.cwl')
-        dockerfile_path = os.path.join(workdir, 'Dockerfile')
-        setup_path = os.path.join(workdir, 'setup.py')
-        requirements_path = os.path.join(workdir, 'requirements.txt')
-        with open(script_path, 'wb') as script_fd:
-            script_fd.write(self._wrap_script_to_method(self._tree, self._variables).encode())
-        with open(cwl_path, 'w') as cwl_fd:
-            yaml.safe_dump(
-                self.cwl_command_line_tool(),
-                cwl_fd,
-                encoding='utf-8'
-            )
-        dockerfile = DOCKERFILE_TEMPLATE.format(
-            python_version=f'python:{".".join(platform.python_version_tuple())}'
+        tools = {'tool.cwl': self.cwl_command_line_tool()}
+        if validate:
+            self._validate_tools(tools)
+        return self._write_bundle(
+            filename,
+            {'notebookTool': self._wrap_script_to_method(self._tree, self._variables)},
+            tools,
+            cwl_format,
+            wheelhouse,
+            offline
         )
-        with open(dockerfile_path, 'w') as f:
-            f.write(dockerfile)
-        with open(setup_path, 'w') as f:
-            f.write(SETUP_TEMPLATE)
 
-        with open(requirements_path, 'w') as f:
-            f.write(os.linesep.join(RequirementsManager.get_all()))
+    @classmethod
+    def compile_many(cls, converters: Dict[str, 'AnnotatedIPython2CWLToolConverter'],
+                     filename: Path = Path('notebooksAsCWLTools.tar'), cwl_format: str = 'yaml',
+                     docker_image_id: str = 'jn2cwl:latest', validate: bool = False,
+                     wheelhouse: bool = False, offline: bool = False) -> str:
+        """
+        That method generates a single tar file for many notebooks which share the same docker image. The tar
+        file includes the following files:
+        <name> - the python script of each notebook
+        <name>.cwl - the cwl description file of each notebook
+        Dockerfile - the dockerfile to create the shared docker image
+        wheels - the wheels of the requirements, if wheelhouse is set
+        :param converters: The converters of the notebooks by the name of their tool
+        :param filename: The path of the tar file
+        :param cwl_format: The format of the cwl files, yaml or json
+        :param docker_image_id: The docker image id of the cwl files
+        :param validate: Validate the cwl files against the CWL schema before writing the tar file
+        :param wheelhouse: Include the wheels of the requirements, so the image is built without network access.
+                           The wheels are collected for the current python version and platform, so only the
+                           pure python wheels and the linux wheels are accepted
+        :param offline: Collect the wheels without accessing the package index, only from the find-links
+                        directories of the pip configuration, like PIP_FIND_LINKS
+        :return: The absolute path of the tar file
+        """
+        if len(converters) == 0:
+            raise ValueError('There are not any notebooks to compile')
+        reserved = {'Dockerfile', 'setup.py', 'requirements.txt', 'wheels'}
+        for name in converters:
+            if name in reserved or name != os.path.basename(name) or name.startswith('.') or name.endswith('.cwl'):
+                raise ValueError(f'Invalid tool name: {name}')
+        scripts, tools = {}, {}
+        for name, converter in sorted(converters.items()):
+            scripts[name] = converter._wrap_script_to_method(converter._tree, converter._variables)
+            tool = converter.cwl_command_line_tool(docker_image_id)
+            tool['baseCommand'] = name
+            tools[f'{name}.cwl'] = tool
+        if validate:
+            cls._validate_tools(tools)
+        return cls._write_bundle(filename, scripts, tools, cwl_format, wheelhouse, offline)
+
+    @classmethod
+    def _validate_tools(cls, tools: Dict[str, Dict]):
+        errors = CWLValidator().validate_many(tools)
+        if len(errors) > 0:
+            raise ValueError(os.linesep.join(errors.values()))
 
-        with tarfile.open(str(filename.absolute()), 'w') as tar_fd:
-            def add_tar(file_to_add): tar_fd.add(file_to_add, arcname=os.path.basename(file_to_add))
+    @classmethod
+    def _check_wheel_platforms(cls, wheels: List[str]):
+        """Raises a ValueError if any of the wheels can not be installed in the linux image."""
+        # the platform tags are the last part of the name of a wheel, like cp38-cp38-manylinux1_x86_64
+        incompatible = [
+            wheel for wheel in wheels
+            if not all(tag == 'any' or tag.startswith(('linux', 'manylinux', 'musllinux'))
+                       for tag in wheel[:-len('.whl')].split('-')[-1].split('.'))
+        ]
+        if len(incompatible) > 0:
+            raise ValueError(f'The wheels of the platform {platform.system()} can not be installed in the linux '
+                             f'image: {incompatible}')
 
-            add_tar(script_path)
-            add_tar(cwl_path)
-            add_tar(dockerfile_path)
-            add_tar(setup_path)
-            add_tar(requirements_path)
+    @classmethod
+    def _write_bundle(cls, filename: Path, scripts: Dict[str, str], tools: Dict[str, Dict], cwl_format: str,
+                      wheelhouse: bool = False, offline: bool = False) -> str:
+        workdir = tempfile.mkdtemp()
+        try:
+            for name, script in scripts.items():
+                with open(os.path.join(workdir, name), 'wb') as script_fd:
+                    script_fd.write(script.encode())
+            for name, tool in tools.items():
+                with open(os.path.join(workdir, name), 'w') as cwl_fd:
+                    dump_cwl(tool, cwl_fd, cwl_format)
+            files = [*scripts, *tools, 'Dockerfile', 'setup.py', 'requirements.txt']
+            requirements = RequirementsManager.get_all()
+            if wheelhouse:
+                wheels = RequirementsManager.build_wheelhouse(
+                    requirements, os.path.join(workdir, 'wheels'), offline=offline
+                )
+                cls._check_wheel_platforms(wheels)
+                files.append('wheels')
+            dockerfile = (WHEELHOUSE_DOCKERFILE_TEMPLATE if wheelhouse else DOCKERFILE_TEMPLATE).format(
+                python_version=f'python:{".".join(platform.python_version_tuple())}'
+            )
+            with open(os.path.join(workdir, 'Dockerfile'), 'w') as f:
+                f.write(dockerfile)
+            with open(os.path.join(workdir, 'setup.py'), 'w') as f:
+                f.write(SETUP_TEMPLATE.format(scripts=repr(list(scripts))))
+            with open(os.path.join(workdir, 'requirements.txt'), 'w') as f:
+                f.write(os.linesep.join(requirements))
 
-        shutil.rmtree(workdir)
+            with tarfile.open(str(filename.absolute()), 'w') as tar_fd:
+                for name in files:
+                    tar_fd.add(os.path.join(workdir, name), arcname=name)
+        finally:
+            shutil.rmtree(workdir)
         return str(filename.absolute())
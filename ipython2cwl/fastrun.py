@@ -0,0 +1,127 @@
+import glob
+import hashlib
+import json
+import marshal
+import os
+import sys
+import tempfile
+from types import CodeType, ModuleType
+from typing import Dict, List, Optional, Tuple, Union
+
+import nbformat  # type: ignore
+
+from . import __version__
+from .cwltoolextractor import AnnotatedIPython2CWLToolConverter
+
+
+def compile_notebook(notebook_path: str, cache_directory: Optional[str] = None) -> Tuple[CodeType, Dict, bool]:
+    """
+    Converts a notebook to the script of its CWL tool and compiles the script. The compiled code is cached by the
+    hash of the notebook, the version of ipython2cwl and the version of python, so an unchanged notebook is not
+    converted again.
+    :param notebook_path: The path of the notebook
+    :param cache_directory: The directory of the cache. None disables the cache
+    :return: The compiled script, the CWL tool and whether the script was cached
+    :raise ValueError: If the notebook does not contain any typing annotations
+    """
+    with open(notebook_path, 'rb') as f:
+        notebook = f.read()
+    key = hashlib.sha256(f'{__version__}\0{sys.implementation.cache_tag}\0'.encode() + notebook).hexdigest()
+    cache_path = os.path.join(cache_directory, f'{key}.bin') if cache_directory is not None else None
+    if cache_path is not None and os.path.isfile(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                code, tool = marshal.load(f)
+            return code, json.loads(tool), True
+        except (EOFError, ValueError, TypeError):
+            # a truncated or foreign cache entry is converted again and overwritten
+            pass
+    converter = AnnotatedIPython2CWLToolConverter.from_jupyter_notebook_node(
+        nbformat.reads(notebook.decode(), as_version=4)
+    )
+    if len(converter._variables) == 0:
+        raise ValueError(f'{notebook_path} does not contain any typing annotations')
+    script = converter._wrap_script_to_method(converter._tree, converter._variables)
+    code = compile(script, os.path.abspath(notebook_path), 'exec')
+    tool = converter.cwl_command_line_tool()
+    if cache_path is not None:
+        os.makedirs(cache_directory, exist_ok=True)  # type: ignore
+        fd, temporary_path = tempfile.mkstemp(dir=cache_directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump((code, json.dumps(tool)), f)
+        # the entry is replaced atomically, so the concurrent runs never read a partial entry
+        os.replace(temporary_path, cache_path)
+    return code, tool, False
+
+
+def _arguments(tool: Dict, inputs: Dict[str, Union[str, List[str]]]) -> List[str]:
+    unknown = set(inputs) - set(tool['inputs'])
+    if len(unknown) > 0:
+        raise ValueError(f'Unknown inputs: {sorted(unknown)}')
+    argv = []
+    for name, value in inputs.items():
+        values = value if isinstance(value, list) else [value]
+        if tool['inputs'][name]['type'].startswith(('File', 'Directory')):
+            # the script runs inside the output directory, so the relative paths are resolved beforehand
+            values = [v if '://' in v else os.path.abspath(v) for v in values]
+        argv.extend([f'--{name}', *values])
+    return argv
+
+
+def _collect_outputs(tool: Dict, output_directory: str) -> Dict[str, Union[str, List[str]]]:
+    outputs: Dict[str, Union[str, List[str]]] = {}
+    missing = []
+    for name, description in tool['outputs'].items():
+        paths = sorted(glob.glob(os.path.join(glob.escape(output_directory), description['outputBinding']['glob'])))
+        if description['type'].endswith('[]'):
+            outputs[name] = paths
+        elif len(paths) == 0:
+            missing.append(name)
+        else:
+            outputs[name] = paths[0]
+    if len(missing) > 0:
+        raise ValueError(f'The notebook did not create the outputs: {missing}')
+    return outputs
+
+
+def run_notebook(notebook_path: str, inputs: Dict[str, Union[str, List[str]]], output_directory: str = '.',
+                 cache_directory: Optional[str] = None) -> Dict[str, Union[str, List[str]]]:
+    """
+    Runs the script of the CWL tool of a notebook in the current process, without building an image or running a
+    CWL runner. The script runs inside the output directory, so the outputs are created with the same names that
+    the CWL tool globs, and as the __main__ module, so its functions can be pickled, like by the parallel maps.
+    :param notebook_path: The path of the notebook
+    :param inputs: The values of the inputs by their names, as they are given on the command line of the tool. The
+                   values of the list inputs are lists
+    :param output_directory: The directory where the script runs, which is created if it does not exist
+    :param cache_directory: The directory of the compiled notebooks. None disables the cache
+    :return: The paths of the outputs by their names
+    :raise ValueError: If an input is unknown or invalid, or an output was not created
+    """
+    code, tool, _ = compile_notebook(notebook_path, cache_directory)
+    argv = _arguments(tool, inputs)
+    output_directory = os.path.abspath(output_directory)
+    os.makedirs(output_directory, exist_ok=True)
+    cwd = os.getcwd()
+    saved_argv, saved_path = sys.argv, list(sys.path)
+    saved_main = sys.modules.get('__main__')
+    main_module = ModuleType('__main__')
+    main_module.__file__ = os.path.abspath(notebook_path)
+    sys.modules['__main__'] = main_module
+    sys.argv = [os.path.abspath(notebook_path), *argv]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(notebook_path)))
+    os.chdir(output_directory)
+    try:
+        exec(code, main_module.__dict__)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise ValueError(f'The notebook exited with status {e.code}') from e
+    finally:
+        if saved_main is not None:
+            sys.modules['__main__'] = saved_main
+        else:
+            del sys.modules['__main__']
+        os.chdir(cwd)
+        sys.argv = saved_argv
+        sys.path[:] = saved_path
+    return _collect_outputs(tool, output_directory)
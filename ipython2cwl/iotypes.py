@@ -9,6 +9,10 @@ Each variable can be an input or an output. The basic data types are:
 
   * CWLFilePathInput
 
+  * CWLMmapFileInput
+
+  * CWLDirectoryInput
+
   * CWLBooleanInput
 
   * CWLStringInput
@@ -19,11 +23,27 @@ Each variable can be an input or an output. The basic data types are:
 
   * CWLFilePathOutput
 
+  * CWLOutputDirectory
+
+  * CWLGlobOutput
+
   * CWLDumpableFile
 
   * CWLDumpableBinaryFile
 
 
+* Stages:
+
+  * CWLStage
+
+  * CWLCheckpoint
+
+
+* Parallelism:
+
+  * CWLParallelMap
+
+
 Complex Dumpables Types
 ^^^^^^^^^^^^^^^^^^^^^^^^
 
@@ -39,7 +59,26 @@ class _CWLInput:
     pass
 
 
-class CWLFilePathInput(str, _CWLInput):
+class _CWLFileInput(str, _CWLInput):
+
+    @classmethod
+    def secondary(cls, *patterns: str):
+        """
+        Declare the secondary files of a file input, like indexes, which the runner stages next to the file.
+
+        >>> alignments: CWLFilePathInput.secondary('.bai') = './data/sample.bam'
+        >>> tables: List[CWLFilePathInput.secondary('^.idx')] = ['./data/a.h5', './data/b.h5']
+
+        At the CWL description the patterns are mapped to the secondaryFiles of the input. A pattern is
+        appended to the path of the file, except for each leading ^ which removes an extension first,
+        so for the file sample.bam the pattern .bai matches sample.bam.bai and ^.bai matches sample.bai.
+
+        :param patterns: The patterns of the secondary files. They must be string literals
+        """
+        return cls
+
+
+class CWLFilePathInput(_CWLFileInput):
     """Use that hint to annotate that a variable is a string-path input. You can use the typing annotation
     as a string by importing it. At the generated script a command line argument with the name of the variable
     will be created and the assignment of value will be generalised.
@@ -51,6 +90,38 @@ class CWLFilePathInput(str, _CWLInput):
     pass
 
 
+class CWLMmapFileInput(_CWLFileInput):
+    """Use that hint to annotate that a variable is a file input which should be memory-mapped. At the CWL
+    description it is mapped as a File, exactly like :class:`~ipython2cwl.iotypes.CWLFilePathInput`, but
+    at the generated script the file is opened read-only and the variable is bound to a read-only
+    :class:`mmap.mmap` object instead of a path. That way the notebook can random-access very large files
+    without reading them into memory. Empty files are bound to an empty :class:`memoryview`.
+
+    >>> dataset1: CWLMmapFileInput = './data/data.bin'
+    >>> dataset2: 'CWLMmapFileInput' = './data/data.bin'
+
+    Note that at the notebook the assigned value is still a path, so you have to open the file
+    yourself while you develop the notebook.
+    """
+    pass
+
+
+class CWLDirectoryInput(str, _CWLInput):
+    """Use that hint to annotate that a variable is a directory input. At the CWL description it is mapped as a
+    Directory, whose listing is not loaded by the runner. At the generated script the variable is bound to a
+    path-like object which yields the paths of the entries of the directory while it is iterated, and which has the
+    methods scandir and walk to iterate the directory entries and the files of the whole tree lazily. That way
+    directories with a very large number of files are not listed up front, neither by the runner nor by the script.
+
+    >>> images: CWLDirectoryInput = './data/images'
+    >>> images: 'CWLDirectoryInput' = './data/images'
+
+    Note that at the notebook the assigned value is still a path, so you have to list the directory
+    yourself while you develop the notebook, for example with os.scandir.
+    """
+    pass
+
+
 class CWLBooleanInput(_CWLInput):
     """Use that hint to annotate that a variable is a boolean input. You can use the typing annotation
     as a string by importing it. At the generated script a command line argument with the name of the variable
@@ -101,6 +172,27 @@ class CWLFilePathOutput(str, _CWLOutput):
     pass
 
 
+class CWLOutputDirectory(str, _CWLOutput):
+    """Use that hint to annotate that a variable is a string-path to an output directory. The directory will be
+    mapped as a CWL Directory output, so all the files that the notebook writes in it are collected with a single
+    output, without listing them.
+
+    >>> tiles: CWLOutputDirectory = 'tiles'
+
+    """
+    pass
+
+
+class CWLGlobOutput(str, _CWLOutput):
+    """Use that hint to annotate that a variable is a glob pattern of output files. All the files which match the
+    pattern will be mapped as a single CWL output with a list of files.
+
+    >>> tiles: CWLGlobOutput = 'tiles/*.png'
+
+    """
+    pass
+
+
 class CWLDumpable(_CWLOutput):
     """Use that class to define custom Dumpables variables."""
 
@@ -201,3 +293,58 @@ class CWLPNGFigure(CWLDumpable):
     >>> new_data: CWLPNGFigure = plt.plot(data)
     >>> plt.savefig('new_data.png')
     """
+
+
+class CWLStage:
+    """Use that annotation to split the notebook into multiple steps of a CWL Workflow. Each annotation starts
+    a new stage, named after the variable, which ends at the next annotation. The statements before the first
+    annotation form the stage main. Annotations inside blocks, like if or for statements, are ignored.
+
+    >>> features: CWLStage
+    >>> data = load_features()
+    >>> model_a: CWLStage
+    >>> result_a: CWLDumpableFile = str(train_a(data))
+    >>> model_b: CWLStage
+    >>> result_b: CWLDumpableFile = str(train_b(data))
+
+    The variables which are used by a later stage are pickled to intermediate files and loaded by the
+    stages that use them, so the stages model_a and model_b of the example can run in parallel.
+    The imports, functions and classes are repeated at each stage that uses them.
+    """
+    pass
+
+
+class CWLCheckpoint:
+    """Use that annotation to mark the rest of a cell as expensive. If the generated script is executed with the
+    --checkpoint-dir argument, the variables that the rest of the notebook uses are pickled to that directory after
+    the marked statements. At the next execution, if the code up to the cell and the inputs it depends on are the
+    same, the marked statements are skipped and the variables are restored from the checkpoint.
+
+    >>> data = load_features()
+    >>> training: CWLCheckpoint
+    >>> model = train(data)
+
+    The imports, functions and classes of the marked statements are always executed. The least recently used
+    checkpoints are removed when the directory grows above --checkpoint-max-mb, 1024 by default.
+    """
+    pass
+
+
+def CWLParallelMap(function: Callable) -> Callable:
+    """Use that decorator to mark a function which processes a single item, so that the generated tool applies it
+    to the items of a list in parallel, with a process for each granted core.
+
+    >>> @CWLParallelMap
+    >>> def count_lines(path):
+    >>>     with open(path) as f:
+    >>>         return sum(1 for _ in f)
+    >>> counts = [count_lines(path) for path in datasets]
+    >>> totals = list(map(count_lines, datasets))
+
+    At the notebook the decorator does not change the function, so the notebook runs as before. At the generated
+    script the calls map(function, items), which returns a list there, and the list comprehensions
+    [function(item) for item in items] are replaced with a parallel map which keeps the order of the results and
+    raises the first exception of the function. The items and the results must be picklable. The number of the
+    processes is the number of the cores granted to the container, or the IPYTHON2CWL_WORKERS environment variable.
+    """
+    return function
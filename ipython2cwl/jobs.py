@@ -0,0 +1,257 @@
+import csv
+import itertools
+import json
+import os
+from typing import Any, Collection, Dict, IO, Iterable, Iterator, List, Optional
+
+from .serialization import dump_cwl
+
+_INTEGERS = {'int', 'long'}
+_FLOATS = {'float', 'double'}
+_MISSING = object()
+
+
+def _input_schema(tool: Dict) -> Dict[str, Dict]:
+    """Returns the inputs of a CWL process by their id, for both the map and the list notation of the inputs."""
+    inputs = tool['inputs']
+    if isinstance(inputs, list):
+        return {str(description['id']).split('#')[-1].split('/')[-1]: description for description in inputs}
+    return {
+        name: description if isinstance(description, dict) else {'type': description}
+        for name, description in inputs.items()
+    }
+
+
+def _expand_type(cwl_type) -> Any:
+    """Expands the syntactic sugar of a CWL type, like File[] or int?, to the array and union notation."""
+    if isinstance(cwl_type, str):
+        if cwl_type.endswith('?'):
+            return ['null', _expand_type(cwl_type[:-1])]
+        if cwl_type.endswith('[]'):
+            return {'type': 'array', 'items': _expand_type(cwl_type[:-2])}
+        return cwl_type
+    if isinstance(cwl_type, list):
+        return [_expand_type(t) for t in cwl_type]
+    if isinstance(cwl_type, dict) and cwl_type.get('type') == 'array':
+        return {**cwl_type, 'items': _expand_type(cwl_type['items'])}
+    return cwl_type
+
+
+class JobGenerator:
+    """
+    JobGenerator creates the CWL job objects of the rows of a parameter sweep. Each value is checked against the type
+    of its input and converted to the CWL representation, so for example the paths of the File inputs become File
+    objects and the strings of the CSV files become numbers or booleans.
+    """
+
+    def __init__(self, tool: Dict, base_directory: Optional[str] = None):
+        """
+        :param tool: The CWL tool, or any CWL process, whose inputs the jobs set
+        :param base_directory: The directory which the relative paths of the File and Directory inputs are resolved
+                               against. By default the paths are kept as they are
+        """
+        self.inputs = {name: _expand_type(description['type']) for name, description in _input_schema(tool).items()}
+        self.defaults = {name for name, description in _input_schema(tool).items() if 'default' in description}
+        self.base_directory = base_directory
+
+    def job(self, row: Dict[str, Any], text_inputs: Collection[str] = ()) -> Dict[str, Any]:
+        """
+        Creates the job object of a row.
+        :param row: The values of the inputs by their names. The missing inputs are not set
+        :param text_inputs: The inputs whose values are strings, like the values of a CSV file, which are parsed to
+                            the type of the input. An empty string is a missing value
+        :return: The job object
+        :raise ValueError: If a value does not match the type of its input, an input is unknown or a required input
+                           is missing
+        """
+        unknown = set(row) - set(self.inputs)
+        if len(unknown) > 0:
+            raise ValueError(f'Unknown inputs: {sorted(unknown)}')
+        job = {}
+        for name, cwl_type in self.inputs.items():
+            value = row.get(name, _MISSING)
+            from_text = name in text_inputs
+            if value is _MISSING or (from_text and value == ''):
+                if name not in self.defaults and not self._accepts_null(cwl_type):
+                    raise ValueError(f'The required input {name} is missing')
+                continue
+            try:
+                job[name] = self._convert(cwl_type, value, from_text)
+            except ValueError as e:
+                raise ValueError(f'Invalid value of the input {name}: {e}') from e
+        return job
+
+    @classmethod
+    def _accepts_null(cls, cwl_type) -> bool:
+        return cwl_type == 'null' or (isinstance(cwl_type, list) and 'null' in cwl_type)
+
+    def _convert(self, cwl_type, value, from_text: bool):
+        if isinstance(cwl_type, list):
+            errors = []
+            for alternative in cwl_type:
+                try:
+                    return self._convert(alternative, value, from_text)
+                except ValueError as e:
+                    errors.append(str(e))
+            raise ValueError(' or '.join(errors))
+        if isinstance(cwl_type, dict):
+            if cwl_type.get('type') == 'array':
+                if from_text and isinstance(value, str):
+                    value = json.loads(value) if value.lstrip().startswith('[') else [value]
+                    value = [v if isinstance(v, str) else json.dumps(v) for v in value]
+                if not isinstance(value, list):
+                    raise ValueError(f'{value!r} is not an array')
+                return [self._convert(cwl_type['items'], item, from_text) for item in value]
+            if cwl_type.get('type') == 'enum':
+                symbols = [str(symbol).split('#')[-1].split('/')[-1] for symbol in cwl_type['symbols']]
+                if value not in symbols:
+                    raise ValueError(f'{value!r} is not one of {symbols}')
+                return value
+            raise ValueError(f'Unsupported type {cwl_type}')
+        if cwl_type == 'null':
+            if value is None:
+                return None
+            raise ValueError(f'{value!r} is not null')
+        if cwl_type in ('File', 'Directory'):
+            return self._path_object(cwl_type, value)
+        if cwl_type == 'Any':
+            if value is None:
+                raise ValueError('Any does not accept null')
+            return value
+        if from_text and isinstance(value, str):
+            value = self._parse(cwl_type, value)
+        if cwl_type == 'string' and isinstance(value, str):
+            return value
+        if cwl_type == 'boolean' and isinstance(value, bool):
+            return value
+        if cwl_type in _INTEGERS and isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if cwl_type in _FLOATS and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        raise ValueError(f'{value!r} is not a {cwl_type}')
+
+    @classmethod
+    def _parse(cls, cwl_type: str, text: str):
+        try:
+            if cwl_type in _INTEGERS:
+                return int(text)
+            if cwl_type in _FLOATS:
+                return float(text)
+        except ValueError:
+            return text
+        if cwl_type == 'boolean' and text.lower() in ('true', 'false', '1', '0', 'yes', 'no'):
+            return text.lower() in ('true', '1', 'yes')
+        return text
+
+    def _path_object(self, cwl_class: str, value) -> Dict:
+        if isinstance(value, dict):
+            if value.get('class') != cwl_class:
+                raise ValueError(f'{value!r} is not a {cwl_class}')
+            return value
+        if not isinstance(value, str) or value == '':
+            raise ValueError(f'{value!r} is not a {cwl_class} path')
+        if '://' in value:
+            return {'class': cwl_class, 'location': value}
+        if self.base_directory is not None:
+            value = os.path.join(self.base_directory, value)
+        return {'class': cwl_class, 'path': value}
+
+
+def product_rows(parameters: Dict[str, List]) -> Iterator[Dict[str, Any]]:
+    """Returns the rows of the cartesian product of the values of the parameters."""
+    names = list(parameters)
+    for values in itertools.product(*[parameters[name] for name in names]):
+        yield dict(zip(names, values))
+
+
+def zip_rows(parameters: Dict[str, List]) -> Iterator[Dict[str, Any]]:
+    """Returns the rows which combine the i-th values of the parameters, which must have the same length."""
+    lengths = {name: len(values) for name, values in parameters.items()}
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f'The zipped parameters have different lengths: {lengths}')
+    if len(parameters) == 0:
+        yield {}
+        return
+    names = list(parameters)
+    for values in zip(*[parameters[name] for name in names]):
+        yield dict(zip(names, values))
+
+
+def csv_rows(stream: IO) -> Iterator[Dict[str, str]]:
+    """Returns the rows of a CSV file with a header, one at a time."""
+    for row in csv.DictReader(stream):
+        if None in row:
+            raise ValueError(f'Row {row} has more values than the header')
+        yield row
+
+
+def sweep_jobs(tool: Dict, sweep: Dict, base_directory: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Creates the jobs of a sweep specification lazily, so any number of jobs is created in constant memory. The
+    specification has any of the following fields, and the jobs are all the combinations of their rows:
+    fixed - the values which all the jobs share
+    product - lists of values, whose cartesian product is taken
+    zip - lists of values of the same length, which are combined item by item
+    csv - the path of a CSV file with a header, which is streamed and has the values of a job at each row
+    :param tool: The CWL tool
+    :param sweep: The sweep specification
+    :param base_directory: The directory which the relative paths, including the path of the CSV file, are resolved
+                           against
+    :return: The job objects
+    :raise ValueError: If the specification or any job is invalid. The message contains the index of the job
+    """
+    unknown = set(sweep) - {'fixed', 'product', 'zip', 'csv'}
+    if len(unknown) > 0:
+        raise ValueError(f'Unknown fields of the sweep specification: {sorted(unknown)}')
+    generator = JobGenerator(tool, base_directory)
+    fixed = sweep.get('fixed', {})
+    zipped = list(zip_rows(sweep.get('zip', {})))
+    product = sweep.get('product', {})
+
+    def text_rows() -> Iterator[Dict[str, str]]:
+        if 'csv' not in sweep:
+            yield {}
+            return
+        csv_path = sweep['csv'] if base_directory is None else os.path.join(base_directory, sweep['csv'])
+        with open(csv_path, newline='') as f:
+            yield from csv_rows(f)
+
+    rows = (
+        ({**fixed, **zipped_row, **product_row, **text_row}, text_row.keys())
+        for text_row in text_rows() for zipped_row in zipped for product_row in product_rows(product)
+    )
+    for index, (row, text_inputs) in enumerate(rows):
+        try:
+            yield generator.job(row, text_inputs)
+        except ValueError as e:
+            raise ValueError(f'Job {index}: {e}') from e
+
+
+def write_job_files(jobs: Iterable[Dict], directory: str, cwl_format: str = 'yaml', prefix: str = 'job_') -> int:
+    """
+    Writes each job to its own file, named like job_0000000.yml.
+    :param jobs: The jobs
+    :param directory: The directory of the files, which is created if it does not exist
+    :param cwl_format: yaml or json
+    :param prefix: The prefix of the names of the files
+    :return: The number of the jobs
+    """
+    os.makedirs(directory, exist_ok=True)
+    extension = 'yml' if cwl_format == 'yaml' else cwl_format
+    count = 0
+    for count, job in enumerate(jobs, 1):
+        with open(os.path.join(directory, f'{prefix}{count - 1:07d}.{extension}'), 'w') as f:
+            dump_cwl(job, f, cwl_format)
+    return count
+
+
+def write_jobs_jsonl(jobs: Iterable[Dict], stream: IO) -> int:
+    """
+    Writes the jobs to a JSON-lines stream, a job at each line.
+    :return: The number of the jobs
+    """
+    count = 0
+    for count, job in enumerate(jobs, 1):
+        stream.write(json.dumps(job))
+        stream.write('\n')
+    return count
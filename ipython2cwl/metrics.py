@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+class Repo2CWLMetrics:
+    """
+    Repo2CWLMetrics records the duration of each phase of jupyter-repo2cwl, the number of the converted, skipped
+    and failed notebooks, the size of the repository, the size of the build context before and after pruning and
+    the size of the built image.
+    """
+
+    formats = ('json', 'openmetrics')
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.notebooks: Dict[str, int] = {'converted': 0, 'skipped': 0, 'failed': 0}
+        self.repo_bytes: Optional[int] = None
+        self.context_bytes: Optional[int] = None
+        self.pruned_context_bytes: Optional[int] = None
+        self.image_size_bytes: Optional[int] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Measures the duration of the block. The durations of the same phase are summed."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def to_json(self) -> Dict:
+        return {
+            'phases': {name: {'duration_seconds': duration} for name, duration in self.phases.items()},
+            'notebooks': dict(self.notebooks),
+            'repo_bytes': self.repo_bytes,
+            'context_bytes': self.context_bytes,
+            'pruned_context_bytes': self.pruned_context_bytes,
+            'image_build_seconds': self.phases.get('build'),
+            'image_size_bytes': self.image_size_bytes,
+        }
+
+    def to_openmetrics(self) -> str:
+        lines = [
+            '# TYPE repo2cwl_phase_duration_seconds gauge',
+            '# UNIT repo2cwl_phase_duration_seconds seconds',
+            *[f'repo2cwl_phase_duration_seconds{{phase="{name}"}} {duration}'
+              for name, duration in self.phases.items()],
+            '# TYPE repo2cwl_notebooks counter',
+            *[f'repo2cwl_notebooks_total{{status="{status}"}} {count}' for status, count in self.notebooks.items()],
+        ]
+        for name, value in [('repo_bytes', self.repo_bytes), ('context_bytes', self.context_bytes),
+                            ('pruned_context_bytes', self.pruned_context_bytes),
+                            ('image_size_bytes', self.image_size_bytes)]:
+            if value is not None:
+                lines.extend([f'# TYPE repo2cwl_{name} gauge', f'# UNIT repo2cwl_{name} bytes',
+                              f'repo2cwl_{name} {value}'])
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: Path, metrics_format: Optional[str] = None):
+        """
+        Writes the metrics to a file.
+        :param path: The path of the file
+        :param metrics_format: json or openmetrics. By default json is used for the .json files and openmetrics
+                               otherwise
+        """
+        if metrics_format is None:
+            metrics_format = 'json' if path.suffix == '.json' else 'openmetrics'
+        if metrics_format not in self.formats:
+            raise ValueError(f'Supported metrics formats: {self.formats}')
+        with open(path, 'w') as f:
+            if metrics_format == 'json':
+                json.dump(self.to_json(), f, indent=2)
+            else:
+                f.write(self.to_openmetrics())
+
+
+class ConversionServiceMetrics:
+    """
+    ConversionServiceMetrics records the latency of the requests of the conversion service, the number of the
+    requests by endpoint and status and the hits and the misses of its result cache. It is shared by the threads
+    which serve the requests.
+    """
+
+    buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.duration_sum = 0.0
+        self.duration_buckets = [0] * len(self.buckets)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def observe(self, endpoint: str, status: int, duration: float):
+        """Records a served request and its duration in seconds."""
+        with self._lock:
+            key = (endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.duration_sum += duration
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    self.duration_buckets[i] += 1
+
+    def cache_access(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        accesses = self.cache_hits + self.cache_misses
+        return self.cache_hits / accesses if accesses > 0 else None
+
+    def to_json(self) -> Dict:
+        with self._lock:
+            count = sum(self.requests.values())
+            return {
+                'requests': [
+                    {'endpoint': endpoint, 'status': status, 'count': value}
+                    for (endpoint, status), value in self.requests.items()
+                ],
+                'request_duration_seconds': {
+                    'count': count,
+                    'sum': self.duration_sum,
+                    'mean': self.duration_sum / count if count > 0 else None,
+                    'buckets': {str(bound): value for bound, value in zip(self.buckets, self.duration_buckets)},
+                },
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'cache_hit_ratio': self.cache_hit_ratio,
+            }
+
+    def to_openmetrics(self) -> str:
+        with self._lock:
+            count = sum(self.requests.values())
+            lines = [
+                '# TYPE ipython2cwl_requests counter',
+                *[f'ipython2cwl_requests_total{{endpoint="{endpoint}",status="{status}"}} {value}'
+                  for (endpoint, status), value in self.requests.items()],
+                '# TYPE ipython2cwl_request_duration_seconds histogram',
+                '# UNIT ipython2cwl_request_duration_seconds seconds',
+                *[f'ipython2cwl_request_duration_seconds_bucket{{le="{bound}"}} {value}'
+                  for bound, value in zip(self.buckets, self.duration_buckets)],
+                f'ipython2cwl_request_duration_seconds_bucket{{le="+Inf"}} {count}',
+                f'ipython2cwl_request_duration_seconds_count {count}',
+                f'ipython2cwl_request_duration_seconds_sum {self.duration_sum}',
+                '# TYPE ipython2cwl_cache_accesses counter',
+                f'ipython2cwl_cache_accesses_total{{result="hit"}} {self.cache_hits}',
+                f'ipython2cwl_cache_accesses_total{{result="miss"}} {self.cache_misses}',
+            ]
+        ratio = self.cache_hit_ratio
+        if ratio is not None:
+            lines.extend(['# TYPE ipython2cwl_cache_hit_ratio gauge', f'ipython2cwl_cache_hit_ratio {ratio}'])
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
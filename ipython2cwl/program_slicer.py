@@ -0,0 +1,515 @@
+import ast
+from typing import Dict, Iterable, List, Optional, Set, FrozenSet, Tuple
+
+
+class _StatementEffects(ast.NodeVisitor):
+    """_StatementEffects collects the names that a statement uses, binds and mutates and
+    decides if the statement has side effects that the slicer does not understand. The methods
+    are only understood on local values, the names bound to values which were created by code
+    that the slicer understands, like literals or the results of pure functions. Any other
+    object, like a database connection or a logger, may have side effects outside of the
+    notebook. A change of an object changes all the names which may share it, like y after x = y
+    or r after for r in rows."""
+
+    pure_builtins = {
+        'abs', 'all', 'any', 'bool', 'dict', 'display', 'divmod', 'enumerate', 'filter', 'float', 'format',
+        'frozenset', 'hash', 'int', 'isinstance', 'issubclass', 'len', 'list', 'map', 'max', 'min', 'print',
+        'range', 'repr', 'reversed', 'round', 'set', 'sorted', 'str', 'sum', 'tuple', 'type', 'zip',
+    }
+
+    # modules whose functions do not have side effects
+    pure_modules = (
+        'collections', 'csv', 'datetime', 'decimal', 'fractions', 'functools', 'itertools', 'json', 'math', 'numpy',
+        'operator', 'pandas', 're', 'scipy', 'statistics', 'string',
+    )
+
+    # modules whose functions only change the in-memory state of the module, like the current figure
+    stateful_modules = ('matplotlib.pyplot', 'numpy.random', 'random', 'seaborn')
+
+    pure_methods = {
+        'abs', 'agg', 'aggregate', 'astype', 'copy', 'corr', 'count', 'cov', 'cumsum', 'describe', 'drop',
+        'drop_duplicates', 'dropna', 'endswith', 'fillna', 'format', 'get', 'groupby', 'head', 'info', 'isin',
+        'isna', 'isnull', 'items', 'join', 'keys', 'lower', 'max', 'mean', 'median', 'merge', 'min', 'notna',
+        'notnull', 'nunique', 'quantile', 'rename', 'replace', 'reset_index', 'round', 'set_index',
+        'sort_values', 'split', 'startswith', 'std', 'strip', 'sum', 'tail', 'tolist', 'unique', 'upper',
+        'value_counts', 'values', 'var',
+    }
+
+    io_methods = {
+        'close', 'dump', 'flush', 'makedirs', 'mkdir', 'remove', 'rename', 'rmdir', 'savefig', 'tofile', 'touch',
+        'unlink', 'write', 'write_bytes', 'write_text', 'writelines',
+    }
+
+    # methods which draw on the current figure instead of changing their object
+    plot_methods = {'bar', 'barh', 'boxplot', 'hist', 'imshow', 'pie', 'plot', 'scatter'}
+
+    def __init__(self, modules: Dict[str, str], pure_functions: Set[str], in_function: bool = False,
+                 local_values: Iterable[str] = (), aliases: Optional[Dict[str, FrozenSet[str]]] = None):
+        self.modules = modules
+        self.pure_functions = pure_functions
+        self.in_function = in_function
+        self.local_values: Set[str] = set(local_values)
+        self.aliases: Dict[str, FrozenSet[str]] = {} if aliases is None else aliases
+        self.uses: Set[str] = set()
+        self.deferred_uses: Set[str] = set()
+        self.bound: Set[str] = set()
+        self.mutated: Set[str] = set()
+        self.globals: Set[str] = set()
+        self.unknown = False
+
+    @property
+    def defs(self) -> Set[str]:
+        return self.bound | self.mutated
+
+    @classmethod
+    def _root_name(cls, node) -> Optional[str]:
+        while isinstance(node, (ast.Attribute, ast.Subscript)):
+            node = node.value
+        return node.id if isinstance(node, ast.Name) else None
+
+    @classmethod
+    def _dotted_name(cls, node) -> Optional[List[str]]:
+        names: List[str] = []
+        while isinstance(node, ast.Attribute):
+            names.insert(0, node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return None
+        return [node.id, *names]
+
+    @classmethod
+    def _referenced_names(cls, node) -> Set[str]:
+        """Returns the names whose objects the value of the expression may share, for example the
+        value of y, y.attribute, y[0] and [y] share the object of y."""
+        if isinstance(node, (ast.Attribute, ast.Subscript)):
+            root = cls._root_name(node)
+            return {root} if root is not None else set()
+        if isinstance(node, ast.Name):
+            return {node.id}
+        if isinstance(node, ast.Starred):
+            return cls._referenced_names(node.value)
+        if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+            return set().union(*[cls._referenced_names(e) for e in node.elts])
+        if isinstance(node, ast.Dict):
+            return set().union(*[cls._referenced_names(v) for v in node.values])
+        if isinstance(node, ast.IfExp):
+            return cls._referenced_names(node.body) | cls._referenced_names(node.orelse)
+        return set()
+
+    @classmethod
+    def _argument_names(cls, node: ast.Call) -> Set[str]:
+        return set().union(*[
+            cls._referenced_names(argument) for argument in [*node.args, *[k.value for k in node.keywords]]
+        ])
+
+    @classmethod
+    def _loaded_names(cls, nodes) -> Set[str]:
+        return {
+            n.id for node in nodes if node is not None for n in ast.walk(node)
+            if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)
+        }
+
+    def _alias(self, names: Set[str]):
+        """Joins the groups of the names which may share an object."""
+        if len(names) < 2:
+            return
+        group = frozenset().union(names, *[self.aliases.get(name, frozenset()) for name in names])
+        for name in group:
+            self.aliases[name] = group
+
+    def _mutate(self, names: Set[str]):
+        """Records the change of the objects of the names, which also changes their aliases."""
+        self.mutated |= set().union(names, *[self.aliases.get(name, frozenset()) for name in names])
+
+    def _element_names(self, node) -> Set[str]:
+        """Returns the names whose objects the elements of an iterable or a context manager may share, which
+        are all the names it loads but the called functions and the modules."""
+        functions = {n.func.id for n in ast.walk(node) if isinstance(n, ast.Call) and isinstance(n.func, ast.Name)}
+        return self._loaded_names([node]) - functions - set(self.modules)
+
+    @classmethod
+    def _stored_names(cls, node) -> Set[str]:
+        return {n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)}
+
+    @classmethod
+    def _in_modules(cls, module: str, modules) -> bool:
+        return any(module == m or module.startswith(m + '.') for m in modules)
+
+    def _is_io_method(self, name: str, node: ast.Call) -> bool:
+        if name in self.io_methods or name.startswith('save') or name.startswith('write'):
+            return True
+        return name.startswith('to_') and len(node.args) + len(node.keywords) > 0
+
+    def _visit_builtin_call(self, name: str, node: ast.Call):
+        if name == 'open':
+            modes = [*node.args[1:2], *[k.value for k in node.keywords if k.arg == 'mode']]
+            mode = modes[0] if len(modes) > 0 else None
+            if mode is not None and (not isinstance(mode, ast.Str) or len(set(mode.s) - set('rbt')) > 0):
+                self.unknown = True
+        elif name == 'print':
+            if any(k.arg == 'file' for k in node.keywords):
+                self.unknown = True
+        elif name not in self.pure_builtins and name not in self.pure_functions:
+            self.unknown = True
+
+    def _visit_module_call(self, module: str, alias: str, node: ast.Call):
+        if self._is_io_method(module.split('.')[-1], node):
+            self.unknown = True
+        elif self._in_modules(module.rsplit('.', 1)[0], self.stateful_modules):
+            # for example random.shuffle(data) changes both the state of random and data
+            self._mutate({alias} | self._argument_names(node))
+        elif not self._in_modules(module, self.pure_modules):
+            self.unknown = True
+
+    def visit_Name(self, node: ast.Name):
+        if isinstance(node.ctx, ast.Load):
+            self.uses.add(node.id)
+        else:
+            self.bound.add(node.id)
+
+    def _bind(self, targets, value, shared_names: Optional[Set[str]] = None):
+        """Visits the targets of a binding. The names become local values if the value is a local value and
+        aliases of the names whose objects the value may share.
+        :param shared_names: The names whose objects the value may share, by default its referenced names
+        """
+        shared_names = self._referenced_names(value) if shared_names is None else shared_names
+        is_local_value = not self.unknown and self._referenced_names(value) <= self.local_values
+        for target in targets:
+            self.visit(target)
+            names = self._stored_names(target)
+            self._alias(names | shared_names)
+            if is_local_value:
+                self.local_values |= names
+            else:
+                self.local_values -= names
+
+    def visit_Assign(self, node: ast.Assign):
+        self.visit(node.value)
+        self._bind(node.targets, node.value)
+
+    def visit_AugAssign(self, node: ast.AugAssign):
+        """An augmented assignment changes lists, dicts and arrays in place, so it changes the aliases of its
+        target too."""
+        self.visit(node.value)
+        if isinstance(node.target, ast.Name):
+            self.uses.add(node.target.id)
+            self.bound.add(node.target.id)
+            self._mutate({node.target.id})
+        else:
+            self.visit(node.target)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign):
+        if node.value is not None:
+            self.visit(node.value)
+            self._bind([node.target], node.value)
+        else:
+            self.visit(node.target)
+        self.visit(node.annotation)
+
+    def _visit_for(self, node):
+        self.visit(node.iter)
+        # the target shares the elements of any object of the iterable, like r in for r in rows.values()
+        self._bind([node.target], node.iter, self._element_names(node.iter))
+        for stmt in node.body + node.orelse:
+            self.visit(stmt)
+
+    visit_For = _visit_for
+    visit_AsyncFor = _visit_for
+
+    def _visit_with(self, node):
+        for item in node.items:
+            self.visit(item.context_expr)
+            if item.optional_vars is not None:
+                self._bind([item.optional_vars], item.context_expr, self._element_names(item.context_expr))
+        for stmt in node.body:
+            self.visit(stmt)
+
+    visit_With = _visit_with
+    visit_AsyncWith = _visit_with
+
+    def _visit_store_target(self, node):
+        if isinstance(node.ctx, (ast.Store, ast.Del)):
+            root = self._root_name(node)
+            if root is not None:
+                self._mutate({root})
+        self.generic_visit(node)
+
+    visit_Attribute = _visit_store_target
+    visit_Subscript = _visit_store_target
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        func = node.func
+        if isinstance(func, ast.Name):
+            if func.id in self.modules:
+                self._visit_module_call(self.modules[func.id], func.id, node)
+            else:
+                self._visit_builtin_call(func.id, node)
+            return
+        if not isinstance(func, ast.Attribute):
+            self.unknown = True
+            return
+        if isinstance(func.value, (ast.Str, ast.Num, ast.Bytes, ast.JoinedStr)):
+            return
+        dotted_name = self._dotted_name(func)
+        if dotted_name is not None and dotted_name[0] in self.modules:
+            self._visit_module_call('.'.join([self.modules[dotted_name[0]], *dotted_name[1:]]), dotted_name[0], node)
+            return
+        receiver = self._root_name(func.value)
+        inplace = any(
+            k.arg == 'inplace' and not (isinstance(k.value, ast.NameConstant) and k.value.value is False)
+            for k in node.keywords
+        )
+        if self._is_io_method(func.attr, node):
+            self.unknown = True
+        elif receiver is None:
+            if not isinstance(func.value, ast.Call):
+                self.unknown = True
+            elif func.attr not in self.pure_methods:
+                # a method of a temporary object, for example open(filename).read() or
+                # random.Random(1).shuffle(data), which may change its arguments
+                self._mutate(self._argument_names(node))
+        elif receiver not in self.local_values:
+            # the object may be anything, like a database cursor or a logger
+            self.unknown = True
+        elif func.attr in self.plot_methods and not inplace:
+            self.mutated |= {
+                alias for alias, module in self.modules.items() if self._in_modules(module, self.stateful_modules)
+            }
+        elif func.attr not in self.pure_methods or inplace:
+            self._mutate({receiver} | self._argument_names(node))
+
+    @classmethod
+    def _local_names(cls, node) -> Set[str]:
+        """Returns the arguments and the variables assigned in the body of a function or lambda."""
+        declared_globals = {
+            name for n in ast.walk(node) if isinstance(n, (ast.Global, ast.Nonlocal)) for name in n.names
+        }
+        arguments = {a.arg for a in ast.walk(node.args) if isinstance(a, ast.arg)}
+        stored = {n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)}
+        return (arguments | stored) - declared_globals
+
+    def _visit_definition(self, node, nested_nodes):
+        self.bound.add(node.name)
+        self.local_values.discard(node.name)
+        self.uses |= self._loaded_names(getattr(node, 'decorator_list', []))
+        self.deferred_uses |= self._loaded_names(nested_nodes)
+
+    def visit_FunctionDef(self, node):
+        self._visit_definition(node, [])
+        self.deferred_uses |= self._loaded_names(node.body) - self._local_names(node)
+        self.uses |= self._loaded_names(node.args.defaults + node.args.kw_defaults)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        self._visit_definition(node, [])
+        self.uses |= self._loaded_names(node.bases + [k.value for k in node.keywords])
+        for stmt in node.body:
+            self.visit(stmt)
+
+    def visit_Lambda(self, node):
+        self.deferred_uses |= self._loaded_names([node.body]) - self._local_names(node)
+
+    def _visit_comprehension(self, node):
+        """The variables of a comprehension are not visible outside of it, but they share the elements of
+        their iterables."""
+        targets = {n.id for g in node.generators for n in ast.walk(g.target) if isinstance(n, ast.Name)}
+        for generator in node.generators:
+            self._alias(self._stored_names(generator.target) | self._element_names(generator.iter))
+        effects = _StatementEffects(self.modules, self.pure_functions, self.in_function, self.local_values - targets,
+                                    self.aliases)
+        for child in ast.iter_child_nodes(node):
+            effects.visit(child)
+        self.uses |= effects.uses - targets
+        self.bound |= effects.bound - targets
+        self.mutated |= effects.mutated - targets
+        self.deferred_uses |= effects.deferred_uses
+        self.globals |= effects.globals
+        self.unknown = self.unknown or effects.unknown
+
+    visit_ListComp = _visit_comprehension
+    visit_SetComp = _visit_comprehension
+    visit_DictComp = _visit_comprehension
+    visit_GeneratorExp = _visit_comprehension
+
+    def _visit_import(self, node):
+        for alias in node.names:
+            self.bound.add(alias.asname or alias.name.split('.')[0])
+            self.local_values.discard(alias.asname or alias.name.split('.')[0])
+        self.unknown = True
+
+    visit_Import = _visit_import
+    visit_ImportFrom = _visit_import
+
+    def _visit_global(self, node):
+        self.globals.update(node.names)
+        self.unknown = True
+
+    visit_Global = _visit_global
+    visit_Nonlocal = _visit_global
+
+    def _visit_control_flow(self, node):
+        if not self.in_function or isinstance(node, ast.Raise):
+            self.unknown = True
+        self.generic_visit(node)
+
+    visit_Raise = _visit_control_flow
+    visit_Return = _visit_control_flow
+    visit_Yield = _visit_control_flow
+    visit_YieldFrom = _visit_control_flow
+    visit_Await = _visit_control_flow
+
+
+class ProgramSlicer:
+    """
+    ProgramSlicer performs a backward dataflow analysis over the top level statements of the
+    transformed notebook. For each statement it finds which of the declared outputs depend on it.
+    Statements with side effects that cannot be understood, like calls of unknown functions, methods
+    of objects which the notebook did not create, file writes, imports and global declarations, are
+    always kept. A statement which changes an object changes all the variables which may share it,
+    like y after x = y.
+    """
+
+    _ALWAYS = ''
+
+    def __init__(self, tree: ast.Module, outputs: List[str], inputs: Iterable[str] = ()):
+        """
+        :param tree: The transformed notebook
+        :param outputs: The names of the outputs
+        :param inputs: The names of the inputs, which are bound to local values before the first statement
+        """
+        self._tree = tree
+        self._outputs = outputs
+        modules: Dict[str, str] = {}
+        pure_functions: Set[str] = set()
+        local_values = set(inputs)
+        aliases: Dict[str, FrozenSet[str]] = {}
+        self._effects: List[_StatementEffects] = []
+        for stmt in tree.body:
+            if isinstance(stmt, ast.Import):
+                modules.update({
+                    alias.asname or alias.name.split('.')[0]: alias.name if alias.asname else alias.name.split('.')[0]
+                    for alias in stmt.names
+                })
+            elif isinstance(stmt, ast.ImportFrom) and stmt.module is not None and stmt.level == 0:
+                modules.update({alias.asname or alias.name: f'{stmt.module}.{alias.name}' for alias in stmt.names})
+            # the functions are analysed first, so the rest of a block, like a checkpoint block, can call them
+            for function in self._defined_functions(stmt):
+                if self._is_pure_function(function, modules, pure_functions, local_values, aliases):
+                    pure_functions.add(function.name)
+                else:
+                    pure_functions.discard(function.name)
+            effects = _StatementEffects(modules, pure_functions, local_values=local_values, aliases=aliases)
+            effects.visit(stmt)
+            self._effects.append(effects)
+            local_values = effects.local_values - effects.bound if effects.unknown else effects.local_values
+        self._killed = [self._killed_names(stmt) for stmt in tree.body]
+        # the variables of a with statement are bound before its body uses them
+        self._uses = [
+            _StatementEffects._loaded_names([item.context_expr for item in stmt.items]) | (effects.uses - killed)
+            if isinstance(stmt, (ast.With, ast.AsyncWith)) else effects.uses
+            for stmt, effects, killed in zip(tree.body, self._effects, self._killed)
+        ]
+        global_names = set().union(*[e.globals for e in self._effects])
+        self._roots: Dict[str, Set[int]] = {self._ALWAYS: set(), **{output: set() for output in outputs}}
+        for i, effects in enumerate(self._effects):
+            used_outputs = [output for output in outputs if output in effects.uses]
+            if len(used_outputs) > 0:
+                for output in used_outputs:
+                    self._roots[output].add(i)
+            elif effects.unknown or len(effects.defs & global_names) > 0:
+                self._roots[self._ALWAYS].add(i)
+
+    @classmethod
+    def _defined_functions(cls, stmt: ast.stmt) -> List[ast.FunctionDef]:
+        """Returns the functions which the statement defines, including the ones in the blocks of the
+        compound statements."""
+        if isinstance(stmt, ast.FunctionDef):
+            return [stmt]
+        if isinstance(stmt, (ast.ClassDef, ast.AsyncFunctionDef)):
+            return []
+        functions: List[ast.FunctionDef] = []
+        for field in ('body', 'orelse', 'finalbody'):
+            for child in getattr(stmt, field, []):
+                functions.extend(cls._defined_functions(child))
+        return functions
+
+    @classmethod
+    def _is_pure_function(cls, node: ast.FunctionDef, modules: Dict[str, str], pure_functions: Set[str],
+                          local_values: Set[str], aliases: Dict[str, FrozenSet[str]]) -> bool:
+        # the aliases inside the function are not visible outside of it
+        effects = _StatementEffects(modules, pure_functions | {node.name}, in_function=True,
+                                    local_values=local_values | _StatementEffects._local_names(node),
+                                    aliases=dict(aliases))
+        for stmt in node.body:
+            effects.visit(stmt)
+        local_names = effects.bound - effects.globals
+        return not effects.unknown and effects.mutated <= local_names
+
+    @classmethod
+    def _killed_names(cls, stmt: ast.stmt) -> Set[str]:
+        """Returns the names that the statement always rebinds."""
+        if isinstance(stmt, ast.Assign):
+            targets = stmt.targets
+        elif isinstance(stmt, ast.AnnAssign) and stmt.value is not None:
+            targets = [stmt.target]
+        elif isinstance(stmt, (ast.With, ast.AsyncWith)):
+            targets = [item.optional_vars for item in stmt.items if item.optional_vars is not None]
+        elif isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            return {stmt.name}
+        elif isinstance(stmt, (ast.Import, ast.ImportFrom)):
+            return {alias.asname or alias.name.split('.')[0] for alias in stmt.names}
+        else:
+            return set()
+        names = set()
+        for target in targets:
+            elements = target.elts if isinstance(target, (ast.Tuple, ast.List)) else [target]
+            names |= {e.id for e in elements if isinstance(e, ast.Name)}
+        return names
+
+    def _closure(self, roots: Set[int]) -> Set[int]:
+        deferred_uses: Set[str] = set()
+        while True:
+            kept: Set[int] = set()
+            live: Set[str] = set()
+            new_deferred_uses = set(deferred_uses)
+            for i in reversed(range(len(self._effects))):
+                effects = self._effects[i]
+                if i in roots or len(effects.defs & (live | deferred_uses)) > 0:
+                    kept.add(i)
+                    live = (live - self._killed[i]) | self._uses[i]
+                    new_deferred_uses |= effects.deferred_uses
+            if new_deferred_uses == deferred_uses:
+                return kept
+            deferred_uses = new_deferred_uses
+
+    def statement_outputs(self) -> List[Optional[FrozenSet[str]]]:
+        """Returns for each top level statement the outputs that depend on it. None means that
+        the statement must always be executed."""
+        always = self._closure(self._roots[self._ALWAYS])
+        per_output = {output: self._closure(self._roots[output]) for output in self._outputs}
+        return [
+            None if i in always else frozenset(output for output in self._outputs if i in per_output[output])
+            for i in range(len(self._effects))
+        ]
+
+    def statement_dataflow(self) -> List[Tuple[Set[str], Set[str], Set[str]]]:
+        """Returns for each top level statement the names it uses, including the names used by the
+        functions it defines, the names it binds or mutates and the names it always rebinds."""
+        return [
+            (uses | effects.deferred_uses, effects.defs, killed)
+            for uses, effects, killed in zip(self._uses, self._effects, self._killed)
+        ]
+
+    def statement_unknown_effects(self) -> List[bool]:
+        """Returns for each top level statement whether it has side effects that cannot be analysed."""
+        return [effects.unknown for effects in self._effects]
+
+    def slice(self) -> List[ast.stmt]:
+        """Removes from the tree the statements that none of the outputs depends on.
+        :return: The removed statements"""
+        statement_outputs = self.statement_outputs()
+        removed = [stmt for stmt, outputs in zip(self._tree.body, statement_outputs) if outputs == frozenset()]
+        self._tree.body = [stmt for stmt, outputs in zip(self._tree.body, statement_outputs) if outputs != frozenset()]
+        return removed
@@ -1,25 +1,39 @@
 import argparse
+import cProfile
+import json
 import logging
 import os
 import shutil
 import stat
 import sys
 import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from pathlib import Path
 from typing import List, Optional, Tuple, Dict
 from urllib.parse import urlparse, ParseResult
 
+import docker  # type: ignore
 import git  # type: ignore
 import nbformat  # type: ignore
-import yaml
 from git import Repo
 from repo2docker import Repo2Docker  # type: ignore
 
+from .build_context import context_size, dockerignore_rules, strip_notebook_outputs, write_dockerignore
 from .cwltoolextractor import AnnotatedIPython2CWLToolConverter
+from .metrics import Repo2CWLMetrics
+from .revisions import notebook_blobs, resolve_revisions, revision_directory_name
+from .serialization import FORMATS, dump_cwl, pack_cwl
+from .validation import CWLValidator
+from .watcher import create_watcher, debounced_changes
 
 logger = logging.getLogger('repo2cwl')
 logger.setLevel(logging.INFO)
 
+_Limits = namedtuple('_Limits', ['fetch', 'conversion', 'build'])
+
 
 def _get_notebook_paths_from_dir(dir_path: str):
     notebooks_paths = []
@@ -30,8 +44,9 @@ def _get_notebook_paths_from_dir(dir_path: str):
     return notebooks_paths
 
 
-def _store_jn_as_script(notebook_path: str, git_directory_absolute_path: str, bin_absolute_path: str, image_id: str) \
-        -> Tuple[Optional[Dict], Optional[str]]:
+def _store_jn_as_script(notebook_path: str, git_directory_absolute_path: str, bin_absolute_path: str, image_id: str,
+                        slice_outputs: bool = False, stages: bool = False,
+                        warm_start: bool = False) -> Tuple[Optional[Dict], Optional[str]]:
     with open(notebook_path) as fd:
         notebook = nbformat.read(fd, as_version=4)
 
@@ -40,6 +55,9 @@ def _store_jn_as_script(notebook_path: str, git_directory_absolute_path: str, bi
     if len(converter._variables) == 0:
         logger.info(f"Notebook {notebook_path} does not contains typing annotations. skipping...")
         return None, None
+    if slice_outputs:
+        for removed_statement in converter.slice():
+            logger.info(f'Notebook {notebook_path}: removed statement at {removed_statement}')
     script_relative_path = os.path.relpath(notebook_path, git_directory_absolute_path)[:-6]
     script_relative_parent_directories = script_relative_path.split(os.sep)
     if len(script_relative_parent_directories) > 1:
@@ -50,22 +68,59 @@ def _store_jn_as_script(notebook_path: str, git_directory_absolute_path: str, bi
         script_absolute_name = os.path.join(script_absolute_name, os.path.basename(script_relative_path))
     else:
         script_absolute_name = os.path.join(bin_absolute_path, script_relative_path)
-    script = os.linesep.join([
+    with open(script_absolute_name, 'w') as fd:
+        fd.write(_generated_script(converter, warm_start))
+    tool = converter.cwl_command_line_tool(image_id)
+    in_git_dir_script_file = os.path.join(bin_absolute_path, script_relative_path)
+    tool_st = os.stat(in_git_dir_script_file)
+    os.chmod(in_git_dir_script_file, tool_st.st_mode | stat.S_IEXEC)
+    if stages and len(converter._stages) > 0:
+        tool['stages'] = _store_jn_stages_as_scripts(converter, script_absolute_name, script_relative_path, image_id)
+    return tool, script_relative_path
+
+
+def _generated_script(converter: AnnotatedIPython2CWLToolConverter, warm_start: bool = False) -> str:
+    return os.linesep.join([
         '#!/usr/bin/env ipython',
         '"""',
         'DO NOT EDIT THIS FILE',
         'THIS FILE IS AUTO-GENERATED BY THE ipython2cwl.',
         'FOR MORE INFORMATION CHECK https://github.com/giannisdoukas/ipython2cwl',
         '"""\n\n',
-        converter._wrap_script_to_method(converter._tree, converter._variables)
+        converter._wrap_script_to_method(converter._tree, converter._variables, warm_start)
     ])
-    with open(script_absolute_name, 'w') as fd:
-        fd.write(script)
-    tool = converter.cwl_command_line_tool(image_id)
-    in_git_dir_script_file = os.path.join(bin_absolute_path, script_relative_path)
-    tool_st = os.stat(in_git_dir_script_file)
-    os.chmod(in_git_dir_script_file, tool_st.st_mode | stat.S_IEXEC)
-    return tool, script_relative_path
+
+
+def _store_jn_stages_as_scripts(converter: AnnotatedIPython2CWLToolConverter, script_absolute_name: str,
+                                script_relative_path: str, image_id: str) -> Dict:
+    stages_directory = f'{script_absolute_name}_stages'
+    os.makedirs(stages_directory, exist_ok=True)
+    base_commands = {}
+    for stage_name, stage_script in converter.stage_scripts().items():
+        stage_script_name = os.path.join(stages_directory, stage_name)
+        with open(stage_script_name, 'w') as fd:
+            fd.write(os.linesep.join(['#!/usr/bin/env ipython', stage_script]))
+        os.chmod(stage_script_name, os.stat(stage_script_name).st_mode | stat.S_IEXEC)
+        base_commands[stage_name] = os.path.join('/app', 'cwl', 'bin', f'{script_relative_path}_stages', stage_name)
+    return converter.cwl_stages_workflow(image_id, base_commands)
+
+
+def _directory_size(directory: str) -> int:
+    size = 0
+    for path, _, files in os.walk(directory):
+        for name in files:
+            file_path = os.path.join(path, name)
+            if not os.path.islink(file_path):
+                size += os.path.getsize(file_path)
+    return size
+
+
+def _image_size(image_id: str) -> Optional[int]:
+    try:
+        return docker.from_env().images.get(image_id).attrs['Size']
+    except Exception:
+        logger.warning(f'Could not inspect the size of the image {image_id}')
+        return None
 
 
 def existing_path(path_str: str):
@@ -77,10 +132,73 @@ def existing_path(path_str: str):
 
 def parser_arguments(argv: List[str]):
     parser = argparse.ArgumentParser()
-    parser.add_argument('repo', type=lambda uri: urlparse(uri, scheme='file'), nargs=1)
+    parser.add_argument('repo', type=lambda uri: urlparse(uri, scheme='file'), nargs='*',
+                        help='The repositories to convert. With multiple repositories the files of each one are '
+                             'stored to a subdirectory of the output directory')
+    parser.add_argument('--repos-file', help='File which lists a repository at each line',
+                        type=Path, default=None)
+    parser.add_argument('--fetch-jobs', help='Maximum number of repositories which are copied or cloned at the '
+                                             'same time', type=int, default=4)
+    parser.add_argument('--convert-jobs', help='Maximum number of repositories which are converted at the same time',
+                        type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--build-jobs', help='Maximum number of images which are built at the same time',
+                        type=int, default=1)
     parser.add_argument('-o', '--output', help='Output directory to store the generated cwl files',
                         type=existing_path,
                         required=True)
+    parser.add_argument('--scatter', help='Name of a list input to scatter over. For each tool with that list input '
+                                          'a CWL Workflow is also generated. Can be used multiple times',
+                        action='append', default=[], metavar='INPUT')
+    parser.add_argument('--slice', help='Remove from the generated scripts the statements which none of the '
+                                        'outputs depends on', action='store_true')
+    parser.add_argument('--argfile', help='Generate also for each tool with list inputs a companion tool which '
+                                          'passes the list inputs with argument files instead of the command line',
+                        action='store_true')
+    parser.add_argument('--batch', help='Generate also for each tool a companion tool which executes the notebook '
+                                        'for each parameter set of a JSON-lines manifest in a single job',
+                        action='store_true')
+    parser.add_argument('--metrics-file', help='File to store the duration of each phase, the number of the '
+                                               'converted, skipped and failed notebooks and the size of the image',
+                        type=Path, default=None)
+    parser.add_argument('--metrics-format', help='Format of the metrics file. By default json is used for .json '
+                                                 'files and openmetrics otherwise',
+                        choices=Repo2CWLMetrics.formats, default=None)
+    parser.add_argument('--profile', help='File to store the cProfile stats of the conversion of the notebooks',
+                        type=Path, default=None)
+    parser.add_argument('--format', help='Format of the generated CWL files', choices=FORMATS, default='yaml')
+    parser.add_argument('--pack', help='Write all the tools and workflows to a single packed CWL document, '
+                                       'packed.cwl, with a $graph', action='store_true')
+    parser.add_argument('--watch', help='After the conversion, watch the local repository and regenerate the '
+                                        'tools of the notebooks which change, without building the image again',
+                        action='store_true')
+    parser.add_argument('--watch-polling', help='Poll the repository for changes instead of using inotify',
+                        action='store_true')
+    parser.add_argument('--watch-debounce', help='Seconds without changes before regenerating the tools',
+                        type=float, default=1.0)
+    parser.add_argument('--warm-start', help='Embed to the generated scripts a warm-start server, which imports the '
+                                             'top level imports once and executes the tool at forks of itself',
+                        action='store_true')
+    parser.add_argument('--stages', help='Generate also for each notebook with stage annotations a CWL Workflow '
+                                         'with a step for each stage', action='store_true')
+    parser.add_argument('--validate', help='Validate the generated CWL files against the CWL schema before writing '
+                                           'them. The compiled schema is cached at '
+                                           '$XDG_CACHE_HOME/ipython2cwl/schemas',
+                        action='store_true')
+    parser.add_argument('--context-rules', help='File with extra .dockerignore rules for the build context of the '
+                                                'image, which are applied after the generated ones',
+                        type=Path, default=None)
+    parser.add_argument('--keep-outputs', help='Do not strip the outputs of the notebooks which are copied to the '
+                                               'image', action='store_true')
+    parser.add_argument('--prune-unused', help='Exclude from the image the files which neither the generated '
+                                               'scripts, the python modules nor the dependency files refer to. The '
+                                               'files which are found with globs or computed names are excluded too',
+                        action='store_true')
+    parser.add_argument('--revisions', help='Convert the notebooks of each revision, a ref like v1.0 or a range like '
+                                            'v1.0..v2.0, from the git object database without checking it out. '
+                                            'The tools of each revision are written to their own directory and '
+                                            'the image is not built', nargs='+', default=[])
+    parser.add_argument('--revisions-image', help='Docker image id of the tools of the revisions',
+                        default='jn2cwl:latest')
     return parser.parse_args(argv)
 
 
@@ -96,79 +214,518 @@ def repo2cwl(argv: Optional[List[str]] = None) -> int:
     setup_logger()
     argv = sys.argv[1:] if argv is None else argv
     args = parser_arguments(argv)
-    uri: ParseResult = args.repo[0]
+    uris: List[ParseResult] = list(args.repo)
+    if args.repos_file is not None:
+        with open(args.repos_file) as f:
+            uris.extend(urlparse(line.strip(), scheme='file') for line in f
+                        if line.strip() and not line.strip().startswith('#'))
+    if len(uris) == 0:
+        raise ValueError('At least one repository is required')
+    if args.watch and len(uris) > 1:
+        raise ValueError('Only a single repository can be watched')
+    if len(args.revisions) > 0:
+        if len(uris) > 1 or args.watch:
+            raise ValueError('The revisions of a single repository can be converted, without watching it')
+        return _revisions_with_metrics(uris[0], args.output, args)
+    if args.profile is not None and args.convert_jobs > 1 and len(uris) > 1:
+        # only one profiler can be active at a time, so the repositories are profiled one after the other
+        logger.warning('The repositories are converted one at a time, because the conversion is profiled')
+        args.convert_jobs = 1
+    limits = _Limits(
+        threading.Semaphore(args.fetch_jobs),
+        threading.Semaphore(args.convert_jobs),
+        threading.Semaphore(args.build_jobs),
+    )
+    if len(uris) == 1:
+        image_id = _repo2cwl_with_metrics(uris[0], args.output, args, limits)
+        if args.watch:
+            _watch(uris[0].path, args.output, image_id, args)
+        return 0
+
+    output_directories = _output_directories(uris, args.output)
+    failures: Dict[str, Exception] = {}
+    # each repository waits for the limit of each phase, so the phases of different repositories overlap
+    with ThreadPoolExecutor(max_workers=args.fetch_jobs + args.convert_jobs + args.build_jobs) as executor:
+        futures = [
+            executor.submit(_repo2cwl_with_metrics, uri, output_directory, args, limits)
+            for uri, output_directory in zip(uris, output_directories)
+        ]
+        for uri, future in zip(uris, futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.exception(f'Failed to convert repository {uri.geturl()}')
+                failures[uri.geturl()] = e
+    logger.info(f'Converted {len(uris) - len(failures)} of {len(uris)} repositories')
+    for uri_str, error in failures.items():
+        logger.error(f'Failed: {uri_str}: {type(error).__name__}: {error}')
+    return 1 if len(failures) > 0 else 0
+
+
+def _output_directories(uris: List[ParseResult], output_directory: Path) -> List[Path]:
+    """Returns a unique subdirectory of the output directory for each repository, named after the repository."""
+    names: List[str] = []
+    for uri in uris:
+        name = os.path.basename(uri.path.rstrip('/'))
+        name = name[:-len('.git')] if name.endswith('.git') else name
+        name = name or 'repo'
+        unique_name, i = name, 1
+        while unique_name in names:
+            i += 1
+            unique_name = f'{name}_{i}'
+        names.append(unique_name)
+    directories = [output_directory.joinpath(name) for name in names]
+    for directory in directories:
+        directory.mkdir(exist_ok=True)
+    return directories
+
+
+def _repo2cwl_with_metrics(uri: ParseResult, output_directory: Path, args, limits: _Limits) -> str:
+    """Converts a repository and writes its metrics and its profile, if requested. For multiple repositories the
+    metrics and the profile are written to the output directory of each repository."""
+    metrics = Repo2CWLMetrics()
+    metrics_file, profile = args.metrics_file, args.profile
+    if output_directory != args.output:
+        metrics_file = None if metrics_file is None else output_directory.joinpath(metrics_file.name)
+        profile = None if profile is None else output_directory.joinpath(profile.name)
+    try:
+        return _convert_repository(uri, output_directory, args, metrics, limits, profile)
+    finally:
+        if metrics_file is not None:
+            logger.info(f'Writing metrics: {metrics_file}')
+            metrics.write(metrics_file, args.metrics_format)
+
+
+def _convert_repository(uri: ParseResult, output_directory: Path, args, metrics: Repo2CWLMetrics, limits: _Limits,
+                        profile: Optional[Path]) -> str:
     if uri.path.startswith('git@') and uri.path.endswith('.git'):
         uri = urlparse(f'ssh://{uri.path}')
-    output_directory: Path = args.output
     supported_schemes = {'file', 'http', 'https', 'ssh'}
     if uri.scheme not in supported_schemes:
         raise ValueError(f'Supported schema uris: {supported_schemes}')
-    local_git_directory = os.path.join(tempfile.mkdtemp(prefix='repo2cwl_'), 'repo')
-    if uri.scheme == 'file':
-        if not os.path.isdir(uri.path):
-            raise ValueError(f'Directory does not exists')
-        logger.info(f'copy repo to temp directory: {local_git_directory}')
-        shutil.copytree(uri.path, local_git_directory)
-        try:
-            local_git = git.Repo(local_git_directory)
-        except git.InvalidGitRepositoryError:
-            local_git = git.Repo.init(local_git_directory)
-            local_git.git.add(A=True)
-            local_git.index.commit("initial commit")
-    elif uri.scheme == 'ssh':
-        url = uri.geturl()[6:]
-        logger.info(f'cloning repo {url} to temp directory: {local_git_directory}')
-        local_git = git.Repo.clone_from(url, local_git_directory)
-    else:
-        logger.info(f'cloning repo to temp directory: {local_git_directory}')
-        local_git = git.Repo.clone_from(uri.geturl(), local_git_directory)
+    if args.watch and uri.scheme != 'file':
+        raise ValueError('Only local repositories can be watched')
+    if args.watch and args.pack:
+        raise ValueError('The packed document can not be regenerated at the watch mode')
+    temp_directory = tempfile.mkdtemp(prefix='repo2cwl_')
+    try:
+        return _convert_local_copy(uri, os.path.join(temp_directory, 'repo'), output_directory, args, metrics,
+                                   limits, profile)
+    finally:
+        logger.info(f'Cleaning local temporary directory {temp_directory}...')
+        with metrics.phase('cleanup'):
+            shutil.rmtree(temp_directory, ignore_errors=True)
+
+
+def _convert_local_copy(uri: ParseResult, local_git_directory: str, output_directory: Path, args,
+                        metrics: Repo2CWLMetrics, limits: _Limits, profile: Optional[Path]) -> str:
+    """Copies or clones a repository to a local directory and converts it."""
+    with limits.fetch:
+        if uri.scheme == 'file':
+            if not os.path.isdir(uri.path):
+                raise ValueError(f'Directory does not exists')
+            logger.info(f'copy repo to temp directory: {local_git_directory}')
+            with metrics.phase('copy'):
+                shutil.copytree(uri.path, local_git_directory)
+                try:
+                    local_git = git.Repo(local_git_directory)
+                except git.InvalidGitRepositoryError:
+                    local_git = git.Repo.init(local_git_directory)
+                    local_git.git.add(A=True)
+                    local_git.index.commit("initial commit")
+        elif uri.scheme == 'ssh':
+            url = uri.geturl()[6:]
+            logger.info(f'cloning repo {url} to temp directory: {local_git_directory}')
+            with metrics.phase('clone'):
+                local_git = git.Repo.clone_from(url, local_git_directory)
+        else:
+            logger.info(f'cloning repo to temp directory: {local_git_directory}')
+            with metrics.phase('clone'):
+                local_git = git.Repo.clone_from(uri.geturl(), local_git_directory)
+    metrics.repo_bytes = _directory_size(local_git_directory)
 
-    image_id, cwl_tools = _repo2cwl(local_git)
+    context_rules = None
+    if args.context_rules is not None:
+        with open(args.context_rules) as f:
+            context_rules = [line.strip() for line in f if line.strip() != '' and not line.strip().startswith('#')]
+    image_id, cwl_tools = _repo2cwl(local_git, slice_outputs=args.slice, stages=args.stages,
+                                    warm_start=args.warm_start, metrics=metrics,
+                                    profile_path=profile, limits=limits, context_rules=context_rules,
+                                    strip_outputs=not args.keep_outputs, prune=args.prune_unused)
     logger.info(f'Generated image id: {image_id}')
+    metrics.image_size_bytes = _image_size(image_id)
+    documents = []
     for tool in cwl_tools:
         base_command_script_name = f'{tool["baseCommand"][len("/app/cwl/bin/"):].replace("/", "_")}.cwl'
-        tool_filename = str(output_directory.joinpath(base_command_script_name))
-        with open(tool_filename, 'w') as f:
-            logger.info(f'Creating CWL command line tool: {tool_filename}')
-            yaml.safe_dump(tool, f)
+        documents.extend(_tool_documents(tool, str(output_directory.joinpath(base_command_script_name)), args))
+    if args.validate:
+        with metrics.phase('validate'):
+            _validate_documents(documents)
+    with metrics.phase('write'):
+        _write_output_documents(documents, output_directory, args)
+    return image_id
+
+
+def _development_tool(tool: Dict, script_location: str) -> Dict:
+    """Returns a copy of the tool which executes the script of the output directory with ipython, instead of the
+    script of the image."""
+    tool = {**tool, 'baseCommand': 'ipython'}
+    tool['inputs'] = {
+        'ipython2cwl_script': {
+            'type': 'File',
+            'default': {'class': 'File', 'location': script_location},
+            'inputBinding': {'position': -1},
+        },
+        **tool['inputs']
+    }
+    return tool
+
+
+def _tool_documents(tool: Dict, tool_filename: str, args,
+                    script_location: Optional[str] = None) -> List[Tuple[str, str, Dict]]:
+    """
+    Returns the CWL command line tool and its companion workflows and tools.
+    :param tool: The tool
+    :param tool_filename: The path of the tool file
+    :param args: The arguments of repo2cwl
+    :param script_location: The path of the script relative to the output directory, if the tools have to execute
+                            it instead of the script of the image
+    :return: The description, the file path and the content of each document
+    """
+    stages_workflow = tool.pop('stages', None)
+    documents = [(
+        'command line tool', tool_filename,
+        tool if script_location is None else _development_tool(tool, script_location)
+    )]
+    scatter = [
+        name for name in args.scatter
+        if name in tool['inputs'] and tool['inputs'][name]['type'].endswith('[]')
+    ]
+    if len(scatter) > 0:
+        workflow = AnnotatedIPython2CWLToolConverter.scatter_workflow(tool, scatter)
+        if script_location is not None:
+            workflow['steps']['notebookTool']['run'] = _development_tool(
+                workflow['steps']['notebookTool']['run'], script_location
+            )
+        documents.append(('scatter workflow', f'{tool_filename[:-len(".cwl")]}_scatter.cwl', workflow))
+    if args.argfile and any(
+            description['type'].endswith('[]') and 'inputBinding' in description
+            for description in tool['inputs'].values()
+    ):
+        argfile_tool = AnnotatedIPython2CWLToolConverter.argfile_command_line_tool(tool)
+        if script_location is not None:
+            argfile_tool = _development_tool(argfile_tool, script_location)
+        documents.append(('argfile command line tool', f'{tool_filename[:-len(".cwl")]}_argfile.cwl', argfile_tool))
+    if args.batch:
+        batch_tool = AnnotatedIPython2CWLToolConverter.batch_command_line_tool(tool)
+        if script_location is not None:
+            batch_tool = _development_tool(batch_tool, script_location)
+        documents.append(('batch command line tool', f'{tool_filename[:-len(".cwl")]}_batch.cwl', batch_tool))
+    if stages_workflow is not None:
+        documents.append(('stages workflow', f'{tool_filename[:-len(".cwl")]}_stages.cwl', stages_workflow))
+    return documents
+
+
+def _validate_documents(documents: List[Tuple[str, str, Dict]]):
+    """Validates the CWL documents against the CWL schema, which is loaded once for all of them."""
+    errors = CWLValidator().validate_many({filename: document for _, filename, document in documents})
+    for message in errors.values():
+        logger.error(message)
+    if len(errors) > 0:
+        raise ValueError(f'{len(errors)} of the generated CWL documents are invalid')
+
+
+def _write_documents(documents: List[Tuple[str, str, Dict]], args):
+    """Writes each CWL document to its own file."""
+    for description, filename, document in documents:
+        with open(filename, 'w') as f:
+            logger.info(f'Creating CWL {description}: {filename}')
+            dump_cwl(document, f, args.format)
+
+
+def _write_output_documents(documents: List[Tuple[str, str, Dict]], output_directory: Path, args):
+    """Writes the CWL documents to their own files, or to a single packed document of the output directory."""
+    if args.pack:
+        packed_documents = {
+            os.path.basename(filename)[:-len('.cwl')]: document for _, filename, document in documents
+        }
+        packed_filename = str(output_directory.joinpath('packed.cwl'))
+        with open(packed_filename, 'w') as f:
+            logger.info(f'Creating packed CWL document: {packed_filename}')
+            dump_cwl(pack_cwl(packed_documents), f, args.format)
+    else:
+        _write_documents(documents, args)
+
+
+def _write_tool_files(tool: Dict, tool_filename: str, args, script_location: Optional[str] = None):
+    """Writes the CWL command line tool and its companion workflows and tools, each one to its own file."""
+    documents = _tool_documents(tool, tool_filename, args, script_location)
+    if args.validate:
+        _validate_documents(documents)
+    _write_documents(documents, args)
+
+
+def _regenerate_notebook(notebook_path: str, repo_path: str, output_directory: Path, image_id: str, args):
+    """Regenerates the script and the tool files of a changed notebook, or removes them if it was deleted."""
+    script_relative_path = os.path.relpath(notebook_path, repo_path)[:-len('.ipynb')]
+    tool_filename = str(output_directory.joinpath(f'{script_relative_path.replace(os.sep, "_")}.cwl'))
+    bin_path = str(output_directory.joinpath('bin'))
+    for suffix in ['', '_scatter', '_argfile', '_batch']:
+        stale_filename = f'{tool_filename[:-len(".cwl")]}{suffix}.cwl'
+        if os.path.exists(stale_filename):
+            os.remove(stale_filename)
+    if os.path.exists(os.path.join(bin_path, script_relative_path)):
+        os.remove(os.path.join(bin_path, script_relative_path))
+    if not os.path.isfile(notebook_path):
+        logger.info(f'Notebook {notebook_path} was deleted. Removed its tools')
+        return
+    os.makedirs(bin_path, exist_ok=True)
+    try:
+        tool, _ = _store_jn_as_script(notebook_path, repo_path, bin_path, image_id, args.slice,
+                                      warm_start=args.warm_start)
+    except Exception:
+        logger.exception(f'Could not convert notebook {notebook_path}')
+        return
+    if tool is None:
+        return
+    try:
+        _write_tool_files(tool, tool_filename, args, os.path.join('bin', script_relative_path))
+    except ValueError:
+        logger.exception(f'Could not regenerate the tools of notebook {notebook_path}')
+
+
+def _watch(repo_path: str, output_directory: Path, image_id: str, args):
+    """Regenerates the scripts and the tools of the notebooks which change, without copying the repository or
+    building the image again. The regenerated tools execute the scripts of the output directory with the
+    environment of the image."""
+    if args.stages:
+        logger.warning('The stages workflows are regenerated only by a full execution')
+    watcher = create_watcher(repo_path, polling=args.watch_polling)
+    logger.info(f'Watching {repo_path} with {type(watcher).__name__}...')
+    try:
+        for changed in debounced_changes(watcher, args.watch_debounce):
+            for notebook_path in sorted(changed):
+                _regenerate_notebook(notebook_path, repo_path, output_directory, image_id, args)
+    except KeyboardInterrupt:
+        logger.info('Stopped watching')
+    finally:
+        watcher.close()
+
+
+def _prune_build_context(repo_path: str, bin_path: str, notebooks_paths: List[str], metrics: Repo2CWLMetrics,
+                         context_rules: Optional[List[str]], strip_outputs: bool, prune: bool):
+    """Strips the outputs of the notebooks and writes the .dockerignore of the build context."""
+    metrics.context_bytes = context_size(repo_path, [])
+    if strip_outputs:
+        for notebook in notebooks_paths:
+            try:
+                strip_notebook_outputs(notebook)
+            except Exception:
+                logger.warning(f'Could not strip the outputs of the notebook {notebook}')
+    script_paths = [os.path.join(path, name) for path, _, files in os.walk(bin_path) for name in files]
+    rules = dockerignore_rules(repo_path, script_paths, prune, [] if context_rules is None else context_rules)
+    logger.info(f'Creating the .dockerignore of the build context: {write_dockerignore(repo_path, rules)}')
+    metrics.pruned_context_bytes = context_size(repo_path, rules)
+    logger.info(f'Build context: {metrics.context_bytes / 1024 / 1024:.2f}MiB before pruning, '
+                f'{metrics.pruned_context_bytes / 1024 / 1024:.2f}MiB after pruning')
+
+
+def _open_revisions_repository(uri: ParseResult, metrics: Repo2CWLMetrics) -> Tuple[Repo, Optional[str]]:
+    """Opens a local repository as it is, or clones a remote one without a working tree."""
+    if uri.path.startswith('git@') and uri.path.endswith('.git'):
+        uri = urlparse(f'ssh://{uri.path}')
+    if uri.scheme == 'file':
+        try:
+            return git.Repo(uri.path), None
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError) as e:
+            raise ValueError(f'{uri.path} is not a git repository') from e
+    supported_schemes = {'file', 'http', 'https', 'ssh'}
+    if uri.scheme not in supported_schemes:
+        raise ValueError(f'Supported schema uris: {supported_schemes}')
+    temp_directory = tempfile.mkdtemp(prefix='repo2cwl_')
+    url = uri.geturl()[6:] if uri.scheme == 'ssh' else uri.geturl()
+    logger.info(f'cloning bare repo {url} to temp directory: {temp_directory}')
+    with metrics.phase('clone'):
+        return git.Repo.clone_from(url, os.path.join(temp_directory, 'repo.git'), bare=True), temp_directory
 
-    logger.info(f'Cleaning local temporary directory {local_git_directory}...')
-    shutil.rmtree(local_git_directory)
-    return 0
 
+def _convert_notebook_blob(data: bytes, notebook_path: str, image_id: str,
+                           slice_outputs: bool, warm_start: bool = False) -> Optional[Tuple[Dict, str]]:
+    """Converts the content of a notebook to its tool and its script, or returns None if it is not annotated."""
+    converter = AnnotatedIPython2CWLToolConverter.from_jupyter_notebook_node(
+        nbformat.reads(data.decode(), as_version=4)
+    )
+    if len(converter._variables) == 0:
+        logger.info(f"Notebook {notebook_path} does not contains typing annotations. skipping...")
+        return None
+    if slice_outputs:
+        for removed_statement in converter.slice():
+            logger.info(f'Notebook {notebook_path}: removed statement at {removed_statement}')
+    return converter.cwl_command_line_tool(image_id), _generated_script(converter, warm_start)
 
-def _repo2cwl(git_directory_path: Repo) -> Tuple[str, List[Dict]]:
+
+def _revisions_with_metrics(uri: ParseResult, output_directory: Path, args) -> int:
+    metrics = Repo2CWLMetrics()
+    try:
+        return _convert_revisions(uri, output_directory, args, metrics)
+    finally:
+        if args.metrics_file is not None:
+            logger.info(f'Writing metrics: {args.metrics_file}')
+            metrics.write(args.metrics_file, args.metrics_format)
+
+
+def _convert_revisions(uri: ParseResult, output_directory: Path, args, metrics: Repo2CWLMetrics) -> int:
+    """
+    Converts the notebooks of many revisions of a repository, which are read from the git object database, so the
+    revisions are not checked out. Each notebook blob is converted once, however many revisions contain it. The
+    scripts and the tools of each revision are written to its own subdirectory of the output directory, and the
+    tools execute the scripts of that directory.
+    :return: 1 if any notebook could not be converted, otherwise 0
+    """
+    if args.stages:
+        logger.warning('The stages workflows are not generated for the revisions')
+    repo, temp_directory = _open_revisions_repository(uri, metrics)
+    try:
+        with metrics.phase('discovery'):
+            revisions = resolve_revisions(repo, args.revisions)
+        conversions: Dict[str, Optional[Tuple[Dict, str]]] = {}
+        index: Dict[str, Dict[str, str]] = {}
+        reused = 0
+        for name, commit in revisions:
+            base_name = revision_directory_name(name)
+            directory_name, i = base_name, 1
+            while directory_name in index:
+                i += 1
+                directory_name = f'{base_name}_{i}'
+            index[directory_name] = {'revision': name, 'commit': commit.hexsha}
+            revision_directory = output_directory.joinpath(directory_name)
+            logger.info(f'Converting revision {name} ({commit.hexsha}) to {revision_directory}')
+            documents = []
+            for notebook_path, blob in notebook_blobs(commit):
+                if blob.hexsha in conversions:
+                    reused += 1
+                else:
+                    with metrics.phase('conversion'):
+                        try:
+                            conversions[blob.hexsha] = _convert_notebook_blob(
+                                blob.data_stream.read(), f'{name}:{notebook_path}', args.revisions_image, args.slice,
+                                args.warm_start
+                            )
+                        except Exception:
+                            logger.exception(f'Could not convert notebook {name}:{notebook_path}')
+                            metrics.notebooks['failed'] += 1
+                            conversions[blob.hexsha] = None
+                            continue
+                    metrics.notebooks['converted' if conversions[blob.hexsha] is not None else 'skipped'] += 1
+                conversion = conversions[blob.hexsha]
+                if conversion is None:
+                    continue
+                tool, script = conversion
+                script_relative_path = notebook_path[:-len('.ipynb')]
+                script_path = revision_directory.joinpath('bin', script_relative_path)
+                script_path.parent.mkdir(parents=True, exist_ok=True)
+                script_path.write_text(script)
+                script_path.chmod(script_path.stat().st_mode | stat.S_IEXEC)
+                tool = deepcopy(tool)
+                tool['baseCommand'] = os.path.join('/app', 'cwl', 'bin', script_relative_path)
+                documents.extend(_tool_documents(
+                    tool,
+                    str(revision_directory.joinpath(f'{script_relative_path.replace("/", "_")}.cwl')),
+                    args,
+                    os.path.join('bin', *script_relative_path.split('/'))
+                ))
+            revision_directory.mkdir(exist_ok=True)
+            if args.validate:
+                with metrics.phase('validate'):
+                    _validate_documents(documents)
+            with metrics.phase('write'):
+                _write_output_documents(documents, revision_directory, args)
+        with open(output_directory.joinpath('revisions.json'), 'w') as f:
+            json.dump(index, f, indent=2)
+    finally:
+        if temp_directory is not None:
+            shutil.rmtree(temp_directory)
+    logger.info(f'Converted {len(revisions)} revisions: {metrics.notebooks["converted"]} notebooks were converted, '
+                f'{reused} were reused from previous revisions')
+    return 1 if metrics.notebooks['failed'] > 0 else 0
+
+
+def _repo2cwl(git_directory_path: Repo, slice_outputs: bool = False, stages: bool = False, warm_start: bool = False,
+              metrics: Optional[Repo2CWLMetrics] = None, profile_path: Optional[Path] = None,
+              limits: Optional[_Limits] = None, context_rules: Optional[List[str]] = None,
+              strip_outputs: bool = True, prune: bool = False) -> Tuple[str, List[Dict]]:
     """
     Takes a Repo mounted to a local directory. That function will create new files and it will commit the changes.
     Do not use that function for Repositories you do not want to change them.
     :param git_directory_path:
+    :param slice_outputs: Remove the statements which none of the outputs depends on
+    :param stages: Generate also the stages workflow of the notebooks with stage annotations, which is stored at
+                   the stages field of the tool
+    :param warm_start: Embed the warm-start server to the generated scripts
+    :param metrics: The metrics to record the phases and the notebook counts to
+    :param profile_path: The file to store the cProfile stats of the conversion of the notebooks
+    :param limits: The semaphores which limit the repositories which are converted and built at the same time
+    :param context_rules: Extra .dockerignore rules for the build context
+    :param strip_outputs: Strip the outputs of the notebooks of the build context
+    :param prune: Exclude from the build context the files which neither the scripts nor the dependency files need
     :return: The generated build image id & the cwl description
     """
+    metrics = Repo2CWLMetrics() if metrics is None else metrics
+    limits = _Limits(threading.Semaphore(), threading.Semaphore(), threading.Semaphore()) if limits is None else limits
     r2d = Repo2Docker()
     r2d.target_repo_dir = os.path.join(os.path.sep, 'app')
     r2d.repo = git_directory_path.tree().abspath
     bin_path = os.path.join(r2d.repo, 'cwl', 'bin')
     os.makedirs(bin_path, exist_ok=True)
-    notebooks_paths = _get_notebook_paths_from_dir(r2d.repo)
-
-    tools = []
-    for notebook in notebooks_paths:
-        cwl_command_line_tool, script_name = _store_jn_as_script(
-            notebook,
-            git_directory_path.tree().abspath,
-            bin_path,
-            r2d.output_image_spec
-        )
-        if cwl_command_line_tool is None or script_name is None:
-            continue
-        cwl_command_line_tool['baseCommand'] = os.path.join('/app', 'cwl', 'bin', script_name)
-        tools.append(cwl_command_line_tool)
-    git_directory_path.index.commit("auto-commit")
-
-    r2d.build()
+    with limits.conversion:
+        with metrics.phase('discovery'):
+            notebooks_paths = _get_notebook_paths_from_dir(r2d.repo)
+
+        tools = []
+        profile = cProfile.Profile() if profile_path is not None else None
+        with metrics.phase('conversion'):
+            for notebook in notebooks_paths:
+                if profile is not None:
+                    profile.enable()
+                try:
+                    cwl_command_line_tool, script_name = _store_jn_as_script(
+                        notebook,
+                        git_directory_path.tree().abspath,
+                        bin_path,
+                        r2d.output_image_spec,
+                        slice_outputs,
+                        stages,
+                        warm_start
+                    )
+                except Exception:
+                    metrics.notebooks['failed'] += 1
+                    raise
+                finally:
+                    if profile is not None:
+                        profile.disable()
+                if cwl_command_line_tool is None or script_name is None:
+                    metrics.notebooks['skipped'] += 1
+                    continue
+                metrics.notebooks['converted'] += 1
+                cwl_command_line_tool['baseCommand'] = os.path.join('/app', 'cwl', 'bin', script_name)
+                tools.append(cwl_command_line_tool)
+        if profile is not None:
+            logger.info(f'Writing the profile of the conversion: {profile_path}')
+            profile.dump_stats(str(profile_path))
+        with metrics.phase('commit'):
+            git_directory_path.index.commit("auto-commit")
+        with metrics.phase('context'):
+            _prune_build_context(
+                str(r2d.repo), bin_path, notebooks_paths, metrics, context_rules, strip_outputs, prune
+            )
+
+    with limits.build, metrics.phase('build'):
+        r2d.build()
     # fix dockerImageId
     for cwl_command_line_tool in tools:
         cwl_command_line_tool['hints']['DockerRequirement']['dockerImageId'] = r2d.output_image_spec
+        for step in cwl_command_line_tool.get('stages', {'steps': {}})['steps'].values():
+            step['run']['hints']['DockerRequirement']['dockerImageId'] = r2d.output_image_spec
     return r2d.output_image_spec, tools
 
 
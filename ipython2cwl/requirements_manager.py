@@ -1,4 +1,8 @@
-from typing import List
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Iterable, List
 
 from pip._internal.operations import freeze  # type: ignore
 
@@ -14,3 +18,41 @@ class RequirementsManager:
             str(package.as_requirement()) for package in freeze.get_installed_distributions()
             if package.project_name != 'ipython2cwl'
         ]
+
+    @classmethod
+    def build_wheelhouse(cls, requirements: List[str], wheel_directory: str, find_links: Iterable[str] = (),
+                         offline: bool = False) -> List[str]:
+        """
+        Collects a wheel of each requirement to a directory, so that the requirements can be installed with
+        pip install --no-index --find-links. The requirements are pinned, so their dependencies are not resolved.
+        The wheels of the directory and of the find-links directories are reused and the rest are downloaded from
+        the index, or built from their source distributions, with the cache of pip. The pip configuration of the
+        environment, like PIP_FIND_LINKS or PIP_NO_INDEX, is respected. The wheels are selected for the python
+        version and the platform of the current environment.
+        :param requirements: The pinned requirements, like the ones of get_all
+        :param wheel_directory: The directory of the wheels, which is created if it does not exist
+        :param find_links: Extra directories or urls to look for wheels
+        :param offline: Do not access the package index, so all the wheels come from the wheel directory and the
+                        find-links directories
+        :return: The file names of the wheels of the directory
+        """
+        os.makedirs(wheel_directory, exist_ok=True)
+        if len(requirements) > 0:
+            with tempfile.TemporaryDirectory() as workdir:
+                requirements_path = os.path.join(workdir, 'requirements.txt')
+                with open(requirements_path, 'w') as f:
+                    f.write(os.linesep.join(requirements))
+                command = [
+                    sys.executable, '-m', 'pip', 'wheel', '--no-deps', '--disable-pip-version-check',
+                    '--wheel-dir', wheel_directory, '--find-links', wheel_directory,
+                ]
+                for link in find_links:
+                    command.extend(['--find-links', link])
+                if offline:
+                    command.append('--no-index')
+                command.extend(['-r', requirements_path])
+                process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                if process.returncode != 0:
+                    raise ValueError(f'Could not collect the wheels of the requirements:{os.linesep}'
+                                     f'{process.stdout.decode(errors="replace")}')
+        return sorted(name for name in os.listdir(wheel_directory) if name.endswith('.whl'))
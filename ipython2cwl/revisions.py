@@ -0,0 +1,55 @@
+import re
+from typing import Iterable, List, Tuple
+
+import git  # type: ignore
+
+_IGNORED_DIRECTORIES = {'.ipynb_checkpoints'}
+
+
+def resolve_revisions(repo: git.Repo, revisions: Iterable[str]) -> List[Tuple[str, git.Commit]]:
+    """
+    Resolves the revisions to commits. A revision is either a ref, like a tag, a branch or a commit sha, or a range
+    like v1.0..v2.0, which is expanded to its commits from the oldest to the newest.
+    :param repo: The repository
+    :param revisions: The refs and the ranges
+    :return: The name and the commit of each revision, without duplicates. The name of a ref is the ref itself and
+             the name of a commit of a range is its abbreviated sha
+    """
+    resolved: List[Tuple[str, git.Commit]] = []
+    seen = set()
+    for revision in revisions:
+        try:
+            if '..' in revision:
+                commits = [(commit.hexsha[:12], commit) for commit in reversed(list(repo.iter_commits(revision)))]
+            else:
+                commits = [(revision, repo.commit(revision))]
+        except (git.BadName, git.GitCommandError, ValueError) as e:
+            raise ValueError(f'Unknown revision: {revision}') from e
+        for name, commit in commits:
+            if commit.hexsha not in seen:
+                seen.add(commit.hexsha)
+                resolved.append((name, commit))
+    return resolved
+
+
+def revision_directory_name(name: str) -> str:
+    """Returns a directory name for a revision name, which may contain slashes, like origin/main."""
+    return re.sub(r'[^A-Za-z0-9._-]', '_', name).lstrip('.') or 'revision'
+
+
+def notebook_blobs(commit: git.Commit) -> List[Tuple[str, git.Blob]]:
+    """
+    Lists the notebooks of a commit from the object database of the repository, without checking it out.
+    :param commit: The commit
+    :return: The path of each notebook, relative to the repository, and its blob, sorted by the path
+    """
+    blobs: List[Tuple[str, git.Blob]] = []
+    trees = [commit.tree]
+    while len(trees) > 0:
+        tree = trees.pop()
+        trees.extend(subtree for subtree in tree.trees if subtree.name not in _IGNORED_DIRECTORIES)
+        blobs.extend(
+            (str(blob.path), blob) for blob in tree.blobs
+            if blob.mode != git.Blob.link_mode and blob.name.endswith('.ipynb')
+        )
+    return sorted(blobs, key=lambda pair: pair[0])
@@ -0,0 +1,48 @@
+import json
+from typing import Dict, IO
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:  # pragma: no cover - libyaml is not available
+    from yaml import SafeDumper  # type: ignore
+
+FORMATS = ('yaml', 'json')
+
+
+def dump_cwl(document: Dict, stream: IO, cwl_format: str = 'yaml'):
+    """
+    Writes a CWL document. The YAML documents are emitted with libyaml when it is available.
+    :param document: The CWL document
+    :param stream: The text stream to write to
+    :param cwl_format: yaml or json
+    """
+    if cwl_format == 'yaml':
+        yaml.dump(document, stream, Dumper=SafeDumper)
+    elif cwl_format == 'json':
+        json.dump(document, stream, indent=2, sort_keys=True)
+    else:
+        raise ValueError(f'Supported CWL formats: {FORMATS}')
+
+
+def pack_cwl(documents: Dict[str, Dict]) -> Dict:
+    """
+    Packs multiple CWL documents to a single document with a $graph.
+    :param documents: The documents by their ids. The ids must be unique, for example the names of the files the
+                      documents would be stored to
+    :return: The packed document. The processes of the graph are sorted by their ids, which are prefixed with #
+    """
+    versions = {document['cwlVersion'] for document in documents.values()}
+    if len(versions) > 1:
+        raise ValueError(f'Documents of different CWL versions can not be packed: {sorted(versions)}')
+    return {
+        'cwlVersion': versions.pop() if len(versions) > 0 else 'v1.1',
+        '$graph': [
+            {
+                'id': f'#{document_id}',
+                **{key: value for key, value in documents[document_id].items() if key != 'cwlVersion'}
+            }
+            for document_id in sorted(documents)
+        ],
+    }
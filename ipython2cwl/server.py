@@ -0,0 +1,251 @@
+import hashlib
+import http.server
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import nbformat  # type: ignore
+
+from .cwltoolextractor import AnnotatedIPython2CWLToolConverter
+from .metrics import ConversionServiceMetrics
+
+logger = logging.getLogger('ipython2cwl.server')
+
+MAX_NOTEBOOK_BYTES = 64 * 1024 * 1024
+
+_WARM_UP_NOTEBOOK = nbformat.v4.new_notebook(cells=[
+    nbformat.v4.new_code_cell("message: CWLStringInput = 'hello'\nprint(message)"),
+])
+
+
+class LRUCache:
+    """LRUCache keeps the most recently used values up to a maximum number of entries. It is thread-safe."""
+
+    def __init__(self, max_size: int = 256):
+        if max_size < 0:
+            raise ValueError('The size of the cache can not be negative')
+        self.max_size = max_size
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: bytes):
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ConversionService:
+    """
+    ConversionService converts notebooks to CWL tools inside a long-running process, so the converter stack is
+    imported once instead of once for each notebook. The responses are cached by the hash of the notebook and of the
+    conversion options, so a notebook which is posted again is not converted again.
+    """
+
+    def __init__(self, cache_size: int = 256, docker_image_id: str = 'jn2cwl:latest'):
+        """
+        :param cache_size: The maximum number of cached responses. 0 disables the cache
+        :param docker_image_id: The default docker image id of the tools
+        """
+        self.cache = LRUCache(cache_size)
+        self.metrics = ConversionServiceMetrics()
+        self.docker_image_id = docker_image_id
+
+    def warm_up(self):
+        """Converts a small notebook, so the lazy initialization of nbconvert does not delay the first request."""
+        self._convert(nbformat.writes(_WARM_UP_NOTEBOOK).encode(), self.docker_image_id, False)
+
+    def convert(self, notebook: bytes, docker_image_id: Optional[str] = None,
+                slice_outputs: bool = False) -> Tuple[bytes, bool]:
+        """
+        Converts a notebook.
+        :param notebook: The content of the .ipynb file
+        :param docker_image_id: The docker image id of the tool. By default the one of the service
+        :param slice_outputs: Remove the statements which none of the outputs depends on
+        :return: The JSON response, which contains the CWL tool and the generated script, and whether it was cached
+        :raise ValueError: If the notebook is invalid or does not contain any typing annotations
+        """
+        docker_image_id = self.docker_image_id if docker_image_id is None else docker_image_id
+        options = json.dumps([docker_image_id, slice_outputs]).encode()
+        key = hashlib.sha256(options + b'\0' + notebook).hexdigest()
+        response = self.cache.get(key)
+        self.metrics.cache_access(response is not None)
+        if response is not None:
+            return response, True
+        response = self._convert(notebook, docker_image_id, slice_outputs)
+        self.cache.put(key, response)
+        return response, False
+
+    @classmethod
+    def _convert(cls, notebook: bytes, docker_image_id: str, slice_outputs: bool) -> bytes:
+        try:
+            node = nbformat.reads(notebook.decode(), as_version=4)
+        except Exception as e:
+            raise ValueError(f'Invalid notebook: {e}') from e
+        converter = AnnotatedIPython2CWLToolConverter.from_jupyter_notebook_node(node)
+        if len(converter._variables) == 0:
+            raise ValueError('The notebook does not contain any typing annotations')
+        removed = converter.slice() if slice_outputs else []
+        return json.dumps({
+            'tool': converter.cwl_command_line_tool(docker_image_id),
+            'script': converter._wrap_script_to_method(converter._tree, converter._variables),
+            'removed_statements': removed,
+        }).encode()
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    server_version = 'ipython2cwl'
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # the clients of the unix sockets do not have an address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(f'{self.address_string()} - {format % args}')
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json',
+              headers: Optional[Dict] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str):
+        self._send(status, json.dumps({'error': message}).encode())
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        service: ConversionService = self.server.service  # type: ignore
+        if url.path == '/metrics':
+            if parse_qs(url.query).get('format', ['openmetrics'])[0] == 'json':
+                self._send(200, json.dumps(service.metrics.to_json()).encode())
+            else:
+                self._send(200, service.metrics.to_openmetrics().encode(),
+                           'application/openmetrics-text; version=1.0.0; charset=utf-8')
+            status = 200
+        elif url.path == '/health':
+            self._send(200, b'{"status": "ok"}')
+            status = 200
+        else:
+            self._send_error(404, f'Not found: {url.path}')
+            status = 404
+        # the unknown paths are not recorded separately, so the clients can not grow the metrics
+        service.metrics.observe(url.path if status != 404 else 'unknown', status, time.perf_counter() - start)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        service: ConversionService = self.server.service  # type: ignore
+        status = self._convert(service, url.path, parse_qs(url.query))
+        # the unknown paths are not recorded separately, so the clients can not grow the metrics
+        service.metrics.observe(url.path if status != 404 else 'unknown', status, time.perf_counter() - start)
+
+    def _convert(self, service: ConversionService, path: str, query: Dict[str, List[str]]) -> int:
+        if path != '/convert':
+            self._send_error(404, f'Not found: {path}')
+            return 404
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self._send_error(411, 'Content-Length is required')
+            return 411
+        if length < 0:
+            # a negative length would read until the client closes the connection
+            self._send_error(400, 'Content-Length must not be negative')
+            self.close_connection = True
+            return 400
+        if length > MAX_NOTEBOOK_BYTES:
+            self._send_error(413, f'The notebook is larger than {MAX_NOTEBOOK_BYTES} bytes')
+            self.close_connection = True
+            return 413
+        notebook = self.rfile.read(length)
+        try:
+            response, cached = service.convert(
+                notebook,
+                query.get('image', [None])[0],
+                query.get('slice', ['false'])[0].lower() in ('1', 'true', 'yes'),
+            )
+        except ValueError as e:
+            self._send_error(422, str(e))
+            return 422
+        except Exception as e:
+            logger.exception('Failed to convert a notebook')
+            self._send_error(500, f'{type(e).__name__}: {e}')
+            return 500
+        self._send(200, response, headers={'X-Cache': 'hit' if cached else 'miss'})
+        return 200
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(service: ConversionService, host: str = '127.0.0.1', port: int = 8080,
+                  socket_path: Optional[str] = None) -> socketserver.BaseServer:
+    """
+    Creates the HTTP server of the service. The server serves each request at a different thread:
+    POST /convert converts the posted notebook. The query parameters image and slice set the docker image id of the
+    tool and enable the slicing of the script
+    GET /metrics returns the metrics of the service in the OpenMetrics format, or in JSON with ?format=json
+    GET /health returns ok
+    :param service: The conversion service
+    :param host: The address to listen to
+    :param port: The port to listen to. 0 selects a free port
+    :param socket_path: Listen to that unix socket instead of the host and the port
+    :return: The server, which is already bound
+    """
+    server: socketserver.BaseServer
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _RequestHandler)
+    else:
+        server = _HTTPServer((host, port), _RequestHandler)
+    server.service = service  # type: ignore
+    return server
+
+
+def serve(host: str = '127.0.0.1', port: int = 8080, socket_path: Optional[str] = None, cache_size: int = 256,
+          docker_image_id: str = 'jn2cwl:latest') -> int:
+    """Starts the conversion service and serves until it is interrupted."""
+    service = ConversionService(cache_size, docker_image_id)
+    service.warm_up()
+    server = create_server(service, host, port, socket_path)
+    logger.info(f'Serving at {socket_path if socket_path is not None else f"http://{host}:{port}"}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+    return 0
@@ -0,0 +1,121 @@
+import copy
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+from . import default_cache_directory
+
+
+def _distribution_version(name: str) -> Optional[str]:
+    """Returns the version of an installed distribution, or None if it is not installed."""
+    try:
+        from importlib.metadata import version, PackageNotFoundError  # type: ignore
+    except ImportError:
+        # python < 3.8
+        import pkg_resources  # type: ignore
+        try:
+            return pkg_resources.get_distribution(name).version
+        except pkg_resources.DistributionNotFound:
+            return None
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+class CWLValidator:
+    """
+    CWLValidator validates CWL documents against the CWL schema without network access. Loading the schema-salad
+    document graph of the schema takes seconds, so the compiled schema is cached on disk and is loaded only once by
+    each validator, which can validate any number of documents. Building the cache requires cwltool, which ships
+    the schema files, while validating requires only schema-salad.
+    """
+
+    cwl_version = 'v1.1'
+
+    def __init__(self, cache_directory: Optional[Path] = None):
+        """
+        :param cache_directory: The directory of the compiled schema. By default schemas in the cache of ipython2cwl
+        """
+        from schema_salad.ref_resolver import Loader  # type: ignore
+
+        self.cache_directory = default_cache_directory('schemas') if cache_directory is None else cache_directory
+        context, self._names = self._load_schema()
+        self._loader = Loader(context)
+
+    def _cache_path(self) -> Path:
+        """Returns the path of the compiled schema of the installed cwltool and schema-salad. Without cwltool, the
+        most recent compiled schema of the installed schema-salad is used."""
+        schema_salad_version = _distribution_version('schema-salad')
+        cwltool_version = _distribution_version('cwltool')
+        if cwltool_version is not None:
+            return self.cache_directory.joinpath(
+                f'cwl-{self.cwl_version}-{cwltool_version}-{schema_salad_version}.pickle'
+            )
+        cached = sorted(
+            self.cache_directory.glob(f'cwl-{self.cwl_version}-*-{schema_salad_version}.pickle'),
+            key=lambda path: path.stat().st_mtime
+        )
+        if len(cached) == 0:
+            raise ValueError('Compiling the CWL schema requires cwltool: pip install ipython2cwl[validation]')
+        return cached[-1]
+
+    def _load_schema(self):
+        cache_path = self._cache_path()
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            pass
+        from cwltool.process import get_schema  # type: ignore
+
+        loader, names, _, _ = get_schema(self.cwl_version)
+        if not hasattr(names, 'get_name'):
+            raise ValueError(f'Could not load the CWL {self.cwl_version} schema: {names}')
+        compiled = (dict(loader.ctx), names)
+        try:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_directory, prefix='.schema_')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(compiled, f)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            pass
+        return compiled
+
+    def validate(self, document: Dict, name: str = 'tool.cwl') -> None:
+        """
+        Validates a CWL document. The document is not modified.
+        :param document: The CommandLineTool or Workflow
+        :param name: The file name of the document, which is used at the error messages
+        :raise ValueError: If the document is invalid
+        """
+        from schema_salad.exceptions import ValidationException  # type: ignore
+        from schema_salad.schema import validate_doc  # type: ignore
+        from schema_salad.sourceline import cmap  # type: ignore
+
+        if document.get('cwlVersion') != self.cwl_version:
+            raise ValueError(f'{name}: cwlVersion must be {self.cwl_version}, got {document.get("cwlVersion")}')
+        try:
+            resolved, _ = self._loader.resolve_all(
+                cmap(copy.deepcopy(document), fn=name), Path(name).absolute().as_uri()
+            )
+            validate_doc(self._names, resolved, self._loader, strict=True)
+        except ValidationException as e:
+            raise ValueError(str(e)) from e
+
+    def validate_many(self, documents: Dict[str, Dict]) -> Dict[str, str]:
+        """
+        Validates many CWL documents with the same loaded schema.
+        :param documents: The documents by their file name
+        :return: The error message of each invalid document by its file name
+        """
+        errors = {}
+        for name, document in documents.items():
+            try:
+                self.validate(document, name)
+            except ValueError as e:
+                errors[name] = str(e)
+        return errors
@@ -0,0 +1,171 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+_IGNORED_DIRECTORIES = {'.git', '.ipynb_checkpoints'}
+
+
+def _is_notebook(path: str) -> bool:
+    return path.endswith('.ipynb') and not set(path.split(os.sep)) & _IGNORED_DIRECTORIES
+
+
+class PollingWatcher:
+    """PollingWatcher detects the added, modified and deleted notebooks of a directory tree by comparing the
+    modification times and the sizes of the notebooks periodically."""
+
+    def __init__(self, directory: str, interval: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for path, directories, files in os.walk(self.directory):
+            directories[:] = [d for d in directories if d not in _IGNORED_DIRECTORIES]
+            for name in files:
+                if not name.endswith('.ipynb'):
+                    continue
+                file_path = os.path.join(path, name)
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                snapshot[file_path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Waits for changes.
+        :param timeout: The maximum seconds to wait. None waits until there is any change
+        :return: The paths of the changed notebooks, or an empty set if the timeout expired
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._take_snapshot()
+            changed = {
+                path for path in set(snapshot) | set(self._snapshot) if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if len(changed) > 0:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            remaining = self.interval if deadline is None else deadline - time.monotonic()
+            time.sleep(max(0.0, min(self.interval, remaining)))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """InotifyWatcher detects the changed notebooks of a directory tree with the inotify API of linux. The new
+    directories are watched as soon as they are created."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    _MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, directory: str):
+        library = ctypes.util.find_library('c')
+        if library is None:
+            raise OSError('libc was not found')
+        self._libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError('inotify is not supported')
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.directory = directory
+        self._watches: Dict[int, str] = {}
+        self._add_tree(directory)
+
+    def _add_tree(self, directory: str):
+        for path, directories, _ in os.walk(directory):
+            directories[:] = [d for d in directories if d not in _IGNORED_DIRECTORIES]
+            descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self._MASK)
+            if descriptor < 0:
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+            self._watches[descriptor] = path
+
+    def _read_events(self) -> Set[str]:
+        changed: Set[str] = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                descriptor, mask, _, length = self._EVENT.unpack_from(data, offset)
+                offset += self._EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if descriptor not in self._watches:
+                    continue
+                path = os.path.join(self._watches[descriptor], name)
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO) and name not in _IGNORED_DIRECTORIES:
+                        self._add_tree(path)
+                        changed |= {
+                            os.path.join(p, f) for p, _, files in os.walk(path) for f in files
+                            if _is_notebook(os.path.join(p, f))
+                        }
+                elif _is_notebook(path):
+                    changed.add(path)
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Waits for changes.
+        :param timeout: The maximum seconds to wait. None waits until there is any change
+        :return: The paths of the changed notebooks, or an empty set if the timeout expired
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if len(readable) == 0:
+                return set()
+            changed = self._read_events()
+            if len(changed) > 0:
+                return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def create_watcher(directory: str, polling: bool = False, interval: float = 1.0):
+    """Creates an InotifyWatcher if inotify is available, otherwise a PollingWatcher."""
+    if not polling:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory, interval)
+
+
+def debounced_changes(watcher, debounce: float = 1.0) -> Iterator[Set[str]]:
+    """
+    Yields the changed notebooks after each burst of changes. A burst ends when there are not any changes for
+    debounce seconds.
+    :param watcher: The watcher of the directory
+    :param debounce: The seconds without changes which end a burst
+    """
+    while True:
+        changed = watcher.wait()
+        while True:
+            more = watcher.wait(debounce)
+            if len(more) == 0:
+                break
+            changed |= more
+        yield changed
@@ -60,6 +60,7 @@ setup(
     entry_points={
         'console_scripts': [
             'jupyter-repo2cwl=ipython2cwl.repo2cwl:repo2cwl',
+            'jupyter-ipython2cwl=ipython2cwl.cli:ipython2cwl',
         ],
     },
     install_requires=[
@@ -71,6 +72,9 @@ setup(
         'nbconvert>=6.4.4',
         'ipython>=7.15.0'
     ],
+    extras_require={
+        'validation': ['cwltool>=3.0.20200706173533'],
+    },
     test_suite='tests',
     url='https://ipython2cwl.readthedocs.io/'
 )
@@ -0,0 +1,44 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import nbconvert  # type: ignore
+
+from benchmarks.suite import main
+from benchmarks.synthetic import synthetic_notebook, synthetic_repo
+from ipython2cwl.cwltoolextractor import AnnotatedIPython2CWLToolConverter
+from ipython2cwl.repo2cwl import _get_notebook_paths_from_dir
+
+
+class TestBenchmarks(TestCase):
+
+    def test_synthetic_notebook(self):
+        notebook = synthetic_notebook(20, 4, output_bytes=100)
+        self.assertEqual(20, len(notebook.cells))
+        self.assertTrue(all(len(cell.outputs) == 1 for cell in notebook.cells))
+        converter = AnnotatedIPython2CWLToolConverter(nbconvert.PythonExporter().from_notebook_node(notebook)[0])
+        self.assertListEqual(
+            [('value_0', True), ('result_5', False), ('value_10', True), ('result_15', False)],
+            [(v.name, v.is_input) for v in converter._variables]
+        )
+        self.assertRaises(ValueError, synthetic_notebook, 1, 2)
+
+        repo = tempfile.mkdtemp()
+        synthetic_repo(repo, 30)
+        self.assertEqual(30, len(_get_notebook_paths_from_dir(repo)))
+
+    def test_suite(self):
+        output = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+        self.assertEqual(0, main([
+            '--cells', '10', '--annotations', '2', '--output-bytes', '0', '--repo-notebooks', '5', '--repeat', '1',
+            '--benchmark', 'wrap_script_to_method', '--benchmark', 'notebook_discovery', '--output', output,
+        ]))
+        with open(output) as f:
+            results = json.load(f)
+        self.assertListEqual(
+            ['wrap_script_to_method', 'notebook_discovery'],
+            [result['benchmark'] for result in results['results']]
+        )
+        self.assertDictEqual({'notebooks': 5}, results['results'][1]['parameters'])
+        self.assertGreater(results['results'][0]['median_seconds'], 0)
@@ -0,0 +1,90 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import nbformat
+
+from ipython2cwl.build_context import DEFAULT_RULES, context_size, dockerignore_rules, strip_notebook_outputs, \
+    unused_paths, write_dockerignore
+
+
+class TestBuildContext(TestCase):
+    maxDiff = None
+
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+        files = {
+            'requirements.txt': 'pandas\n',
+            'utils.py': 'x = 1\n',
+            'README.md': 'readme\n',
+            os.path.join('data', 'params.json'): '{}',
+            os.path.join('data', 'raw.bin'): 'x' * 4096,
+            os.path.join('docs', 'images', 'plot.png'): 'x' * 1024,
+            os.path.join('.git', 'HEAD'): 'ref: refs/heads/master\n',
+            os.path.join('cwl', 'bin', 'analysis'): "with open('/app/data/params.json') as f:\n    print(f.read())\n",
+        }
+        for name, content in files.items():
+            os.makedirs(os.path.join(self.repo, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.repo, name), 'w') as f:
+                f.write(content)
+        notebook = nbformat.v4.new_notebook()
+        cell = nbformat.v4.new_code_cell(source='print(1)', execution_count=1)
+        cell.outputs.append(nbformat.v4.new_output('stream', text='1\n'))
+        notebook.cells.append(cell)
+        self.notebook_path = os.path.join(self.repo, 'analysis.ipynb')
+        with open(self.notebook_path, 'w') as f:
+            nbformat.write(notebook, f)
+        self.scripts = [os.path.join(self.repo, 'cwl', 'bin', 'analysis')]
+
+    def test_strip_notebook_outputs(self):
+        self.assertTrue(strip_notebook_outputs(self.notebook_path))
+        with open(self.notebook_path) as f:
+            cell = nbformat.read(f, as_version=4).cells[0]
+        self.assertListEqual([], cell.outputs)
+        self.assertIsNone(cell.execution_count)
+        self.assertEqual('print(1)', cell.source)
+        self.assertFalse(strip_notebook_outputs(self.notebook_path))
+
+    def test_unused_paths(self):
+        self.assertListEqual(
+            ['README.md', os.path.join('data', 'raw.bin'), 'docs'],
+            unused_paths(self.repo, self.scripts)
+        )
+        os.makedirs(os.path.join(self.repo, 'binder'))
+        with open(os.path.join(self.repo, 'binder', 'apt.txt'), 'w') as f:
+            f.write('curl\n')
+        with open(os.path.join(self.repo, 'binder', 'notes.txt'), 'w') as f:
+            f.write('notes\n')
+        self.assertNotIn(os.path.join('binder', 'notes.txt'), unused_paths(self.repo, self.scripts))
+
+    def test_unused_paths_of_modules(self):
+        os.makedirs(os.path.join(self.repo, 'lib', 'config'))
+        with open(os.path.join(self.repo, 'lib', 'loader.py'), 'w') as f:
+            f.write("import os\nSETTINGS = os.path.join(os.path.dirname(__file__), 'config/settings.yaml')\n"
+                    "RAW = 'data/raw.bin'\n")
+        with open(os.path.join(self.repo, 'lib', 'config', 'settings.yaml'), 'w') as f:
+            f.write('a: 1\n')
+        with open(os.path.join(self.repo, 'lib', 'config', 'unused.yaml'), 'w') as f:
+            f.write('a: 1\n')
+        self.assertListEqual(
+            ['README.md', 'docs', os.path.join('lib', 'config', 'unused.yaml')],
+            unused_paths(self.repo, self.scripts)
+        )
+
+    def test_dockerignore_rules(self):
+        with open(os.path.join(self.repo, '.dockerignore'), 'w') as f:
+            f.write('# comment\n\n*.md\n')
+        rules = dockerignore_rules(self.repo, self.scripts, extra_rules=['!docs'])
+        self.assertListEqual(
+            [*DEFAULT_RULES, '.dockerignore', 'README.md', 'data/raw.bin', 'docs', '*.md', '!docs'], rules
+        )
+        self.assertListEqual([*DEFAULT_RULES, '*.md'], dockerignore_rules(self.repo, self.scripts, prune=False))
+
+        before = context_size(self.repo, [])
+        after = context_size(self.repo, dockerignore_rules(self.repo, self.scripts))
+        self.assertEqual(4096 + 1024 + len('readme\n') + len('ref: refs/heads/master\n'), before - after)
+
+        path = write_dockerignore(self.repo, rules)
+        self.assertEqual(os.path.join(self.repo, '.dockerignore'), path)
+        with open(path) as f:
+            self.assertListEqual(rules, [line for line in f.read().splitlines() if not line.startswith('#')])
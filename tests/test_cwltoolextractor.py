@@ -1,13 +1,23 @@
+import json
+import math
 import os
+import random
+import shutil
+import subprocess
+import sys
 import tarfile
 import tempfile
+import time
+import zipfile
 from pathlib import Path
-from unittest import TestCase
+from unittest import TestCase, mock
 
 import nbformat
+import yaml
 
 from ipython2cwl.cwltoolextractor import AnnotatedIPython2CWLToolConverter
-from ipython2cwl.iotypes import CWLStringInput, CWLFilePathOutput
+from ipython2cwl.iotypes import CWLStringInput, CWLFilePathOutput, CWLParallelMap
+from ipython2cwl.requirements_manager import RequirementsManager
 
 
 class TestCWLTool(TestCase):
@@ -91,6 +101,60 @@ class TestCWLTool(TestCase):
             set(os.listdir(extracted_dir))
         )
 
+    def test_AnnotatedIPython2CWLToolConverter_compile_wheelhouse(self):
+        find_links = tempfile.mkdtemp()
+        with zipfile.ZipFile(os.path.join(find_links, 'tinypkg-1.0-py3-none-any.whl'), 'w') as wheel:
+            wheel.writestr('tinypkg/__init__.py', '')
+            wheel.writestr('tinypkg-1.0.dist-info/METADATA', 'Metadata-Version: 2.1\nName: tinypkg\nVersion: 1.0\n')
+            wheel.writestr('tinypkg-1.0.dist-info/WHEEL',
+                           'Wheel-Version: 1.0\nRoot-Is-Purelib: true\nTag: py3-none-any\n')
+            wheel.writestr('tinypkg-1.0.dist-info/RECORD', '')
+        converter = AnnotatedIPython2CWLToolConverter("name: CWLStringInput = 'a'\nprint(name)")
+        compiled_tar_file = os.path.join(tempfile.mkdtemp(), 'file.tar')
+        with mock.patch.object(RequirementsManager, 'get_all', return_value=['tinypkg==1.0']), \
+                mock.patch.dict(os.environ, {'PIP_FIND_LINKS': find_links}):
+            converter.compile(Path(compiled_tar_file), wheelhouse=True, offline=True)
+            with mock.patch.object(RequirementsManager, 'build_wheelhouse',
+                                   return_value=['numpy-1.0-cp38-cp38-macosx_10_9_x86_64.whl']):
+                with self.assertRaisesRegex(ValueError, 'can not be installed in the linux image'):
+                    converter.compile(Path(compiled_tar_file), wheelhouse=True)
+        with tarfile.open(compiled_tar_file, 'r') as tar:
+            self.assertIn('wheels/tinypkg-1.0-py3-none-any.whl', tar.getnames())
+            dockerfile = tar.extractfile('Dockerfile').read().decode()
+        final_stage = dockerfile.split('FROM ')[-1]
+        self.assertNotIn('COPY . ', final_stage)
+        self.assertIn('--no-index', dockerfile)
+        AnnotatedIPython2CWLToolConverter._check_wheel_platforms([
+            'tinypkg-1.0-py3-none-any.whl',
+            'numpy-1.0-cp38-cp38-manylinux_2_17_x86_64.manylinux2014_x86_64.whl',
+        ])
+
+    def test_AnnotatedIPython2CWLToolConverter_compile_many(self):
+        converters = {
+            name: AnnotatedIPython2CWLToolConverter(os.linesep.join([
+                "input_filename: CWLFilePathInput = 'data.csv'",
+                "print(input_filename)"
+            ]))
+            for name in ['first', 'second']
+        }
+        compiled_tar_file = os.path.join(tempfile.mkdtemp(), 'file.tar')
+        extracted_dir = tempfile.mkdtemp()
+        AnnotatedIPython2CWLToolConverter.compile_many(converters, Path(compiled_tar_file), docker_image_id='shared')
+        with tarfile.open(compiled_tar_file, 'r') as tar:
+            tar.extractall(path=extracted_dir)
+        self.assertSetEqual(
+            {'first', 'first.cwl', 'second', 'second.cwl', 'Dockerfile', 'requirements.txt', 'setup.py'},
+            set(os.listdir(extracted_dir))
+        )
+        with open(os.path.join(extracted_dir, 'second.cwl')) as f:
+            tool = yaml.safe_load(f)
+        self.assertEqual('second', tool['baseCommand'])
+        self.assertEqual('shared', tool['hints']['DockerRequirement']['dockerImageId'])
+        with open(os.path.join(extracted_dir, 'setup.py')) as f:
+            self.assertIn("scripts=['first', 'second']", f.read())
+        with self.assertRaises(ValueError):
+            AnnotatedIPython2CWLToolConverter.compile_many({'setup.py': converters['first']}, Path(compiled_tar_file))
+
     def test_AnnotatedIPython2CWLToolConverter_optional_arguments(self):
         annotated_python_script = os.linesep.join([
             "import csv",
@@ -435,7 +499,8 @@ class TestCWLTool(TestCase):
         script = os.linesep.join([
             'import pandas',
             'from ipython2cwl.iotypes import CWLDumpable',
-            'd: CWLDumpable.dump(d.to_csv, "dumpable.csv", sep="\\t", index=False) = pandas.DataFrame([[1,2,3], [4,5,6], [7,8,9]])'
+            'd: CWLDumpable.dump(d.to_csv, "dumpable.csv", sep="\\t", index=False) = '
+            'pandas.DataFrame([[1,2,3], [4,5,6], [7,8,9]])'
         ])
         converter = AnnotatedIPython2CWLToolConverter(script)
         generated_script = AnnotatedIPython2CWLToolConverter._wrap_script_to_method(
@@ -557,4 +622,646 @@ class TestCWLTool(TestCase):
                 },
             },
             tool
-        )
\ No newline at end of file
+        )
+
+    def test_AnnotatedIPython2CWLToolConverter_CWLMmapFileInput(self):
+        code = os.linesep.join([
+            "data: 'CWLMmapFileInput' = 'data.bin'",
+            "message: CWLDumpableFile = bytes(data[6:11]).decode()",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        tool = converter.cwl_command_line_tool()
+        self.assertDictEqual(
+            {
+                'data': {
+                    'type': 'File',
+                    'inputBinding': {
+                        'prefix': '--data'
+                    }
+                }
+            },
+            tool['inputs']
+        )
+        workdir = tempfile.mkdtemp()
+        script_path = os.path.join(workdir, 'notebookTool')
+        with open(script_path, 'w') as f:
+            f.write(converter._wrap_script_to_method(converter._tree, converter._variables))
+        with open(os.path.join(workdir, 'data.bin'), 'wb') as f:
+            f.write(b'hello world')
+        subprocess.check_call([sys.executable, script_path, '--data', 'data.bin'], cwd=workdir)
+        with open(os.path.join(workdir, 'message')) as f:
+            self.assertEqual('world', f.read())
+        shutil.rmtree(workdir)
+
+    def test_AnnotatedIPython2CWLToolConverter_CWLDirectoryInput(self):
+        code = os.linesep.join([
+            "import os",
+            "images: CWLDirectoryInput = 'images'",
+            "names = sorted(os.path.basename(path) for path in images)",
+            "files = sorted(os.path.relpath(path, images) for path in images.walk())",
+            "result: CWLDumpableFile = f'{names} {files}'",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        tool = converter.cwl_command_line_tool()
+        self.assertDictEqual({'images': {'type': 'Directory', 'inputBinding': {'prefix': '--images'}}}, tool['inputs'])
+        self.assertDictEqual({'LoadListingRequirement': {'loadListing': 'no_listing'}}, tool['requirements'])
+        workdir = tempfile.mkdtemp()
+        script_path = os.path.join(workdir, 'notebookTool')
+        with open(script_path, 'w') as f:
+            f.write(converter._wrap_script_to_method(converter._tree, converter._variables))
+        os.makedirs(os.path.join(workdir, 'data', 'nested'))
+        for name in ['a.png', os.path.join('nested', 'b.png')]:
+            with open(os.path.join(workdir, 'data', name), 'w') as f:
+                f.write(name)
+        subprocess.check_call([sys.executable, script_path, '--images', 'data'], cwd=workdir)
+        with open(os.path.join(workdir, 'result')) as f:
+            self.assertEqual(f"['a.png', 'nested'] ['a.png', '{os.path.join('nested', 'b.png')}']", f.read())
+        shutil.rmtree(workdir)
+
+    def test_AnnotatedIPython2CWLToolConverter_secondary_files(self):
+        code = os.linesep.join([
+            "alignments: CWLFilePathInput.secondary('.bai') = 'sample.bam'",
+            "tables: List[CWLMmapFileInput.secondary('^.idx', '.meta')] = ['a.h5']",
+            "result: CWLDumpableFile = str(alignments)",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        tool = converter.cwl_command_line_tool()
+        self.assertDictEqual(
+            {
+                'alignments': {
+                    'type': 'File',
+                    'inputBinding': {'prefix': '--alignments'},
+                    'secondaryFiles': ['.bai'],
+                },
+                'tables': {
+                    'type': 'File[]',
+                    'inputBinding': {'prefix': '--tables'},
+                    'secondaryFiles': ['^.idx', '.meta'],
+                },
+            },
+            tool['inputs']
+        )
+        script = converter._wrap_script_to_method(converter._tree, converter._variables)
+        self.assertNotIn('secondary', script)
+        self.assertDictEqual(
+            {'type': 'File[]', 'secondaryFiles': ['^.idx', '.meta']},
+            converter.cwl_scatter_workflow(['tables'])['inputs']['tables']
+        )
+        string_annotation = AnnotatedIPython2CWLToolConverter(
+            "bam: 'CWLFilePathInput.secondary(\".bai\")' = 'a.bam'"
+        )
+        self.assertListEqual(
+            [('bam', 'File', ['.bai'])],
+            [(v.name, v.cwl_typeof, v.secondary_files) for v in string_annotation._variables]
+        )
+        with self.assertRaisesRegex(ValueError, 'Only the file inputs can have secondary files: images'):
+            AnnotatedIPython2CWLToolConverter("images: CWLDirectoryInput.secondary('.idx') = 'images'")
+        with self.assertRaisesRegex(ValueError, 'Only the file inputs can have secondary files: n'):
+            AnnotatedIPython2CWLToolConverter("n: CWLIntInput.secondary('.bai') = 1")
+        with self.assertRaisesRegex(ValueError, 'must be string literals'):
+            AnnotatedIPython2CWLToolConverter("bam: CWLFilePathInput.secondary(suffix) = 'a.bam'")
+
+    def test_AnnotatedIPython2CWLToolConverter_directory_and_glob_outputs(self):
+        code = os.linesep.join([
+            "import os",
+            "numbers: List[CWLIntInput] = [1, 2]",
+            "os.makedirs('tiles', exist_ok=True)",
+            "for n in numbers:",
+            "\twith open(f'tiles/{n}.png', 'w') as f:",
+            "\t\tf.write(str(n))",
+            "tiles: CWLOutputDirectory = 'tiles'",
+            "pngs: CWLGlobOutput = 'tiles/*.png'",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        self.assertDictEqual(
+            {
+                'tiles': {'type': 'Directory', 'outputBinding': {'glob': 'tiles', 'loadListing': 'no_listing'}},
+                'pngs': {'type': 'File[]', 'outputBinding': {'glob': 'tiles/*.png'}},
+            },
+            converter.cwl_command_line_tool()['outputs']
+        )
+        self.assertDictEqual(
+            {
+                'tiles': {
+                    'type': 'Directory[]',
+                    'outputBinding': {'glob': 'batch_*/tiles', 'loadListing': 'no_listing'}
+                },
+                'pngs': {'type': 'File[]', 'outputBinding': {'glob': 'batch_*/tiles/*.png'}},
+            },
+            converter.cwl_batch_command_line_tool()['outputs']
+        )
+        self.assertDictEqual(
+            {
+                'tiles': {'type': 'Directory[]', 'outputSource': 'notebookTool/tiles'},
+                'pngs': {
+                    'type': {'type': 'array', 'items': {'type': 'array', 'items': 'File'}},
+                    'outputSource': 'notebookTool/pngs'
+                },
+            },
+            converter.cwl_scatter_workflow(['numbers'])['outputs']
+        )
+        script = converter._wrap_script_to_method(converter._tree, converter._variables)
+        self.assertNotIn('CWLOutputDirectory', script)
+        self.assertNotIn('CWLGlobOutput', script)
+
+    def test_AnnotatedIPython2CWLToolConverter_cwl_scatter_workflow(self):
+        code = os.linesep.join([
+            "datasets: List[CWLFilePathInput] = ['data1.csv', 'data2.csv']",
+            "messages: List[CWLStringInput] = ['hello', 'world']",
+            "result: CWLFilePathOutput = 'result.txt'",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        workflow = converter.cwl_scatter_workflow(['datasets'])
+        self.assertDictEqual(
+            {
+                'cwlVersion': 'v1.1',
+                'class': 'Workflow',
+                'requirements': {
+                    'ScatterFeatureRequirement': {}
+                },
+                'inputs': {
+                    'datasets': {'type': 'File[]'},
+                    'messages': {'type': 'string[]'},
+                },
+                'outputs': {
+                    'result': {
+                        'type': 'File[]',
+                        'outputSource': 'notebookTool/result'
+                    }
+                },
+                'steps': {
+                    'notebookTool': {
+                        'run': {
+                            **converter.cwl_command_line_tool(),
+                            'inputs': {
+                                'datasets': {
+                                    'type': 'File',
+                                    'inputBinding': {
+                                        'prefix': '--datasets'
+                                    }
+                                },
+                                'messages': {
+                                    'type': 'string[]',
+                                    'inputBinding': {
+                                        'prefix': '--messages'
+                                    }
+                                },
+                            },
+                        },
+                        'in': {'datasets': 'datasets', 'messages': 'messages'},
+                        'out': ['result'],
+                        'scatter': ['datasets'],
+                    }
+                },
+            },
+            workflow
+        )
+        workflow = converter.cwl_scatter_workflow(['datasets', 'messages'])
+        self.assertEqual('dotproduct', workflow['steps']['notebookTool']['scatterMethod'])
+        self.assertEqual('string', workflow['steps']['notebookTool']['run']['inputs']['messages']['type'])
+        with self.assertRaises(ValueError):
+            converter.cwl_scatter_workflow([])
+        with self.assertRaises(ValueError):
+            AnnotatedIPython2CWLToolConverter(
+                "dataset: CWLFilePathInput = 'data.csv'"
+            ).cwl_scatter_workflow(['dataset'])
+
+    def test_AnnotatedIPython2CWLToolConverter_batch_manifest(self):
+        code = os.linesep.join([
+            "dataset: CWLFilePathInput = 'data.txt'",
+            "numbers: List[CWLIntInput] = [1, 2]",
+            "flag: Optional[CWLBooleanInput] = None",
+            "with open(dataset) as f:",
+            "\tdata = f.read()",
+            "result: CWLDumpableFile = f'{data} {sum(numbers)} {flag}'",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        workdir = tempfile.mkdtemp()
+        script_path = os.path.join(workdir, 'notebookTool')
+        with open(script_path, 'w') as f:
+            f.write(converter._wrap_script_to_method(converter._tree, converter._variables))
+        os.makedirs(os.path.join(workdir, 'inputs'))
+        with open(os.path.join(workdir, 'inputs', 'data.txt'), 'w') as f:
+            f.write('data')
+        with open(os.path.join(workdir, 'inputs', 'manifest.jsonl'), 'w') as f:
+            f.write(os.linesep.join([
+                '{"dataset": "data.txt", "numbers": [1, 2, 3], "flag": true}',
+                '',
+                '{"dataset": "data.txt", "numbers": [4]}',
+            ]))
+        subprocess.check_call(
+            [sys.executable, script_path, '--batch-manifest', os.path.join('inputs', 'manifest.jsonl')],
+            cwd=workdir
+        )
+        with open(os.path.join(workdir, 'batch_000000', 'result')) as f:
+            self.assertEqual('data 6 True', f.read())
+        with open(os.path.join(workdir, 'batch_000001', 'result')) as f:
+            self.assertEqual('data 4 None', f.read())
+        shutil.rmtree(workdir)
+
+        self.assertDictEqual(
+            {
+                'cwlVersion': "v1.1",
+                'class': 'CommandLineTool',
+                'baseCommand': 'notebookTool',
+                'arguments': ['--'],
+                'hints': {
+                    'DockerRequirement': {'dockerImageId': 'jn2cwl:latest'}
+                },
+                'requirements': {
+                    'InitialWorkDirRequirement': {
+                        'listing': ['$(inputs.batch_manifest)', '$(inputs.batch_files)']
+                    }
+                },
+                'inputs': {
+                    'batch_manifest': {
+                        'type': 'File',
+                        'inputBinding': {
+                            'prefix': '--batch-manifest',
+                            'valueFrom': '$(self.basename)'
+                        }
+                    },
+                    'batch_files': {
+                        'type': {'type': 'array', 'items': ['File', 'Directory']},
+                        'default': []
+                    }
+                },
+                'outputs': {
+                    'result': {
+                        'type': 'File[]',
+                        'outputBinding': {
+                            'glob': 'batch_*/result'
+                        }
+                    }
+                },
+            },
+            converter.cwl_batch_command_line_tool()
+        )
+
+    def test_AnnotatedIPython2CWLToolConverter_argfile(self):
+        code = os.linesep.join([
+            "datasets: List[CWLFilePathInput] = ['data.txt']",
+            "numbers: List[CWLIntInput] = [1, 2]",
+            "message: CWLStringInput = 'sum'",
+            "import json",
+            "data = [open(dataset).read() for dataset in datasets]",
+            "assert isinstance(numbers, list) and json.dumps(numbers[:2]) == '[0, 1]' or numbers == [1, 2]",
+            "result: CWLDumpableFile = f'{data} {message} {sum([0] + numbers)} {len(numbers)}'",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        workdir = tempfile.mkdtemp()
+        script_path = os.path.join(workdir, 'notebookTool')
+        with open(script_path, 'w') as f:
+            f.write(converter._wrap_script_to_method(converter._tree, converter._variables))
+        for name in ['a.txt', 'b.txt']:
+            with open(os.path.join(workdir, name), 'w') as f:
+                f.write(name[0])
+        with open(os.path.join(workdir, 'datasets.argfile.json'), 'w') as f:
+            json.dump(['a.txt', 'b.txt'], f)
+        with open(os.path.join(workdir, 'numbers.argfile'), 'w') as f:
+            f.write(os.linesep.join(str(i) for i in range(10000)))
+        subprocess.check_call([
+            sys.executable, script_path, '--message', 'sum', '--datasets-argfile', 'datasets.argfile.json',
+            '--numbers-argfile', 'numbers.argfile'
+        ], cwd=workdir)
+        with open(os.path.join(workdir, 'result')) as f:
+            self.assertEqual("['a', 'b'] sum 49995000 10000", f.read())
+        subprocess.check_call([
+            sys.executable, script_path, '--message', 'sum', '--datasets', 'a.txt', '--numbers', '1', '2'
+        ], cwd=workdir)
+        with open(os.path.join(workdir, 'result')) as f:
+            self.assertEqual("['a'] sum 3 2", f.read())
+        failed = subprocess.run(
+            [sys.executable, script_path, '--message', 'sum', '--datasets', 'a.txt', '--numbers', '1',
+             '--numbers-argfile', 'numbers.argfile'], cwd=workdir, stderr=subprocess.DEVNULL
+        )
+        self.assertNotEqual(0, failed.returncode)
+        shutil.rmtree(workdir)
+
+        tool = converter.cwl_argfile_command_line_tool()
+        self.assertDictEqual({'type': 'File[]'}, tool['inputs']['datasets'])
+        self.assertDictEqual({'type': 'int[]'}, tool['inputs']['numbers'])
+        self.assertDictEqual(converter.cwl_command_line_tool()['inputs']['message'], tool['inputs']['message'])
+        self.assertListEqual([
+            '--',
+            {'position': 1, 'prefix': '--datasets-argfile', 'valueFrom': 'datasets.argfile.json'},
+            {'position': 1, 'prefix': '--numbers-argfile', 'valueFrom': 'numbers.argfile.json'},
+        ], tool['arguments'])
+        self.assertDictEqual({
+            'InlineJavascriptRequirement': {},
+            'InitialWorkDirRequirement': {'listing': [
+                {
+                    'entryname': 'datasets.argfile.json',
+                    'entry': '$(JSON.stringify(inputs.datasets.map(function(f) { return f.path; })))'
+                },
+                {'entryname': 'numbers.argfile.json', 'entry': '$(JSON.stringify(inputs.numbers))'},
+            ]},
+        }, tool['requirements'])
+
+    def test_AnnotatedIPython2CWLToolConverter_warm_start(self):
+        code = os.linesep.join([
+            "import os",
+            "import json",
+            "message: CWLStringInput = 'hello'",
+            "print(message)",
+            "parent_pid: CWLDumpableFile = str(os.getppid())",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        self.assertNotIn('def warm_server', converter._wrap_script_to_method(converter._tree, converter._variables))
+        script = converter._wrap_script_to_method(converter._tree, converter._variables, warm_start=True)
+        self.assertIn("warm_imports = ['os', 'json']", script)
+        other = AnnotatedIPython2CWLToolConverter("other: CWLStringInput = 'hello'\nprint('other', other)")
+        workdir = tempfile.mkdtemp()
+        script_path = os.path.join(workdir, 'notebookTool')
+        other_script_path = os.path.join(workdir, 'otherTool')
+        socket_path = os.path.join(workdir, 'warm.sock')
+        with open(script_path, 'w') as f:
+            f.write(script)
+        with open(other_script_path, 'w') as f:
+            f.write(other._wrap_script_to_method(other._tree, other._variables, warm_start=True))
+
+        # without a warm server the tool starts cold
+        env = {**os.environ, 'IPYTHON2CWL_WARM_SOCKET': socket_path}
+        output = subprocess.check_output([sys.executable, script_path, '--message', 'cold'], cwd=workdir, env=env)
+        self.assertEqual('cold', output.decode().strip())
+
+        server = subprocess.Popen([sys.executable, script_path, '--warm-server', socket_path], cwd=workdir)
+        try:
+            for _ in range(100):
+                if os.path.exists(socket_path):
+                    break
+                time.sleep(0.1)
+            output = subprocess.check_output([sys.executable, script_path, '--message', 'warm'], cwd=workdir, env=env)
+            self.assertEqual('warm', output.decode().strip())
+            with open(os.path.join(workdir, 'parent_pid')) as f:
+                self.assertEqual(str(server.pid), f.read())
+            # the server refuses the clients of other tools, which start cold
+            other_run = subprocess.run(
+                [sys.executable, other_script_path, '--other', 'cold'], cwd=workdir, env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+            )
+            self.assertEqual('other cold', other_run.stdout.decode().strip())
+            self.assertIn('belongs to another tool', other_run.stderr.decode())
+            failed = subprocess.run([sys.executable, script_path], cwd=workdir, env=env, stderr=subprocess.DEVNULL)
+            self.assertEqual(2, failed.returncode)
+        finally:
+            server.terminate()
+            server.wait()
+        self.assertFalse(os.path.exists(socket_path))
+        shutil.rmtree(workdir)
+
+    def test_AnnotatedIPython2CWLToolConverter_only_outputs(self):
+        code = os.linesep.join([
+            "numbers: List[CWLIntInput] = [1, 2]",
+            "print(numbers)",
+            "total: CWLDumpableFile = str(sum(numbers))",
+            "maximum: CWLDumpableFile = str(max(numbers))",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        workdir = tempfile.mkdtemp()
+        script_path = os.path.join(workdir, 'notebookTool')
+        with open(script_path, 'w') as f:
+            f.write(converter._wrap_script_to_method(converter._tree, converter._variables))
+        subprocess.check_call(
+            [sys.executable, script_path, '--numbers', '1', '5', '--only-outputs', 'maximum'], cwd=workdir
+        )
+        self.assertListEqual(['maximum', 'notebookTool'], sorted(os.listdir(workdir)))
+        with open(os.path.join(workdir, 'maximum')) as f:
+            self.assertEqual('5', f.read())
+        subprocess.check_call([sys.executable, script_path, '--numbers', '1', '5'], cwd=workdir)
+        self.assertListEqual(['maximum', 'notebookTool', 'total'], sorted(os.listdir(workdir)))
+        shutil.rmtree(workdir)
+
+        self.assertListEqual(['line 2: print(numbers)'], converter.slice())
+        self.assertNotIn('print(numbers)', converter._wrap_script_to_method(converter._tree, converter._variables))
+
+    def test_AnnotatedIPython2CWLToolConverter_stages(self):
+        code = os.linesep.join([
+            "import json",
+            "n: CWLIntInput = 3",
+            "def square(x):",
+            "    return x * x",
+            "prepare: CWLStage",
+            "numbers = [square(i) for i in range(n)]",
+            "offset = 10",
+            "model_a: CWLStage",
+            "result_a: CWLDumpableFile = json.dumps(numbers)",
+            "model_b: CWLStage",
+            "result_b: CWLDumpableFile = str(sum(numbers) + offset)",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        workflow = converter.cwl_stages_workflow()
+        self.assertEqual('Workflow', workflow['class'])
+        self.assertDictEqual({'n': {'type': 'int'}}, workflow['inputs'])
+        self.assertDictEqual({
+            'result_a': {'type': 'File', 'outputSource': 'model_a/result_a'},
+            'result_b': {'type': 'File', 'outputSource': 'model_b/result_b'},
+        }, workflow['outputs'])
+        self.assertListEqual(['prepare', 'model_a', 'model_b'], list(workflow['steps']))
+        self.assertDictEqual({'n': 'n'}, workflow['steps']['prepare']['in'])
+        self.assertListEqual(['numbers_pickle', 'offset_pickle'], workflow['steps']['prepare']['out'])
+        self.assertDictEqual({'numbers_pickle': 'prepare/numbers_pickle'}, workflow['steps']['model_a']['in'])
+        self.assertDictEqual(
+            {'numbers_pickle': 'prepare/numbers_pickle', 'offset_pickle': 'prepare/offset_pickle'},
+            workflow['steps']['model_b']['in']
+        )
+        self.assertEqual('notebookTool_model_a', workflow['steps']['model_a']['run']['baseCommand'])
+        self.assertDictEqual(
+            {'numbers_pickle': {'type': 'File', 'inputBinding': {'prefix': '--numbers_pickle'}}},
+            workflow['steps']['model_a']['run']['inputs']
+        )
+
+        workdir = tempfile.mkdtemp()
+        for stage_name, stage_script in converter.stage_scripts().items():
+            with open(os.path.join(workdir, stage_name), 'w') as f:
+                f.write(stage_script)
+        subprocess.check_call([sys.executable, 'prepare', '--n', '4'], cwd=workdir)
+        subprocess.check_call([sys.executable, 'model_a', '--numbers_pickle', 'numbers.pickle'], cwd=workdir)
+        subprocess.check_call(
+            [sys.executable, 'model_b', '--numbers_pickle', 'numbers.pickle', '--offset_pickle', 'offset.pickle'],
+            cwd=workdir
+        )
+        with open(os.path.join(workdir, 'result_a')) as f:
+            self.assertListEqual([0, 1, 4, 9], json.load(f))
+        with open(os.path.join(workdir, 'result_b')) as f:
+            self.assertEqual('24', f.read())
+        shutil.rmtree(workdir)
+
+        self.assertRaises(ValueError, AnnotatedIPython2CWLToolConverter("x: CWLIntInput = 1").cwl_stages_workflow)
+        self.assertRaises(
+            ValueError,
+            AnnotatedIPython2CWLToolConverter("a: CWLStage\nx = 1\na: CWLStage\ny = 2").cwl_stages_workflow
+        )
+
+    def test_AnnotatedIPython2CWLToolConverter_parallel_map(self):
+        code = os.linesep.join([
+            "import json",
+            "import os",
+            "from ipython2cwl.iotypes import CWLParallelMap",
+            "numbers: List[CWLIntInput] = [1, 2]",
+            "offset = 100",
+            "@CWLParallelMap",
+            "def work(x):",
+            "    if x < 0:",
+            "        raise ValueError(f'negative: {x}')",
+            "    return x + offset, os.getpid()",
+            "squares = [work(x) for x in numbers]",
+            "doubles = list(map(work, numbers))",
+            "odd = [work(x) for x in numbers if x % 2]",
+            "result: CWLDumpableFile = json.dumps({'values': [v for v, _ in squares + doubles + odd], "
+            "'in_parent': os.getpid() in {p for _, p in squares}})",
+        ])
+        self.assertIs(CWLParallelMap(abs), abs)
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        script = converter._wrap_script_to_method(converter._tree, converter._variables)
+        self.assertNotIn('@CWLParallelMap', script)
+        self.assertIn('squares = parallel_map(work, numbers)', script)
+        self.assertIn('doubles = list(parallel_map(work, numbers))', script)
+        self.assertIn('odd = [work(x) for x in numbers if x % 2]', script)
+        sequential = AnnotatedIPython2CWLToolConverter(
+            "numbers: List[CWLIntInput] = [1]\nprint(list(map(str, numbers)))"
+        )
+        self.assertNotIn(
+            'def parallel_map', sequential._wrap_script_to_method(sequential._tree, sequential._variables)
+        )
+        workdir = tempfile.mkdtemp()
+        script_path = os.path.join(workdir, 'notebookTool')
+        with open(script_path, 'w') as f:
+            f.write(script)
+        numbers = [str(i) for i in range(1, 9)]
+        subprocess.check_call([sys.executable, script_path, '--numbers', *numbers], cwd=workdir,
+                              env={**os.environ, 'IPYTHON2CWL_WORKERS': '4'})
+        with open(os.path.join(workdir, 'result')) as f:
+            result = json.load(f)
+        expected = [100 + i for i in range(1, 9)]
+        self.assertListEqual(expected + expected + [101, 103, 105, 107], result['values'])
+        self.assertFalse(result['in_parent'])
+        subprocess.check_call([sys.executable, script_path, '--numbers', *numbers], cwd=workdir,
+                              env={**os.environ, 'IPYTHON2CWL_WORKERS': '1'})
+        with open(os.path.join(workdir, 'result')) as f:
+            self.assertTrue(json.load(f)['in_parent'])
+        failed = subprocess.run([sys.executable, script_path, '--numbers', '1', '-3', '2'], cwd=workdir,
+                                env={**os.environ, 'IPYTHON2CWL_WORKERS': '2'}, stderr=subprocess.PIPE)
+        self.assertNotEqual(0, failed.returncode)
+        self.assertIn(b'ValueError: negative: -3', failed.stderr)
+        shutil.rmtree(workdir)
+
+    def test_AnnotatedIPython2CWLToolConverter_checkpoint(self):
+        code = os.linesep.join([
+            "import json",
+            "n: CWLIntInput = 3",
+            "numbers = list(range(n))",
+            "# In[2]:",
+            "training: CWLCheckpoint",
+            "def square(x):",
+            "    return x * x",
+            "print('training')",
+            "model = [square(x) for x in numbers]",
+            "# In[3]:",
+            "result: CWLDumpableFile = json.dumps(model)",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        self.assertEqual(5, len(converter._tree.body))
+        workdir = tempfile.mkdtemp()
+        checkpoint_dir = os.path.join(workdir, 'checkpoints')
+        script_path = os.path.join(workdir, 'notebookTool')
+        with open(script_path, 'w') as f:
+            f.write(converter._wrap_script_to_method(converter._tree, converter._variables))
+
+        def run(*args):
+            output = subprocess.check_output([sys.executable, script_path, *args], cwd=workdir).decode()
+            with open(os.path.join(workdir, 'result')) as f:
+                return output, json.load(f)
+
+        self.assertEqual(('training\n', [0, 1, 4]), run('--n', '3'))
+        self.assertFalse(os.path.exists(checkpoint_dir))
+        self.assertEqual(('training\n', [0, 1, 4]), run('--n', '3', '--checkpoint-dir', checkpoint_dir))
+        self.assertEqual(1, len(os.listdir(checkpoint_dir)))
+        self.assertEqual(('', [0, 1, 4]), run('--n', '3', '--checkpoint-dir', checkpoint_dir))
+        self.assertEqual(('training\n', [0, 1, 4, 9]), run('--n', '4', '--checkpoint-dir', checkpoint_dir))
+        self.assertEqual(2, len(os.listdir(checkpoint_dir)))
+        self.assertEqual(
+            ('training\n', [0, 1, 4, 9, 16]),
+            run('--n', '5', '--checkpoint-dir', checkpoint_dir, '--checkpoint-max-mb', '0')
+        )
+        self.assertEqual(1, len(os.listdir(checkpoint_dir)))
+        for checkpoint in os.listdir(checkpoint_dir):
+            with open(os.path.join(checkpoint_dir, checkpoint), 'wb') as f:
+                f.write(b'corrupted')
+        self.assertEqual(('training\n', [0, 1, 4, 9, 16]), run('--n', '5', '--checkpoint-dir', checkpoint_dir))
+        self.assertEqual(('', [0, 1, 4, 9, 16]), run('--n', '5', '--checkpoint-dir', checkpoint_dir))
+        shutil.rmtree(workdir)
+
+    def test_AnnotatedIPython2CWLToolConverter_checkpoint_imports(self):
+        code = os.linesep.join([
+            "n: CWLIntInput = 3",
+            "# In[2]:",
+            "roots: CWLCheckpoint",
+            "import json",
+            "import math",
+            "print('training')",
+            "model = [math.sqrt(x) for x in range(n)]",
+            "# In[3]:",
+            "result: CWLDumpableFile = json.dumps(model)",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        script = converter._wrap_script_to_method(converter._tree, converter._variables)
+        self.assertNotIn('Checkpoint roots is disabled', script)
+        workdir = tempfile.mkdtemp()
+        checkpoint_dir = os.path.join(workdir, 'checkpoints')
+        script_path = os.path.join(workdir, 'notebookTool')
+        with open(script_path, 'w') as f:
+            f.write(script)
+
+        def run(*args):
+            output = subprocess.check_output([sys.executable, script_path, *args], cwd=workdir).decode()
+            with open(os.path.join(workdir, 'result')) as f:
+                return output, json.load(f)
+
+        self.assertEqual(('training\n', [0.0, 1.0, math.sqrt(2)]), run('--n', '3', '--checkpoint-dir', checkpoint_dir))
+        self.assertEqual(1, len(os.listdir(checkpoint_dir)))
+        self.assertEqual(('', [0.0, 1.0, math.sqrt(2)]), run('--n', '3', '--checkpoint-dir', checkpoint_dir))
+        shutil.rmtree(workdir)
+
+    def test_AnnotatedIPython2CWLToolConverter_checkpoint_side_effects(self):
+        code = os.linesep.join([
+            "import json",
+            "import random",
+            "n: CWLIntInput = 3",
+            "numbers = list(range(n))",
+            "# In[2]:",
+            "shuffled: CWLCheckpoint",
+            "random.Random(1).shuffle(numbers)",
+            "# In[3]:",
+            "trained: CWLCheckpoint",
+            "train_in_place(numbers)",
+            "# In[4]:",
+            "result: CWLDumpableFile = json.dumps(numbers)",
+        ])
+        converter = AnnotatedIPython2CWLToolConverter(code)
+        with self.assertLogs('ipython2cwl.cwltoolextractor', level='WARNING') as logs:
+            script = converter._wrap_script_to_method(converter._tree, converter._variables)
+        self.assertEqual(1, len(logs.output))
+        self.assertIn('Checkpoint trained is disabled', logs.output[0])
+        workdir = tempfile.mkdtemp()
+        checkpoint_dir = os.path.join(workdir, 'checkpoints')
+        script_path = os.path.join(workdir, 'notebookTool')
+        with open(script_path, 'w') as f:
+            f.write("def train_in_place(values):\n    values.append(len(values))\n")
+            f.write(script)
+
+        def run(*args):
+            process = subprocess.run([sys.executable, script_path, *args], cwd=workdir, check=True,
+                                     stderr=subprocess.PIPE)
+            with open(os.path.join(workdir, 'result')) as f:
+                return process.stderr.decode(), json.load(f)
+
+        expected = list(range(5))
+        random.Random(1).shuffle(expected)
+        expected.append(5)
+        for _ in range(3):
+            stderr, result = run('--n', '5', '--checkpoint-dir', checkpoint_dir)
+            self.assertEqual(expected, result)
+            self.assertIn('Checkpoint trained is disabled', stderr)
+        self.assertEqual(1, len(os.listdir(checkpoint_dir)))
+        shutil.rmtree(workdir)
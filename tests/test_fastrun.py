@@ -0,0 +1,122 @@
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase, mock
+
+import nbformat
+
+from ipython2cwl import default_cache_directory
+from ipython2cwl.cli import ipython2cwl
+from ipython2cwl.fastrun import compile_notebook, run_notebook
+
+
+class TestFastRun(TestCase):
+    maxDiff = None
+
+    def _notebook(self, directory: str) -> str:
+        notebook = nbformat.v4.new_notebook(cells=[
+            nbformat.v4.new_code_cell(os.linesep.join([
+                'from ipython2cwl.iotypes import CWLFilePathInput, CWLIntInput, CWLStringInput, CWLDumpableFile, '
+                'CWLFilePathOutput',
+                'from typing import List',
+                'data: CWLFilePathInput = "data.txt"',
+                'times: CWLIntInput = 1',
+                'words: List[CWLStringInput] = ["a"]',
+            ])),
+            nbformat.v4.new_code_cell(os.linesep.join([
+                'with open(data) as f:',
+                '    content = f.read()',
+                'repeated: CWLDumpableFile = content * times',
+                'joined = "-".join(words)',
+                'with open("joined.txt", "w") as f:',
+                '    f.write(joined)',
+                'joined_file: CWLFilePathOutput = "joined.txt"',
+            ])),
+        ])
+        path = os.path.join(directory, 'notebook.ipynb')
+        with open(path, 'w') as f:
+            nbformat.write(notebook, f)
+        return path
+
+    def test_run_notebook(self):
+        with tempfile.TemporaryDirectory() as directory:
+            notebook_path = self._notebook(directory)
+            cache_directory = os.path.join(directory, 'cache')
+            with open(os.path.join(directory, 'data.txt'), 'w') as f:
+                f.write('ab')
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                outputs = run_notebook(notebook_path, {'data': 'data.txt', 'times': '3', 'words': ['x', 'y']},
+                                       'outputs', cache_directory)
+            finally:
+                os.chdir(cwd)
+            output_directory = os.path.join(directory, 'outputs')
+            self.assertDictEqual({
+                'repeated': os.path.join(output_directory, 'repeated'),
+                'joined_file': os.path.join(output_directory, 'joined.txt'),
+            }, outputs)
+            with open(outputs['repeated']) as f:
+                self.assertEqual('ababab', f.read())
+            with open(outputs['joined_file']) as f:
+                self.assertEqual('x-y', f.read())
+            self.assertEqual(cwd, os.getcwd())
+
+            self.assertEqual(1, len(os.listdir(cache_directory)))
+            self.assertTrue(compile_notebook(notebook_path, cache_directory)[2])
+            self.assertFalse(compile_notebook(notebook_path, None)[2])
+
+            with self.assertRaisesRegex(ValueError, 'Unknown inputs'):
+                run_notebook(notebook_path, {'size': '1'}, output_directory, cache_directory)
+            with self.assertRaisesRegex(ValueError, 'exited with status 2'):
+                run_notebook(notebook_path, {'times': '1'}, output_directory, cache_directory)
+
+    def test_run_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            notebook_path = self._notebook(directory)
+            data_path = os.path.join(directory, 'data.txt')
+            with open(data_path, 'w') as f:
+                f.write('c')
+            output_directory = os.path.join(directory, 'outputs')
+            stdout = io.StringIO()
+            with redirect_stdout(stdout):
+                self.assertEqual(0, ipython2cwl([
+                    'run', notebook_path, '-i', f'data={data_path}', '-i', 'times=2', '-i', 'words=z', '-i',
+                    'words=w', '-o', output_directory, '--no-cache',
+                ]))
+            outputs = json.loads(stdout.getvalue())
+            with open(outputs['joined_file']) as f:
+                self.assertEqual('z-w', f.read())
+            with open(outputs['repeated']) as f:
+                self.assertEqual('cc', f.read())
+
+    def test_run_parallel_map(self):
+        with tempfile.TemporaryDirectory() as directory:
+            notebook = nbformat.v4.new_notebook(cells=[nbformat.v4.new_code_cell(os.linesep.join([
+                'import json',
+                'import os',
+                'from typing import List',
+                'from ipython2cwl.iotypes import CWLIntInput, CWLDumpableFile, CWLParallelMap',
+                'numbers: List[CWLIntInput] = [1]',
+                '@CWLParallelMap',
+                'def work(x):',
+                '    return x * x, os.getpid()',
+                'squares = [work(x) for x in numbers]',
+                'result: CWLDumpableFile = json.dumps({"values": [v for v, _ in squares], '
+                '"in_parent": os.getpid() in {p for _, p in squares}})',
+            ]))])
+            notebook_path = os.path.join(directory, 'parallel.ipynb')
+            with open(notebook_path, 'w') as f:
+                nbformat.write(notebook, f)
+            with mock.patch.dict(os.environ, {'IPYTHON2CWL_WORKERS': '2'}):
+                outputs = run_notebook(notebook_path, {'numbers': ['1', '2', '3']}, directory)
+            with open(outputs['result']) as f:
+                self.assertDictEqual({'values': [1, 4, 9], 'in_parent': False}, json.load(f))
+
+    def test_default_cache_directory(self):
+        with mock.patch.dict(os.environ, {'IPYTHON2CWL_CACHE_DIR': '/cache', 'XDG_CACHE_HOME': '/xdg'}):
+            self.assertEqual(os.path.join('/cache', 'notebooks'), str(default_cache_directory('notebooks')))
+        with mock.patch.dict(os.environ, {'IPYTHON2CWL_CACHE_DIR': '', 'XDG_CACHE_HOME': '/xdg'}):
+            self.assertEqual(os.path.join('/xdg', 'ipython2cwl', 'schemas'), str(default_cache_directory('schemas')))
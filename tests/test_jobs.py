@@ -0,0 +1,132 @@
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import yaml
+
+from ipython2cwl.cli import ipython2cwl
+from ipython2cwl.jobs import JobGenerator, sweep_jobs, write_job_files, write_jobs_jsonl
+
+
+class TestJobs(TestCase):
+    maxDiff = None
+    tool = {
+        'cwlVersion': 'v1.1',
+        'class': 'CommandLineTool',
+        'inputs': {
+            'dataset': {'type': 'File', 'inputBinding': {'prefix': '--dataset'}},
+            'alpha': {'type': 'float', 'inputBinding': {'prefix': '--alpha'}},
+            'epochs': {'type': 'int?', 'inputBinding': {'prefix': '--epochs'}},
+            'normalize': {'type': 'boolean', 'default': False, 'inputBinding': {'prefix': '--normalize'}},
+            'labels': {'type': 'string[]', 'inputBinding': {'prefix': '--labels'}},
+        },
+        'outputs': {},
+    }
+
+    def test_job_generator(self):
+        generator = JobGenerator(self.tool, '/data')
+        self.assertDictEqual(
+            {
+                'dataset': {'class': 'File', 'path': '/data/train.csv'},
+                'alpha': 1,
+                'labels': ['a', 'b'],
+            },
+            generator.job({'dataset': 'train.csv', 'alpha': 1, 'labels': ['a', 'b']})
+        )
+        self.assertDictEqual(
+            {
+                'dataset': {'class': 'File', 'location': 'https://example.org/train.csv'},
+                'alpha': 0.5,
+                'epochs': 10,
+                'normalize': True,
+                'labels': ['a'],
+            },
+            generator.job(
+                {'dataset': 'https://example.org/train.csv', 'alpha': '0.5', 'epochs': '10', 'normalize': 'yes',
+                 'labels': 'a'},
+                text_inputs={'alpha', 'epochs', 'normalize', 'labels'},
+            )
+        )
+        with self.assertRaisesRegex(ValueError, 'required input alpha'):
+            generator.job({'dataset': 'train.csv', 'labels': []})
+        with self.assertRaisesRegex(ValueError, 'required input alpha'):
+            generator.job({'dataset': 'train.csv', 'alpha': '', 'labels': []}, text_inputs={'alpha'})
+        with self.assertRaisesRegex(ValueError, 'input epochs'):
+            generator.job({'dataset': 'train.csv', 'alpha': 1, 'epochs': 1.5, 'labels': []})
+        with self.assertRaisesRegex(ValueError, 'input epochs'):
+            generator.job({'dataset': 'train.csv', 'alpha': 1, 'epochs': 'ten', 'labels': '[]'},
+                          text_inputs={'epochs', 'labels'})
+        with self.assertRaisesRegex(ValueError, 'Unknown inputs'):
+            generator.job({'dataset': 'train.csv', 'alpha': 1, 'labels': [], 'beta': 2})
+
+    def test_sweep_jobs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'datasets.csv'), 'w') as f:
+                f.write('dataset,epochs\n')
+                f.write('a.csv,1\n')
+                f.write('b.csv,\n')
+            sweep = {
+                'fixed': {'normalize': True},
+                'product': {'alpha': [0.1, 0.2]},
+                'zip': {'labels': [['x'], ['y']]},
+                'csv': 'datasets.csv',
+            }
+            jobs = list(sweep_jobs(self.tool, sweep, directory))
+            self.assertEqual(8, len(jobs))
+            self.assertDictEqual(
+                {
+                    'dataset': {'class': 'File', 'path': os.path.join(directory, 'a.csv')},
+                    'alpha': 0.1,
+                    'epochs': 1,
+                    'normalize': True,
+                    'labels': ['x'],
+                },
+                jobs[0]
+            )
+            self.assertNotIn('epochs', jobs[-1])
+            self.assertEqual(
+                [(0.1, ['x']), (0.2, ['x']), (0.1, ['y']), (0.2, ['y'])],
+                [(job['alpha'], job['labels']) for job in jobs[:4]]
+            )
+
+            with self.assertRaisesRegex(ValueError, 'Job 1: .*input alpha'):
+                list(sweep_jobs(self.tool, {
+                    'fixed': {'dataset': 'a.csv', 'labels': []},
+                    'product': {'alpha': [0.1, 'high']},
+                }))
+            with self.assertRaisesRegex(ValueError, 'different lengths'):
+                list(sweep_jobs(self.tool, {'zip': {'alpha': [0.1], 'labels': [[], []]}}))
+            with self.assertRaisesRegex(ValueError, 'Unknown fields'):
+                list(sweep_jobs(self.tool, {'grid': {}}))
+
+    def test_write_jobs(self):
+        jobs = [{'alpha': 0.1}, {'alpha': 0.2}]
+        stream = io.StringIO()
+        self.assertEqual(2, write_jobs_jsonl(iter(jobs), stream))
+        self.assertListEqual(jobs, [json.loads(line) for line in stream.getvalue().splitlines()])
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(2, write_job_files(iter(jobs), directory))
+            self.assertListEqual(['job_0000000.yml', 'job_0000001.yml'], sorted(os.listdir(directory)))
+            with open(os.path.join(directory, 'job_0000001.yml')) as f:
+                self.assertDictEqual({'alpha': 0.2}, yaml.safe_load(f))
+
+    def test_jobs_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            tool_path = os.path.join(directory, 'tool.cwl')
+            with open(tool_path, 'w') as f:
+                yaml.safe_dump(self.tool, f)
+            sweep_path = os.path.join(directory, 'sweep.yml')
+            with open(sweep_path, 'w') as f:
+                yaml.safe_dump({
+                    'fixed': {'dataset': 'train.csv', 'labels': ['a']},
+                    'product': {'alpha': [0.1, 0.2, 0.3]},
+                }, f)
+            jobs_directory = os.path.join(directory, 'jobs')
+            self.assertEqual(0, ipython2cwl(['jobs', tool_path, sweep_path, '-o', jobs_directory, '--format', 'json']))
+            self.assertEqual(3, len(os.listdir(jobs_directory)))
+            with open(os.path.join(jobs_directory, 'job_0000002.json')) as f:
+                job = json.load(f)
+            self.assertEqual(0.3, job['alpha'])
+            self.assertEqual(os.path.join(directory, 'train.csv'), job['dataset']['path'])
@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from ipython2cwl.metrics import Repo2CWLMetrics
+
+
+class TestRepo2CWLMetrics(TestCase):
+
+    def test_phase(self):
+        metrics = Repo2CWLMetrics()
+        with metrics.phase('conversion'):
+            pass
+        first = metrics.phases['conversion']
+        with self.assertRaises(RuntimeError):
+            with metrics.phase('conversion'):
+                raise RuntimeError()
+        self.assertGreaterEqual(metrics.phases['conversion'], first)
+        self.assertListEqual(['conversion'], list(metrics.phases))
+
+    def test_write(self):
+        metrics = Repo2CWLMetrics()
+        metrics.phases = {'copy': 0.5, 'build': 2.0}
+        metrics.notebooks['converted'] = 3
+        metrics.notebooks['skipped'] = 1
+        metrics.repo_bytes = 1024
+        directory = tempfile.mkdtemp()
+
+        metrics.write(Path(directory, 'metrics.json'))
+        with open(os.path.join(directory, 'metrics.json')) as f:
+            self.assertDictEqual({
+                'phases': {'copy': {'duration_seconds': 0.5}, 'build': {'duration_seconds': 2.0}},
+                'notebooks': {'converted': 3, 'skipped': 1, 'failed': 0},
+                'repo_bytes': 1024,
+                'context_bytes': None,
+                'pruned_context_bytes': None,
+                'image_build_seconds': 2.0,
+                'image_size_bytes': None,
+            }, json.load(f))
+
+        metrics.write(Path(directory, 'metrics.txt'))
+        with open(os.path.join(directory, 'metrics.txt')) as f:
+            self.assertEqual(os.linesep.join([
+                '# TYPE repo2cwl_phase_duration_seconds gauge',
+                '# UNIT repo2cwl_phase_duration_seconds seconds',
+                'repo2cwl_phase_duration_seconds{phase="copy"} 0.5',
+                'repo2cwl_phase_duration_seconds{phase="build"} 2.0',
+                '# TYPE repo2cwl_notebooks counter',
+                'repo2cwl_notebooks_total{status="converted"} 3',
+                'repo2cwl_notebooks_total{status="skipped"} 1',
+                'repo2cwl_notebooks_total{status="failed"} 0',
+                '# TYPE repo2cwl_repo_bytes gauge',
+                '# UNIT repo2cwl_repo_bytes bytes',
+                'repo2cwl_repo_bytes 1024',
+                '# EOF',
+                '',
+            ]), f.read())
+
+        metrics.write(Path(directory, 'metrics.txt'), 'json')
+        with open(os.path.join(directory, 'metrics.txt')) as f:
+            self.assertEqual(3, json.load(f)['notebooks']['converted'])
+        self.assertRaises(ValueError, metrics.write, Path(directory, 'metrics.xml'), 'xml')
@@ -0,0 +1,144 @@
+import ast
+import os
+from unittest import TestCase
+
+import astor
+
+from ipython2cwl.program_slicer import ProgramSlicer
+
+
+class TestProgramSlicer(TestCase):
+    maxDiff = None
+
+    def test_statement_outputs(self):
+        tree = ast.parse(os.linesep.join([
+            "import pandas as pd",
+            "df = pd.read_csv('data.csv')",
+            "df.describe()",
+            "summary = df.describe()",
+            "df.dropna(inplace=True)",
+            "first = df.head()",
+            "second = df.tail()",
+            "with open('first.txt', 'w') as f:",
+            "    f.write(str(first))",
+            "with open('second.txt', 'w') as f:",
+            "    f.write(str(second))",
+            "log_something(summary)",
+        ]))
+        self.assertListEqual(
+            [
+                None,
+                None,
+                frozenset(),
+                None,
+                frozenset({'first', 'second'}),
+                frozenset({'first'}),
+                frozenset({'second'}),
+                frozenset({'first'}),
+                frozenset({'second'}),
+                None,
+            ],
+            ProgramSlicer(tree, ['first', 'second']).statement_outputs()
+        )
+
+    def test_slice(self):
+        tree = ast.parse(os.linesep.join([
+            "import matplotlib.pyplot as plt",
+            "global counter",
+            "data = [1, 2, 3]",
+            "print(data)",
+            "unused = sorted(data)",
+            "assert len(unused) == 3",
+            "counter = len(data)",
+            "def double(values):",
+            "    return [v * 2 for v in values]",
+            "doubled = double(data)",
+            "plt.figure()",
+            "plt.plot(data)",
+            "plt.figure()",
+            "result = plt.plot(doubled)",
+            "result[-1].figure.savefig('result.png')",
+        ]))
+        removed = ProgramSlicer(tree, ['result']).slice()
+        self.assertListEqual(
+            ["print(data)", "unused = sorted(data)", "assert len(unused) == 3"],
+            [astor.to_source(stmt).strip() for stmt in removed]
+        )
+        self.assertEqual(11, len(tree.body))
+
+    def test_unknown_side_effects_are_kept(self):
+        tree = ast.parse(os.linesep.join([
+            "import os",
+            "import pandas as pd",
+            "df = pd.read_csv('data.csv')",
+            "os.makedirs('results')",
+            "x = unknown_function()",
+            "get_ipython().system('ls')",
+            "open('log.txt', 'a')",
+            "data = open('data.txt').read()",
+            "df.to_csv('exploratory.csv')",
+            "numbers = df.to_numpy()",
+        ]))
+        self.assertListEqual(
+            [None, None, None, None, None, None, None, frozenset(), None, frozenset()],
+            ProgramSlicer(tree, []).statement_outputs()
+        )
+
+    def test_objects_and_aliases(self):
+        tree = ast.parse(os.linesep.join([
+            "import logging",
+            "import random",
+            "import sqlite3",
+            "conn = sqlite3.connect(db)",
+            "cur = conn.cursor()",
+            "cur.execute('CREATE TABLE t (x)')",
+            "conn.commit()",
+            "logger = logging.getLogger('notebook')",
+            "logger.info('started')",
+            "data = [1, 2]",
+            "alias = data",
+            "alias.append(3)",
+            "copied = list(data)",
+            "copied.append(4)",
+            "random.Random(1).shuffle(data)",
+            "sample = random.sample(data, 2)",
+            "result = str(len(data))",
+            "print(result)",
+        ]))
+        self.assertListEqual(
+            [
+                None, None, None, None, None, None, None, None, None,
+                frozenset({'result'}),
+                frozenset({'result'}),
+                frozenset({'result'}),
+                frozenset(),
+                frozenset(),
+                frozenset({'result'}),
+                frozenset({'result'}),
+                frozenset({'result'}),
+                frozenset({'result'}),
+            ],
+            ProgramSlicer(tree, ['result']).statement_outputs()
+        )
+        removed = ProgramSlicer(tree, ['result'], inputs=['db']).slice()
+        self.assertListEqual(
+            ['copied = list(data)', 'copied.append(4)'], [astor.to_source(stmt).strip() for stmt in removed]
+        )
+
+    def test_loop_variables_and_augmented_assignments(self):
+        tree = ast.parse(os.linesep.join([
+            "rows = [{'a': 0}, {'a': 1}]",
+            "for r in rows:",
+            "    r['b'] = n",
+            "totals = [{'a': 0}]",
+            "[t.update(b=n) for t in totals]",
+            "a = [1]",
+            "b = a",
+            "b += [n]",
+            "c = [1]",
+            "c += [n]",
+            "result = str(rows) + str(totals) + str(a)",
+            "print(result)",
+        ]))
+        removed = ProgramSlicer(tree, ['result'], inputs=['n']).slice()
+        self.assertListEqual(['c = [1]', 'c += [n]'], [astor.to_source(stmt).strip() for stmt in removed])
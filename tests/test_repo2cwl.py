@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase, mock
+from urllib.parse import urlparse
+
+import git
+import nbformat
+import yaml
+
+from ipython2cwl.repo2cwl import _output_directories, repo2cwl
+
+
+class TestRepo2CWL(TestCase):
+
+    def test_output_directories(self):
+        output = Path(tempfile.mkdtemp())
+        directories = _output_directories([
+            urlparse('https://github.com/giannisdoukas/cwl-annotated-jupyter-notebook.git'),
+            urlparse('/home/user/notebooks/', scheme='file'),
+            urlparse('/tmp/other/notebooks', scheme='file'),
+            urlparse('/', scheme='file'),
+        ], output)
+        self.assertListEqual(
+            ['cwl-annotated-jupyter-notebook', 'notebooks', 'notebooks_2', 'repo'],
+            [directory.name for directory in directories]
+        )
+        self.assertTrue(all(directory.is_dir() and directory.parent == output for directory in directories))
+
+    def test_failures_summary(self):
+        output = tempfile.mkdtemp()
+        missing = os.path.join(tempfile.mkdtemp(), 'missing')
+        repos_file = os.path.join(output, 'repos.txt')
+        with open(repos_file, 'w') as f:
+            f.write(f'# nightly repositories\n{missing}_2\n\n')
+        self.assertEqual(1, repo2cwl([missing, '--repos-file', repos_file, '-o', output]))
+        self.assertListEqual(['missing', 'missing_2', 'repos.txt'], sorted(os.listdir(output)))
+        with self.assertRaises(ValueError):
+            repo2cwl([missing, '-o', output])
+        with self.assertRaises(ValueError):
+            repo2cwl(['-o', output])
+
+    def test_temporary_copies_are_removed(self):
+        output = tempfile.mkdtemp()
+        repo_path = tempfile.mkdtemp()
+        with open(os.path.join(repo_path, 'broken.ipynb'), 'w') as f:
+            f.write('not a notebook')
+        temp_directories = []
+        original_mkdtemp = tempfile.mkdtemp
+
+        def mkdtemp(*args, **kwargs):
+            temp_directories.append(original_mkdtemp(*args, **kwargs))
+            return temp_directories[-1]
+
+        with mock.patch('ipython2cwl.repo2cwl.tempfile.mkdtemp', side_effect=mkdtemp):
+            self.assertEqual(1, repo2cwl([repo_path, repo_path, '-o', output, '--profile', 'conversion.prof']))
+        self.assertEqual(2, len(temp_directories))
+        self.assertFalse(any(os.path.exists(directory) for directory in temp_directories))
+
+    def test_revisions(self):
+        repo_path = tempfile.mkdtemp()
+        repo = git.Repo.init(repo_path)
+        with repo.config_writer() as config:
+            config.set_value('user', 'name', 'test')
+            config.set_value('user', 'email', 'test@example.com')
+        annotated = nbformat.v4.new_notebook(cells=[
+            nbformat.v4.new_code_cell("message: CWLStringInput = 'hello'\nprint(message)"),
+        ])
+        os.makedirs(os.path.join(repo_path, 'analysis'))
+        for name in ['first.ipynb', os.path.join('analysis', 'second.ipynb')]:
+            with open(os.path.join(repo_path, name), 'w') as f:
+                nbformat.write(annotated, f)
+        repo.git.add(A=True)
+        repo.index.commit('first')
+        repo.create_tag('v1.0')
+        annotated.cells.append(nbformat.v4.new_code_cell("count: CWLIntInput = 1\nprint(count)"))
+        with open(os.path.join(repo_path, 'first.ipynb'), 'w') as f:
+            nbformat.write(annotated, f)
+        repo.git.add(A=True)
+        repo.index.commit('second')
+        with open(os.path.join(repo_path, 'README.md'), 'w') as f:
+            f.write('readme')
+        repo.git.add(A=True)
+        head = repo.index.commit('third')
+        with open(os.path.join(repo_path, 'first.ipynb'), 'w') as f:
+            f.write('uncommitted changes are ignored')
+
+        output = tempfile.mkdtemp()
+        metrics_file = os.path.join(output, 'metrics.json')
+        self.assertEqual(0, repo2cwl([repo_path, '-o', output, '--revisions', 'v1.0', 'v1.0..HEAD',
+                                      '--metrics-file', metrics_file]))
+        with open(os.path.join(output, 'revisions.json')) as f:
+            revisions = json.load(f)
+        self.assertEqual(3, len(revisions))
+        self.assertDictEqual({'revision': head.hexsha[:12], 'commit': head.hexsha}, revisions[head.hexsha[:12]])
+        with open(metrics_file) as f:
+            # both notebooks of v1.0 have the same blob
+            self.assertDictEqual({'converted': 2, 'skipped': 0, 'failed': 0}, json.load(f)['notebooks'])
+        with open(os.path.join(output, 'v1.0', 'first.cwl')) as f:
+            self.assertSetEqual({'ipython2cwl_script', 'message'}, set(yaml.safe_load(f)['inputs']))
+        with open(os.path.join(output, head.hexsha[:12], 'first.cwl')) as f:
+            self.assertSetEqual({'ipython2cwl_script', 'message', 'count'}, set(yaml.safe_load(f)['inputs']))
+        self.assertTrue(os.path.isfile(os.path.join(output, head.hexsha[:12], 'analysis_second.cwl')))
+        self.assertTrue(os.access(os.path.join(output, 'v1.0', 'bin', 'analysis', 'second'), os.X_OK))
+        with self.assertRaises(ValueError):
+            repo2cwl([repo_path, '-o', output, '--revisions', 'missing'])
@@ -1,5 +1,7 @@
 import os
 import shutil
+import tempfile
+import zipfile
 from unittest import TestCase
 
 from ipython2cwl.requirements_manager import RequirementsManager
@@ -23,3 +25,24 @@ class TestRequirementsManager(TestCase):
         requirements_without_version = [r.split('==')[0] for r in requirements]
         self.assertIn('nbformat', requirements_without_version)
         self.assertNotIn('ipython2cwl', requirements_without_version)
+
+    def test_build_wheelhouse(self):
+        find_links = tempfile.mkdtemp()
+        wheel_directory = os.path.join(tempfile.mkdtemp(), 'wheels')
+        wheel_name = 'tinypkg-1.0-py3-none-any.whl'
+        with zipfile.ZipFile(os.path.join(find_links, wheel_name), 'w') as wheel:
+            wheel.writestr('tinypkg/__init__.py', '')
+            wheel.writestr('tinypkg-1.0.dist-info/METADATA', 'Metadata-Version: 2.1\nName: tinypkg\nVersion: 1.0\n')
+            wheel.writestr('tinypkg-1.0.dist-info/WHEEL',
+                           'Wheel-Version: 1.0\nRoot-Is-Purelib: true\nTag: py3-none-any\n')
+            wheel.writestr('tinypkg-1.0.dist-info/RECORD', '')
+        self.assertListEqual(
+            [wheel_name],
+            RequirementsManager.build_wheelhouse(['tinypkg==1.0'], wheel_directory, [find_links], offline=True)
+        )
+        self.assertListEqual(
+            [wheel_name],
+            RequirementsManager.build_wheelhouse(['tinypkg==1.0'], wheel_directory, offline=True)
+        )
+        with self.assertRaises(ValueError):
+            RequirementsManager.build_wheelhouse(['tinypkg==2.0'], wheel_directory, offline=True)
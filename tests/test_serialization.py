@@ -0,0 +1,37 @@
+import io
+import json
+from unittest import TestCase
+
+import yaml
+
+from ipython2cwl.cwltoolextractor import AnnotatedIPython2CWLToolConverter
+from ipython2cwl.serialization import dump_cwl, pack_cwl
+
+
+class TestSerialization(TestCase):
+    maxDiff = None
+
+    def setUp(self):
+        self.tool = AnnotatedIPython2CWLToolConverter(
+            "n: List[CWLIntInput] = [1]\nresult: CWLDumpableFile = str(n)"
+        ).cwl_command_line_tool()
+
+    def test_dump_cwl(self):
+        stream = io.StringIO()
+        dump_cwl(self.tool, stream)
+        self.assertEqual(yaml.safe_dump(self.tool), stream.getvalue())
+        stream = io.StringIO()
+        dump_cwl(self.tool, stream, 'json')
+        self.assertDictEqual(self.tool, json.loads(stream.getvalue()))
+        self.assertRaises(ValueError, dump_cwl, self.tool, io.StringIO(), 'xml')
+
+    def test_pack_cwl(self):
+        workflow = AnnotatedIPython2CWLToolConverter.scatter_workflow(self.tool, ['n'])
+        packed = pack_cwl({'notebook_scatter': workflow, 'notebook': self.tool})
+        self.assertEqual('v1.1', packed['cwlVersion'])
+        self.assertListEqual(['#notebook', '#notebook_scatter'], [process['id'] for process in packed['$graph']])
+        self.assertEqual('CommandLineTool', packed['$graph'][0]['class'])
+        self.assertNotIn('cwlVersion', packed['$graph'][0])
+        self.assertDictEqual(self.tool['inputs'], packed['$graph'][0]['inputs'])
+        self.assertEqual('Workflow', packed['$graph'][1]['class'])
+        self.assertRaises(ValueError, pack_cwl, {'a': self.tool, 'b': {**self.tool, 'cwlVersion': 'v1.0'}})
@@ -0,0 +1,98 @@
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+from unittest import TestCase
+
+from ipython2cwl.server import ConversionService, LRUCache, create_server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path: str):
+        super().__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class TestServer(TestCase):
+    here = os.path.abspath(os.path.dirname(__file__))
+    maxDiff = None
+
+    def _serve(self, **kwargs):
+        server = create_server(ConversionService(cache_size=2), **kwargs)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.put('a', b'1')
+        cache.put('b', b'2')
+        self.assertEqual(b'1', cache.get('a'))
+        cache.put('c', b'3')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(b'1', cache.get('a'))
+        self.assertEqual(2, len(cache))
+        with self.assertRaises(ValueError):
+            LRUCache(-1)
+
+    def test_convert(self):
+        server = self._serve(port=0)
+        with open(os.path.join(self.here, 'simple.ipynb'), 'rb') as f:
+            notebook = f.read()
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+        for expected_cache in ['miss', 'hit']:
+            connection.request('POST', '/convert?image=simple', body=notebook)
+            response = connection.getresponse()
+            body = json.loads(response.read())
+            self.assertEqual(200, response.status)
+            self.assertEqual(expected_cache, response.getheader('X-Cache'))
+            self.assertEqual('simple', body['tool']['hints']['DockerRequirement']['dockerImageId'])
+            self.assertIn('dataset', body['tool']['inputs'])
+            self.assertIn('def main(', body['script'])
+        connection.request('POST', '/convert', body=b'{}')
+        response = connection.getresponse()
+        self.assertEqual(422, response.status)
+        self.assertIn('error', json.loads(response.read()))
+
+        connection.request('GET', '/metrics?format=json')
+        metrics = json.loads(connection.getresponse().read())
+        self.assertEqual(1, metrics['cache_hits'])
+        self.assertEqual(2, metrics['cache_misses'])
+        self.assertAlmostEqual(1 / 3, metrics['cache_hit_ratio'])
+        self.assertEqual(3, metrics['request_duration_seconds']['count'])
+        self.assertIn({'endpoint': '/convert', 'status': 422, 'count': 1}, metrics['requests'])
+        connection.request('GET', '/metrics')
+        openmetrics = connection.getresponse().read().decode()
+        self.assertIn('ipython2cwl_cache_accesses_total{result="hit"} 1', openmetrics)
+        self.assertTrue(openmetrics.endswith('# EOF\n'))
+        connection.close()
+
+    def test_negative_content_length(self):
+        server = self._serve(port=0)
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+        connection.putrequest('POST', '/convert')
+        connection.putheader('Content-Length', '-1')
+        connection.endheaders()
+        response = connection.getresponse()
+        self.assertEqual(400, response.status)
+        self.assertIn('error', json.loads(response.read()))
+        connection.close()
+
+    def test_unix_socket(self):
+        socket_path = os.path.join(tempfile.mkdtemp(), 'ipython2cwl.sock')
+        self._serve(socket_path=socket_path)
+        connection = _UnixHTTPConnection(socket_path)
+        connection.request('GET', '/health')
+        response = connection.getresponse()
+        self.assertEqual(200, response.status)
+        self.assertDictEqual({'status': 'ok'}, json.loads(response.read()))
+        connection.close()
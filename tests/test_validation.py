@@ -0,0 +1,58 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase, mock
+
+from ipython2cwl.cwltoolextractor import AnnotatedIPython2CWLToolConverter
+from ipython2cwl.validation import CWLValidator
+
+
+class TestCWLValidator(TestCase):
+    maxDiff = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_directory = Path(tempfile.mkdtemp())
+        cls.validator = CWLValidator(cls.cache_directory)
+        cls.tool = AnnotatedIPython2CWLToolConverter(os.linesep.join([
+            "input_filenames: List[CWLFilePathInput] = ['data.csv']",
+            "result: CWLFilePathOutput = 'result.txt'",
+        ])).cwl_command_line_tool()
+
+    def test_cached_schema(self):
+        self.assertEqual(1, len(list(self.cache_directory.glob('cwl-v1.1-*.pickle'))))
+        validator = CWLValidator(self.cache_directory)
+        validator.validate(self.tool)
+
+    def test_cached_schema_without_cwltool(self):
+        from ipython2cwl import validation
+        installed_version = validation._distribution_version
+
+        def without_cwltool(name):
+            return None if name == 'cwltool' else installed_version(name)
+
+        with mock.patch.object(validation, '_distribution_version', without_cwltool):
+            CWLValidator(self.cache_directory).validate(self.tool)
+            with self.assertRaisesRegex(ValueError, 'requires cwltool'):
+                CWLValidator(Path(tempfile.mkdtemp()))
+
+    def test_validate(self):
+        self.validator.validate(self.tool)
+        self.validator.validate(AnnotatedIPython2CWLToolConverter.scatter_workflow(self.tool, ['input_filenames']))
+        self.validator.validate(AnnotatedIPython2CWLToolConverter.batch_command_line_tool(self.tool))
+        with self.assertRaises(ValueError):
+            self.validator.validate({**self.tool, 'cwlVersion': 'v1.0'})
+
+    def test_validate_many(self):
+        invalid_type = {
+            **self.tool,
+            'inputs': {'input_filenames': {**self.tool['inputs']['input_filenames'], 'type': 'Fil'}}
+        }
+        errors = self.validator.validate_many({
+            'valid.cwl': self.tool,
+            'invalid_field.cwl': {**self.tool, 'unknown': 1},
+            'invalid_type.cwl': invalid_type,
+        })
+        self.assertSetEqual({'invalid_field.cwl', 'invalid_type.cwl'}, set(errors))
+        self.assertIn('unknown', errors['invalid_field.cwl'])
+        self.assertIn('Fil', errors['invalid_type.cwl'])
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import TestCase
+
+import yaml
+
+from ipython2cwl.repo2cwl import _regenerate_notebook, parser_arguments
+from ipython2cwl.watcher import PollingWatcher, InotifyWatcher, create_watcher, debounced_changes
+
+
+class TestWatcher(TestCase):
+    here = os.path.abspath(os.path.dirname(__file__))
+
+    def _test_watcher(self, watcher_class):
+        directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(directory, '.ipynb_checkpoints'))
+        watcher = watcher_class(directory)
+        try:
+            self.assertSetEqual(set(), watcher.wait(0.2))
+            with open(os.path.join(directory, 'first.ipynb'), 'w') as f:
+                f.write('{}')
+            with open(os.path.join(directory, 'data.csv'), 'w') as f:
+                f.write('a,b')
+            with open(os.path.join(directory, '.ipynb_checkpoints', 'first-checkpoint.ipynb'), 'w') as f:
+                f.write('{}')
+            self.assertSetEqual({os.path.join(directory, 'first.ipynb')}, watcher.wait(2))
+            os.makedirs(os.path.join(directory, 'sub'))
+            time.sleep(0.1)
+            with open(os.path.join(directory, 'sub', 'second.ipynb'), 'w') as f:
+                f.write('{}')
+            os.remove(os.path.join(directory, 'first.ipynb'))
+            changed = set()
+            for _ in range(10):
+                changed |= watcher.wait(0.2)
+            self.assertSetEqual(
+                {os.path.join(directory, 'first.ipynb'), os.path.join(directory, 'sub', 'second.ipynb')}, changed
+            )
+        finally:
+            watcher.close()
+            shutil.rmtree(directory)
+
+    def test_polling_watcher(self):
+        self._test_watcher(lambda directory: PollingWatcher(directory, interval=0.05))
+
+    def test_inotify_watcher(self):
+        try:
+            InotifyWatcher(tempfile.gettempdir()).close()
+        except OSError:
+            self.skipTest('inotify is not supported')
+        self._test_watcher(InotifyWatcher)
+
+    def test_debounced_changes(self):
+        directory = tempfile.mkdtemp()
+        watcher = create_watcher(directory)
+
+        def save_burst():
+            for i in range(5):
+                with open(os.path.join(directory, f'notebook_{i}.ipynb'), 'w') as f:
+                    f.write('{}')
+                time.sleep(0.05)
+
+        threading.Thread(target=save_burst).start()
+        self.assertEqual(5, len(next(debounced_changes(watcher, debounce=0.5))))
+        watcher.close()
+        shutil.rmtree(directory)
+
+    def test_regenerate_notebook(self):
+        repo = tempfile.mkdtemp()
+        output = Path(tempfile.mkdtemp())
+        notebook_path = os.path.join(repo, 'analysis', 'simple.ipynb')
+        os.makedirs(os.path.dirname(notebook_path))
+        shutil.copy(os.path.join(self.here, 'simple.ipynb'), notebook_path)
+        args = parser_arguments([repo, '-o', str(output), '--batch', '--watch'])
+
+        _regenerate_notebook(notebook_path, repo, output, 'image:latest', args)
+        self.assertListEqual(
+            ['analysis_simple.cwl', 'analysis_simple_batch.cwl', 'bin'], sorted(os.listdir(str(output)))
+        )
+        self.assertTrue(os.access(str(output.joinpath('bin', 'analysis', 'simple')), os.X_OK))
+        with open(str(output.joinpath('analysis_simple.cwl'))) as f:
+            tool = yaml.safe_load(f)
+        self.assertEqual('ipython', tool['baseCommand'])
+        self.assertEqual('image:latest', tool['hints']['DockerRequirement']['dockerImageId'])
+        self.assertDictEqual({
+            'type': 'File',
+            'default': {'class': 'File', 'location': os.path.join('bin', 'analysis', 'simple')},
+            'inputBinding': {'position': -1},
+        }, tool['inputs']['ipython2cwl_script'])
+        with open(str(output.joinpath('analysis_simple_batch.cwl'))) as f:
+            self.assertIn('ipython2cwl_script', yaml.safe_load(f)['inputs'])
+
+        os.remove(notebook_path)
+        _regenerate_notebook(notebook_path, repo, output, 'image:latest', args)
+        self.assertListEqual(['bin'], sorted(os.listdir(str(output))))
+        self.assertListEqual([], os.listdir(str(output.joinpath('bin', 'analysis'))))
+        shutil.rmtree(repo)
+        shutil.rmtree(str(output))